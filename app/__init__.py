@@ -46,6 +46,21 @@ def create_app():
     migrate.init_app(app, db)
     login_manager.init_app(app)
     csrf.init_app(app)
+
+    from app.fila_pdf import fila_pdf
+    fila_pdf.init_app(app)
+
+    from app.cache import cache_dados
+    cache_dados.init_app(app)
+
+    from app.desempenho import desempenho
+    desempenho.init_app(app)
+
+    from app.agendador import agendador
+    agendador.init_app(app)
+
+    from app.eventos import barramento
+    barramento.init_app(app)
     
     # Configurações do LoginManager
     login_manager.login_view = 'auth.login'
@@ -67,6 +82,12 @@ def create_app():
     # Registrar shell context
     register_shell_context(app)
 
+    # Registrar eventos de modelo
+    register_model_events(app)
+
+    # Registrar comandos de linha de comando
+    register_commands(app)
+
     # Registrar as rotas de contratos (importação local para evitar circularidade)
     from app.routes_contratos import register_contratos_routes
     register_contratos_routes(app)
@@ -156,6 +177,46 @@ def register_context_processors(app):
     def inject_user():
         return dict(current_user=current_user)
 
+def register_model_events(app):
+    """Registra eventos de sessão que mantêm tabelas derivadas atualizadas"""
+    from app.resumo_mensal import registrar_eventos
+    from app.relatorio_aluno import registrar_eventos as registrar_eventos_extratos
+    from app.cache import registrar_eventos as registrar_eventos_cache
+    from app.busca import registrar_eventos as registrar_eventos_busca
+    from app.autocompletar import registrar_eventos as registrar_eventos_autocompletar
+    from app.notificacoes import registrar_eventos as registrar_eventos_notificacoes
+    from app.eventos import registrar_eventos as registrar_eventos_tempo_real
+    registrar_eventos()
+    registrar_eventos_extratos()
+    registrar_eventos_cache()
+    registrar_eventos_busca()
+    registrar_eventos_autocompletar()
+    registrar_eventos_notificacoes()
+    registrar_eventos_tempo_real()
+
+def register_commands(app):
+    """Registra os comandos do flask CLI"""
+    from app.resumo_mensal import resumo_cli
+    from app.fila_pdf import fila_cli
+    from app.lote_contratos import contratos_cli
+    from app.status_contratos import atualizar_status_command
+    from app.relatorio_aluno import relatorios_cli
+    from app.plano_consultas import indices_cli
+    from app.carregamento import consultas_cli
+    from app.busca import busca_cli
+    from app.notificacoes import notificacoes_cli
+    from app.agendador import agendador_cli
+    contratos_cli.add_command(atualizar_status_command)
+    app.cli.add_command(resumo_cli)
+    app.cli.add_command(fila_cli)
+    app.cli.add_command(contratos_cli)
+    app.cli.add_command(relatorios_cli)
+    app.cli.add_command(indices_cli)
+    app.cli.add_command(consultas_cli)
+    app.cli.add_command(busca_cli)
+    app.cli.add_command(notificacoes_cli)
+    app.cli.add_command(agendador_cli)
+
 def register_shell_context(app):
     """Registra contexto para o shell interativo"""
     
@@ -0,0 +1,388 @@
+"""
+Agendador de tarefas periódicas de manutenção
+Uma thread por processo executa as tarefas registradas conforme uma expressão no
+formato do cron (minuto hora dia mês dia-da-semana), com atraso aleatório (jitter)
+para não coincidirem entre si. Com vários workers do gunicorn só o processo que
+obtém a trava de arquivo (AGENDADOR_TRAVA) executa as tarefas; os demais tentam
+obtê-la de novo a cada ciclo. Histórico e tempos ficam em memória (flask agendador
+listar e /admin/perf).
+"""
+
+import glob
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app import db
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+agendador_cli = AppGroup('agendador', help='Tarefas periódicas de manutenção')
+
+HISTORICO_POR_TAREFA = 20
+
+_APELIDOS = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+}
+
+
+class Cron:
+    """Expressão 'minuto hora dia mês dia-da-semana' (*, */n, a-b, a-b/n e listas; domingo = 0)"""
+
+    _LIMITES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expressao):
+        self.expressao = expressao
+        campos = _APELIDOS.get(expressao.strip(), expressao).split()
+        if len(campos) != 5:
+            raise ValueError(f'Expressão de agendamento inválida: {expressao!r}')
+        self.minutos, self.horas, self.dias, self.meses, self.dias_semana = (
+            self._valores(campo, *limites) for campo, limites in zip(campos, self._LIMITES)
+        )
+        # Como no cron: com dia do mês e dia da semana restritos, vale qualquer um dos dois
+        self._dia_livre = campos[2] == '*'
+        self._semana_livre = campos[4] == '*'
+        self.dias_semana = {0 if dia == 7 else dia for dia in self.dias_semana}
+
+    @staticmethod
+    def _valores(campo, minimo, maximo):
+        valores = set()
+        for parte in campo.split(','):
+            intervalo, _, passo = parte.partition('/')
+            if intervalo == '*':
+                inicio, fim = minimo, maximo
+            elif '-' in intervalo:
+                inicio, fim = (int(v) for v in intervalo.split('-'))
+            else:
+                inicio = fim = int(intervalo)
+                if passo:
+                    fim = maximo
+            if not (minimo <= inicio <= fim <= maximo):
+                raise ValueError(f'Valor fora do intervalo em {campo!r}')
+            valores.update(range(inicio, fim + 1, int(passo) if passo else 1))
+        return valores
+
+    def _dia_valido(self, momento):
+        no_mes = momento.day in self.dias
+        na_semana = (momento.weekday() + 1) % 7 in self.dias_semana
+        if self._dia_livre or self._semana_livre:
+            return no_mes and na_semana
+        return no_mes or na_semana
+
+    def proxima(self, depois):
+        """Primeiro minuto estritamente depois de `depois` que satisfaz a expressão"""
+        momento = depois.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limite = momento + timedelta(days=5 * 366)
+        while momento < limite:
+            if momento.month not in self.meses:
+                ano, mes = divmod(momento.month, 12)
+                momento = momento.replace(year=momento.year + ano, month=mes + 1, day=1, hour=0, minute=0)
+            elif not self._dia_valido(momento):
+                momento = (momento + timedelta(days=1)).replace(hour=0, minute=0)
+            elif momento.hour not in self.horas:
+                momento = (momento + timedelta(hours=1)).replace(minute=0)
+            elif momento.minute not in self.minutos:
+                momento += timedelta(minutes=1)
+            else:
+                return momento
+        raise ValueError(f'A expressão {self.expressao!r} nunca ocorre')
+
+
+class Tarefa:
+    """Tarefa registrada: função, agenda, jitter e métricas das execuções"""
+
+    def __init__(self, nome, expressao, funcao, jitter=0, descricao='', ao_iniciar=False):
+        self.nome = nome
+        self.cron = Cron(expressao)
+        self.funcao = funcao
+        self.jitter = jitter
+        self.ao_iniciar = ao_iniciar
+        self.descricao = descricao or (funcao.__doc__ or '').strip().split('\n')[0]
+        self.proxima_execucao = None
+        self.historico = deque(maxlen=HISTORICO_POR_TAREFA)
+        self.execucoes = 0
+        self.falhas = 0
+        self.tempo_total_ms = 0.0
+        self.em_execucao = False
+
+    def agendar(self, depois):
+        self.proxima_execucao = self.cron.proxima(depois) + timedelta(seconds=random.uniform(0, self.jitter))
+
+    def registrar_execucao(self, inicio, duracao_ms, resultado=None, erro=None):
+        self.execucoes += 1
+        self.falhas += erro is not None
+        self.tempo_total_ms += duracao_ms
+        self.historico.appendleft({
+            'inicio': inicio,
+            'duracao_ms': duracao_ms,
+            'sucesso': erro is None,
+            'resultado': resultado,
+            'erro': erro
+        })
+
+    def resumo(self):
+        ultima = self.historico[0] if self.historico else None
+        return {
+            'nome': self.nome,
+            'expressao': self.cron.expressao,
+            'descricao': self.descricao,
+            'proxima_execucao': self.proxima_execucao,
+            'execucoes': self.execucoes,
+            'falhas': self.falhas,
+            'media_ms': self.tempo_total_ms / self.execucoes if self.execucoes else 0,
+            'ultima': ultima,
+            'historico': list(self.historico),
+            'em_execucao': self.em_execucao
+        }
+
+
+class TravaArquivo:
+    """Trava exclusiva e não bloqueante em um arquivo, mantida enquanto o processo viver"""
+
+    def __init__(self, caminho):
+        self.caminho = os.path.abspath(caminho)
+        self._arquivo = None
+
+    @property
+    def obtida(self):
+        return self._arquivo is not None
+
+    def tentar_obter(self):
+        if self._arquivo is not None:
+            return True
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        arquivo = open(self.caminho, 'a+')
+        try:
+            if fcntl:
+                fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                arquivo.seek(0)
+                msvcrt.locking(arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            arquivo.close()
+            return False
+        arquivo.seek(0)
+        arquivo.truncate()
+        arquivo.write(str(os.getpid()))
+        arquivo.flush()
+        self._arquivo = arquivo
+        return True
+
+
+class Agendador:
+    """Extensão Flask: registro de tarefas e thread que as executa"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.tarefas = {}
+        self.trava = None
+        self._thread = None
+        self._sinal = threading.Event()
+        self._trava_registro = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['agendador'] = self
+        self.trava = TravaArquivo(app.config.get('AGENDADOR_TRAVA') or os.path.join(app.instance_path, 'agendador.lock'))
+        self.intervalo = app.config.get('AGENDADOR_INTERVALO', 30)
+        if app.config.get('AGENDADOR_ATIVO', False):
+            # A thread só sobe em processos que atendem requisições (não em flask db upgrade etc.)
+            app.before_request(self._garantir_thread)
+
+    def tarefa(self, nome, expressao, jitter=0, descricao='', ao_iniciar=False):
+        """Decorador que registra a função como tarefa periódica"""
+        def decorador(funcao):
+            self.registrar(nome, expressao, funcao, jitter, descricao, ao_iniciar)
+            return funcao
+        return decorador
+
+    def registrar(self, nome, expressao, funcao, jitter=0, descricao='', ao_iniciar=False):
+        tarefa = Tarefa(nome, expressao, funcao, jitter, descricao, ao_iniciar)
+        if ao_iniciar:
+            # Recupera o que deixou de rodar enquanto a aplicação estava parada
+            tarefa.proxima_execucao = datetime.now()
+        else:
+            tarefa.agendar(datetime.now())
+        self.tarefas[nome] = tarefa
+        return tarefa
+
+    @property
+    def ativo_neste_processo(self):
+        return self.trava is not None and self.trava.obtida
+
+    def _garantir_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._trava_registro:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._executar, name='agendador', daemon=True)
+                self._thread.start()
+
+    def _executar(self):
+        while True:
+            try:
+                if self.trava.tentar_obter():
+                    self.executar_pendentes()
+            except Exception as e:
+                self.app.logger.error(f'Erro no agendador: {str(e)}', exc_info=True)
+            self._sinal.wait(self._espera())
+            self._sinal.clear()
+
+    def _espera(self):
+        """Segundos até a próxima tarefa (no máximo o intervalo de verificação)"""
+        if not self.ativo_neste_processo or not self.tarefas:
+            return self.intervalo
+        proxima = min(tarefa.proxima_execucao for tarefa in self.tarefas.values())
+        return min(self.intervalo, max(1.0, (proxima - datetime.now()).total_seconds()))
+
+    def executar_pendentes(self, agora=None):
+        """Executa as tarefas cujo horário já chegou. Retorna quantas foram executadas."""
+        agora = agora or datetime.now()
+        pendentes = [t for t in self.tarefas.values() if t.proxima_execucao <= agora]
+        for tarefa in sorted(pendentes, key=lambda t: t.proxima_execucao):
+            self.executar(tarefa.nome)
+            tarefa.agendar(max(agora, datetime.now()))
+        return len(pendentes)
+
+    def executar(self, nome):
+        """Executa a tarefa agora, no contexto da aplicação, registrando tempo e resultado"""
+        tarefa = self.tarefas[nome]
+        inicio = datetime.now()
+        relogio = time.perf_counter()
+        resultado = erro = None
+        tarefa.em_execucao = True
+        with self.app.app_context():
+            try:
+                resultado = tarefa.funcao()
+            except Exception as e:
+                db.session.rollback()
+                erro = f'{e.__class__.__name__}: {e}'
+                self.app.logger.error(f'Erro na tarefa agendada {nome}: {erro}', exc_info=True)
+            finally:
+                db.session.remove()
+                tarefa.em_execucao = False
+        duracao_ms = (time.perf_counter() - relogio) * 1000
+        tarefa.registrar_execucao(inicio, duracao_ms, resultado, erro)
+        self.app.logger.info(f'Tarefa agendada {nome}: {duracao_ms:.1f} ms, resultado={resultado!r}')
+        return resultado
+
+    def resumo(self):
+        return [tarefa.resumo() for tarefa in sorted(self.tarefas.values(), key=lambda t: t.nome)]
+
+
+agendador = Agendador()
+
+
+# Tarefas de manutenção
+
+@agendador.tarefa('status-contratos', '1 0 * * *', jitter=30, ao_iniciar=True)
+def tarefa_status_contratos():
+    """Transições de status e faixa de vencimento dos contratos"""
+    from app.status_contratos import atualizar_status_contratos
+    return atualizar_status_contratos(date.today())
+
+
+@agendador.tarefa('notificacoes-vencimento', '15 7 * * *', jitter=300)
+def tarefa_notificacoes_vencimento():
+    """Avisos de contratos próximos ao vencimento"""
+    from app.notificacoes import criar_notificacoes_vencimento
+    return criar_notificacoes_vencimento()
+
+
+@agendador.tarefa('aquecer-cache', '*/5 * * * *', jitter=30)
+def tarefa_aquecer_cache():
+    """Recalcula as estatísticas dos dashboards antes que uma requisição precise delas"""
+    from app.estatisticas_contratos import estatisticas_contratos
+    from app.routes import estatisticas_admin
+    estatisticas_contratos()
+    estatisticas_admin(date.today())
+
+
+@agendador.tarefa('arquivar-notificacoes', '50 3 * * *', jitter=300)
+def tarefa_arquivar_notificacoes():
+    """Move as notificações lidas antigas para a tabela de arquivo"""
+    from app.notificacoes import arquivar_notificacoes
+    return arquivar_notificacoes()
+
+
+@agendador.tarefa('limpar-eventos', '*/15 * * * *', jitter=60)
+def tarefa_limpar_eventos():
+    """Apaga os eventos em tempo real já expirados"""
+    from app.eventos import remover_antigos
+    return remover_antigos()
+
+
+@agendador.tarefa('fila-pdf', '*/5 * * * *', jitter=30, ao_iniciar=True)
+def tarefa_fila_pdf():
+    """Gera os PDFs de contratos que ficaram pendentes na fila"""
+    from app.fila_pdf import processar_pendentes
+    return processar_pendentes()
+
+
+@agendador.tarefa('resumo-mensal', '30 3 * * 0', jitter=300)
+def tarefa_resumo_mensal():
+    """Reconstrói o resumo mensal do ano corrente (corrige eventuais divergências)"""
+    from app.resumo_mensal import reconstruir_resumo_mensal
+    return reconstruir_resumo_mensal(date.today().year)
+
+
+@agendador.tarefa('limpar-temporarios', '40 3 * * *', jitter=300)
+def tarefa_limpar_temporarios(idade_minima=timedelta(hours=1)):
+    """Remove temporários órfãos, entradas expiradas do cache e PDFs acima do limite"""
+    from app.cache import cache_dados, CacheArquivos
+    from app.cache_pdf import cache_pdf
+
+    config = current_app.config
+    limite = time.time() - idade_minima.total_seconds()
+    removidos = 0
+    for diretorio in {config.get('PDF_CACHE_DIR'), config.get('CACHE_DIR')} - {None}:
+        for caminho in glob.glob(os.path.join(diretorio, '*.tmp')):
+            try:
+                if os.path.getmtime(caminho) < limite:
+                    os.remove(caminho)
+                    removidos += 1
+            except FileNotFoundError:
+                pass
+
+    if isinstance(cache_dados.backend, CacheArquivos):
+        cache_dados.backend.remover_expirados()
+    cache = cache_pdf()
+    if os.path.isdir(cache.diretorio):
+        removidos += cache.remover_excedentes()
+    return removidos
+
+
+@agendador_cli.command('listar')
+def listar_command():
+    """Lista as tarefas, a agenda e a próxima execução de cada uma"""
+    for tarefa in agendador.resumo():
+        click.echo(f'{tarefa["nome"]:<24} {tarefa["expressao"]:<14} '
+                   f'próxima: {tarefa["proxima_execucao"]:%d/%m/%Y %H:%M:%S}  {tarefa["descricao"]}')
+
+
+@agendador_cli.command('executar')
+@click.argument('nome')
+def executar_command(nome):
+    """Executa uma tarefa agora, no processo atual"""
+    if nome not in agendador.tarefas:
+        raise click.ClickException(f'Tarefa desconhecida: {nome}. Use flask agendador listar.')
+    resultado = agendador.executar(nome)
+    tarefa = agendador.tarefas[nome].resumo()['ultima']
+    if not tarefa['sucesso']:
+        raise click.ClickException(tarefa['erro'])
+    click.echo(f'{nome}: {tarefa["duracao_ms"]:.1f} ms, resultado: {resultado!r}')
@@ -0,0 +1,269 @@
+"""
+Índice de prefixos para o autocompletar (typeahead)
+Cada entidade fica em um vetor ordenado de chaves normalizadas (nome completo, cada
+sobrenome em diante, CPF e telefone só com dígitos), consultado com bisect sem ir ao
+banco. Os commits deste processo atualizam o vetor pelos eventos da sessão. Alterações
+feitas por outros processos: com CACHE_TIPO=arquivos, pela versão da tabela no cache
+compartilhado; com o cache em memória (por processo), por uma impressão digital da
+tabela (total e maior id, conferida a cada AUTOCOMPLETAR_VERIFICACAO segundos), que
+percebe inclusões e exclusões. Edições feitas em outro processo aparecem no mais
+tardar após AUTOCOMPLETAR_TTL segundos, quando o vetor é refeito.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from flask import current_app
+from sqlalchemy import event, inspect
+
+from app.models import db, Aluno, Responsavel, Professor
+from app.cache import cache_dados, CacheArquivos
+from app.busca import normalizar_texto
+from app.utils import somente_digitos
+
+LIMITE_PADRAO = 10
+LIMITE_MAXIMO = 20
+
+# entidade -> modelo (todos têm nome, cpf, cpf_digitos e telefone_digitos)
+ENTIDADES = {
+    'responsavel': Responsavel,
+    'aluno': Aluno,
+    'professor': Professor,
+}
+
+
+def _chaves(nome, cpf_digitos, telefone_digitos):
+    """Chaves de um registro: o nome a partir de cada palavra, CPF e telefone"""
+    palavras = normalizar_texto(nome).split()
+    chaves = {' '.join(palavras[i:]) for i in range(len(palavras))}
+    chaves.update(digitos for digitos in (cpf_digitos, telefone_digitos) if digitos)
+    return chaves
+
+
+class IndicePrefixos:
+    """Vetor ordenado de chaves com o id de cada uma, e o rótulo de cada id"""
+
+    def __init__(self, registros=()):
+        self.chaves = []
+        self.ids = []
+        self.rotulos = {}
+        self._chaves_do_id = {}
+        entradas = []
+        for registro in registros:
+            registro_id, chaves = self._registrar(*registro)
+            entradas.extend((chave, registro_id) for chave in chaves)
+        entradas.sort(key=lambda entrada: entrada[0])
+        self.chaves = [chave for chave, _ in entradas]
+        self.ids = [registro_id for _, registro_id in entradas]
+
+    def _registrar(self, registro_id, nome, cpf, cpf_digitos, telefone_digitos):
+        chaves = _chaves(nome, cpf_digitos, telefone_digitos)
+        self.rotulos[registro_id] = f'{nome} - {cpf}'
+        self._chaves_do_id[registro_id] = chaves
+        return registro_id, chaves
+
+    def remover(self, registro_id):
+        self.rotulos.pop(registro_id, None)
+        for chave in self._chaves_do_id.pop(registro_id, ()):
+            posicao = bisect_left(self.chaves, chave)
+            while posicao < len(self.chaves) and self.chaves[posicao] == chave:
+                if self.ids[posicao] == registro_id:
+                    del self.chaves[posicao]
+                    del self.ids[posicao]
+                    break
+                posicao += 1
+
+    def gravar(self, registro_id, nome, cpf, cpf_digitos, telefone_digitos):
+        """Inclui ou substitui o registro sem refazer o vetor"""
+        self.remover(registro_id)
+        _, chaves = self._registrar(registro_id, nome, cpf, cpf_digitos, telefone_digitos)
+        for chave in chaves:
+            posicao = bisect_left(self.chaves, chave)
+            self.chaves.insert(posicao, chave)
+            self.ids.insert(posicao, registro_id)
+
+    def buscar(self, termo, limite=LIMITE_PADRAO):
+        """Registros com alguma chave começando pelo termo, na ordem das chaves"""
+        digitos = somente_digitos(termo)
+        if digitos and not any(c.isalpha() for c in termo):
+            prefixo = digitos
+        else:
+            prefixo = ' '.join(normalizar_texto(termo).split())
+        if not prefixo:
+            return []
+
+        encontrados = []
+        vistos = set()
+        posicao = bisect_left(self.chaves, prefixo)
+        while posicao < len(self.chaves) and len(encontrados) < limite:
+            if not self.chaves[posicao].startswith(prefixo):
+                break
+            registro_id = self.ids[posicao]
+            if registro_id not in vistos:
+                vistos.add(registro_id)
+                encontrados.append({'id': registro_id, 'label': self.rotulos[registro_id]})
+            posicao += 1
+        return encontrados
+
+
+class Autocompletar:
+    """
+    Índices por entidade. Alterações confirmadas neste processo são aplicadas direto
+    no vetor (eventos da sessão); se a versão da tabela mudou por outro processo, ou
+    o índice passou do TTL, ele é refeito na próxima consulta. Consultas e alterações
+    do vetor passam pela mesma trava.
+    """
+
+    def __init__(self):
+        self._indices = {}  # entidade -> [versão, IndicePrefixos, instante da construção]
+        self._impressoes = {}  # entidade -> [instante da conferência, (total, maior id)]
+        self._trava = threading.Lock()
+
+    @staticmethod
+    def _cache_compartilhado():
+        return isinstance(cache_dados.backend, CacheArquivos)
+
+    def _versao(self, entidade):
+        """Versão da tabela visível a todos os processos"""
+        if self._cache_compartilhado():
+            return cache_dados.backend.versao(ENTIDADES[entidade].__tablename__)
+        return self._impressao(entidade)
+
+    def _impressao(self, entidade):
+        # (total, maior id) lido do banco no máximo a cada AUTOCOMPLETAR_VERIFICACAO segundos
+        agora = time.monotonic()
+        conferida = self._impressoes.get(entidade)
+        if conferida is not None and agora - conferida[0] < current_app.config.get('AUTOCOMPLETAR_VERIFICACAO', 5):
+            return conferida[1]
+        modelo = ENTIDADES[entidade]
+        total, maior_id = db.session.query(db.func.count(modelo.id), db.func.max(modelo.id)).one()
+        self._impressoes[entidade] = [agora, (total, maior_id)]
+        return (total, maior_id)
+
+    def _atualizar_impressao(self, entidade, indice, registro_id, removido):
+        """Acompanha na impressão digital as inclusões e exclusões deste processo (sem ir ao banco)"""
+        conferida = self._impressoes.get(entidade)
+        if conferida is None:
+            return
+        total, maior_id = conferida[1]
+        if removido and registro_id in indice.rotulos:
+            total -= 1
+        elif not removido and registro_id not in indice.rotulos:
+            total += 1
+            maior_id = max(maior_id or 0, registro_id)
+        conferida[1] = (total, maior_id)
+
+    def _construir(self, entidade):
+        modelo = ENTIDADES[entidade]
+        registros = db.session.query(
+            modelo.id, modelo.nome, modelo.cpf, modelo.cpf_digitos, modelo.telefone_digitos
+        ).all()
+        inicio = time.perf_counter()
+        indice = IndicePrefixos(registros)
+        current_app.logger.debug(
+            f'Índice de autocompletar de {entidade}: {len(indice.chaves)} chaves em '
+            f'{(time.perf_counter() - inicio) * 1000:.1f} ms'
+        )
+        return indice
+
+    def _valido(self, atual, versao):
+        ttl = current_app.config.get('AUTOCOMPLETAR_TTL', 300)
+        return (
+            atual is not None and versao is not None and atual[0] == versao
+            and time.monotonic() - atual[2] < ttl
+        )
+
+    def indice(self, entidade):
+        """Índice atual da entidade (refeito se a tabela mudou em outro processo ou venceu o TTL)"""
+        versao = self._versao(entidade)
+        atual = self._indices.get(entidade)
+        if self._valido(atual, versao):
+            return atual[1]
+        with self._trava:
+            atual = self._indices.get(entidade)
+            if not self._valido(atual, versao):
+                atual = [versao, self._construir(entidade), time.monotonic()]
+                self._indices[entidade] = atual
+        return atual[1]
+
+    def buscar(self, entidade, termo, limite=LIMITE_PADRAO):
+        """[{'id', 'label'}] dos registros da entidade que começam pelo termo"""
+        indice = self.indice(entidade)
+        # aplicar() altera o vetor no lugar: a leitura não pode acontecer no meio de uma alteração
+        with self._trava:
+            return indice.buscar(termo, max(1, min(limite, LIMITE_MAXIMO)))
+
+    def aplicar(self, alteracoes):
+        """Aplica (entidade, id, valores ou None se removido) aos índices já construídos"""
+        with self._trava:
+            for entidade, registro_id, valores in alteracoes:
+                atual = self._indices.get(entidade)
+                if atual is None:
+                    continue
+                self._atualizar_impressao(entidade, atual[1], registro_id, valores is None)
+                if valores is None:
+                    atual[1].remover(registro_id)
+                else:
+                    atual[1].gravar(registro_id, *valores)
+            # O commit já mudou a versão das tabelas no cache (eventos de app.cache rodam antes);
+            # sem cache compartilhado vale a impressão digital acompanhada acima
+            for entidade in {alteracao[0] for alteracao in alteracoes}:
+                if entidade not in self._indices:
+                    continue
+                if self._cache_compartilhado():
+                    self._indices[entidade][0] = cache_dados.backend.versao(ENTIDADES[entidade].__tablename__)
+                elif entidade in self._impressoes:
+                    self._indices[entidade][0] = self._impressoes[entidade][1]
+
+    def limpar(self):
+        with self._trava:
+            self._indices.clear()
+            self._impressoes.clear()
+
+
+autocompletar = Autocompletar()
+
+
+# Sincronização com a sessão
+
+_CHAVE_PENDENTES = 'autocompletar_alteracoes'
+_ENTIDADE_DO_MODELO = {modelo: entidade for entidade, modelo in ENTIDADES.items()}
+_CAMPOS = ('nome', 'cpf', 'telefone')
+
+
+def _depois_do_flush(session, flush_context):
+    # Depois do flush os ids dos novos registros e as colunas *_digitos já estão preenchidos
+    pendentes = session.info.setdefault(_CHAVE_PENDENTES, [])
+    for objeto in session.deleted:
+        entidade = _ENTIDADE_DO_MODELO.get(type(objeto))
+        if entidade:
+            pendentes.append((entidade, objeto.id, None))
+    for objeto in list(session.new) + list(session.dirty):
+        entidade = _ENTIDADE_DO_MODELO.get(type(objeto))
+        if not entidade:
+            continue
+        estado = inspect(objeto)
+        if objeto in session.dirty and not any(estado.attrs[campo].history.has_changes() for campo in _CAMPOS):
+            continue
+        pendentes.append((entidade, objeto.id, (
+            objeto.nome, objeto.cpf, objeto.cpf_digitos, objeto.telefone_digitos
+        )))
+
+
+def _depois_do_commit(session):
+    pendentes = session.info.pop(_CHAVE_PENDENTES, None)
+    if pendentes:
+        autocompletar.aplicar(pendentes)
+
+
+def _depois_do_rollback(session, transacao_anterior):
+    if transacao_anterior.parent is None:
+        session.info.pop(_CHAVE_PENDENTES, None)
+
+
+def registrar_eventos():
+    """Aplica ao índice as alterações confirmadas em responsáveis, alunos e professores"""
+    if not event.contains(db.session, 'after_flush', _depois_do_flush):
+        event.listen(db.session, 'after_flush', _depois_do_flush)
+        event.listen(db.session, 'after_commit', _depois_do_commit)
+        event.listen(db.session, 'after_soft_rollback', _depois_do_rollback)
@@ -0,0 +1,325 @@
+"""
+Busca textual de alunos, responsáveis, professores e contratos
+Um índice FTS5 único (busca_indice) guarda um documento por registro, com o nome
+como título e CPF, telefone e demais campos pesquisáveis como conteúdo. O tokenizador
+remove acentos ("joao" encontra "João") e cada palavra digitada vale como prefixo.
+Termos numéricos (CPF/telefone) são buscados por prefixo nas colunas *_digitos.
+O índice é atualizado no flush da sessão, na mesma transação da alteração; para
+reconstruí-lo use flask busca reindexar.
+"""
+
+import re
+import time
+import unicodedata
+from collections import defaultdict, namedtuple
+import click
+from flask.cli import AppGroup
+from sqlalchemy.orm import contains_eager
+from sqlalchemy import Integer, and_, bindparam, event, inspect, literal_column, or_, select, table, text
+
+from app.models import db, Aluno, Responsavel, Professor, Contrato
+from app.utils import somente_digitos
+
+busca_cli = AppGroup('busca', help='Índice de busca textual')
+
+TABELA_INDICE = 'busca_indice'
+
+_CHAVE_PENDENTES = 'busca_registros_alterados'
+
+# O rowid do documento é id * FATOR + código da entidade: filtrar por entidade e
+# chegar ao id do registro não exige ler o conteúdo guardado no índice
+FATOR_ROWID = 8
+
+# Pesos do bm25 por coluna: titulo, conteudo
+_PESOS = '10.0, 1.0'
+
+Resultado = namedtuple('Resultado', 'entidade objeto relevancia')
+
+# Termos só com números e pontuação de CPF/telefone vão para as colunas de dígitos
+_TERMO_NUMERICO = re.compile(r'[\d\s.()/+-]+')
+DIGITOS_MINIMOS = 3
+
+# Marcas diacríticas que a decomposição NFKD separa das letras
+_ACENTOS = re.compile('[\u0300-\u036f]')
+
+_SQL_CRIAR_INDICE = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_INDICE} USING fts5(
+    titulo,
+    conteudo,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+
+def _juntar(*colunas):
+    return " || ' ' || ".join(f"coalesce({c}, '')" for c in colunas)
+
+
+# entidade -> (código no rowid, modelo, campos indexados, SELECT dos documentos, coluna do id)
+ENTIDADES = {
+    'aluno': (
+        1, Aluno, ('nome', 'cpf', 'telefone', 'serie'),
+        f"SELECT a.id * {FATOR_ROWID} + 1, a.nome, "
+        f"{_juntar('a.cpf', 'a.cpf_digitos', 'a.telefone', 'a.telefone_digitos', 'a.serie')} FROM aluno a",
+        'a.id'
+    ),
+    'responsavel': (
+        2, Responsavel, ('nome', 'cpf', 'telefone', 'email'),
+        f"SELECT r.id * {FATOR_ROWID} + 2, r.nome, "
+        f"{_juntar('r.cpf', 'r.cpf_digitos', 'r.telefone', 'r.telefone_digitos', 'r.email')} FROM responsavel r",
+        'r.id'
+    ),
+    'professor': (
+        3, Professor, ('nome', 'cpf', 'telefone', 'disciplina'),
+        f"SELECT p.id * {FATOR_ROWID} + 3, p.nome, "
+        f"{_juntar('p.disciplina', 'p.cpf', 'p.cpf_digitos', 'p.telefone', 'p.telefone_digitos')} FROM professor p",
+        'p.id'
+    ),
+    # Contratos são encontrados pelo nome do responsável e pelo plano
+    'contrato': (
+        4, Contrato, ('responsavel_id', 'responsavel', 'tipo_plano'),
+        f"SELECT c.id * {FATOR_ROWID} + 4, r.nome, {_juntar('c.tipo_plano')} "
+        "FROM contrato c JOIN responsavel r ON r.id = c.responsavel_id",
+        'c.id'
+    ),
+}
+
+_ENTIDADE_DO_MODELO = {modelo: entidade for entidade, (_, modelo, *_) in ENTIDADES.items()}
+_ENTIDADE_DO_CODIGO = {codigo: entidade for entidade, (codigo, *_) in ENTIDADES.items()}
+
+
+def normalizar_texto(texto):
+    """Minúsculas e sem acentos ("João" -> "joao")"""
+    texto = (texto or '').lower()
+    if texto.isascii():
+        return texto
+    return _ACENTOS.sub('', unicodedata.normalize('NFKD', texto))
+
+
+def expressao_busca(termo):
+    """Consulta FTS5 em que cada palavra do termo é um prefixo obrigatório (None se não houver palavras)"""
+    palavras = re.findall(r'\w+', normalizar_texto(termo))
+    if not palavras:
+        return None
+    return ' '.join(f'"{palavra}"*' for palavra in palavras)
+
+
+def digitos_do_termo(termo):
+    """Dígitos do termo quando ele é um CPF/telefone (completo ou início), senão None"""
+    if not termo or not _TERMO_NUMERICO.fullmatch(termo.strip()):
+        return None
+    digitos = somente_digitos(termo)
+    return digitos if len(digitos) >= DIGITOS_MINIMOS else None
+
+
+def _comeca_com(coluna, digitos):
+    # Intervalo [digitos, digitos + ':') = textos que começam com os dígitos (':' vem logo após '9'),
+    # resolvido pelo índice da coluna em qualquer banco
+    return and_(coluna >= digitos, coluna < digitos + ':')
+
+
+def filtro_documento(modelo, digitos):
+    """CPF ou telefone começando com os dígitos (pelos índices de cpf_digitos/telefone_digitos)"""
+    if modelo is Contrato:
+        return Contrato.responsavel_id.in_(select(Responsavel.id).where(filtro_documento(Responsavel, digitos)))
+    return or_(_comeca_com(modelo.cpf_digitos, digitos), _comeca_com(modelo.telefone_digitos, digitos))
+
+
+def criar_indice(conexao):
+    conexao.exec_driver_sql(_SQL_CRIAR_INDICE)
+
+
+def reindexar(conexao, entidade, ids=None):
+    """Regrava os documentos da entidade (todos, ou só os ids informados)"""
+    codigo, _, _, consulta, coluna_id = ENTIDADES[entidade]
+    inserir = f'INSERT INTO {TABELA_INDICE} (rowid, titulo, conteudo) {consulta}'
+    if ids is None:
+        conexao.execute(text(f'DELETE FROM {TABELA_INDICE} WHERE rowid % {FATOR_ROWID} = {codigo}'))
+        conexao.execute(text(inserir))
+        return
+    if not ids:
+        return
+
+    ids = list(ids)
+    conexao.execute(
+        text(f'DELETE FROM {TABELA_INDICE} WHERE rowid IN :rowids').bindparams(bindparam('rowids', expanding=True)),
+        {'rowids': [registro_id * FATOR_ROWID + codigo for registro_id in ids]}
+    )
+    conexao.execute(
+        text(inserir + f' WHERE {coluna_id} IN :ids').bindparams(bindparam('ids', expanding=True)),
+        {'ids': ids}
+    )
+
+
+def reconstruir_indice(conexao):
+    """Recria todos os documentos do índice"""
+    criar_indice(conexao)
+    for entidade in ENTIDADES:
+        reindexar(conexao, entidade)
+    conexao.exec_driver_sql(f"INSERT INTO {TABELA_INDICE} ({TABELA_INDICE}) VALUES ('optimize')")
+
+
+def ids_correspondentes(entidade, termo):
+    """SELECT dos ids da entidade que casam com o termo, para usar em Modelo.id.in_(...)"""
+    digitos = digitos_do_termo(termo)
+    if digitos:
+        modelo = ENTIDADES[entidade][1]
+        return select(modelo.id).where(filtro_documento(modelo, digitos))
+
+    consulta = expressao_busca(termo)
+    if consulta is None:
+        return None
+    rowid = literal_column('rowid', Integer)
+    return select(rowid // FATOR_ROWID).select_from(table(TABELA_INDICE)).where(
+        literal_column(TABELA_INDICE).op('MATCH')(consulta),
+        rowid % FATOR_ROWID == ENTIDADES[entidade][0]
+    )
+
+
+def buscar(termo, entidades=None, limite=10):
+    """
+    Busca única nas entidades informadas (padrão: todas), até `limite` resultados
+    por entidade, ordenados pela relevância (bm25) entre todas elas
+    """
+    digitos = digitos_do_termo(termo)
+    if digitos:
+        return _buscar_documento(digitos, entidades or ENTIDADES, limite)
+
+    consulta = expressao_busca(termo)
+    codigos = [ENTIDADES[e][0] for e in (entidades or ENTIDADES) if e in ENTIDADES]
+    if consulta is None or not codigos:
+        return []
+
+    # bm25 não pode ser usado dentro da função de janela, daí a CTE materializada
+    linhas = db.session.execute(text(f"""
+        WITH correspondencias AS MATERIALIZED (
+            SELECT rowid AS documento, bm25({TABELA_INDICE}, {_PESOS}) AS relevancia
+            FROM {TABELA_INDICE}
+            WHERE {TABELA_INDICE} MATCH :consulta AND rowid % {FATOR_ROWID} IN :codigos
+        )
+        SELECT documento, relevancia FROM (
+            SELECT documento, relevancia,
+                   row_number() OVER (PARTITION BY documento % {FATOR_ROWID} ORDER BY relevancia) AS posicao
+            FROM correspondencias
+        )
+        WHERE posicao <= :limite
+        ORDER BY relevancia
+    """).bindparams(bindparam('codigos', expanding=True)),
+        {'consulta': consulta, 'codigos': codigos, 'limite': limite}).all()
+
+    encontrados = [
+        (_ENTIDADE_DO_CODIGO[documento % FATOR_ROWID], documento // FATOR_ROWID, relevancia)
+        for documento, relevancia in linhas
+    ]
+    ids_por_entidade = defaultdict(list)
+    for entidade, registro_id, _ in encontrados:
+        ids_por_entidade[entidade].append(registro_id)
+
+    objetos = {}
+    for entidade, ids in ids_por_entidade.items():
+        modelo = ENTIDADES[entidade][1]
+        for objeto in modelo.query.filter(modelo.id.in_(ids)):
+            objetos[(entidade, objeto.id)] = objeto
+
+    return [
+        Resultado(entidade, objetos[(entidade, registro_id)], -relevancia)
+        for entidade, registro_id, relevancia in encontrados
+        if (entidade, registro_id) in objetos
+    ]
+
+
+def _buscar_documento(digitos, entidades, limite):
+    """Busca por CPF/telefone: CPF exato primeiro, depois os que começam com os dígitos"""
+    resultados = []
+    for entidade in entidades:
+        if entidade not in ENTIDADES:
+            continue
+        modelo = ENTIDADES[entidade][1]
+        pessoa = Responsavel if modelo is Contrato else modelo
+        consulta = modelo.query.filter(filtro_documento(modelo, digitos))
+        if modelo is Contrato:
+            consulta = consulta.join(Contrato.responsavel).options(contains_eager(Contrato.responsavel))
+        for objeto in consulta.order_by(pessoa.nome).limit(limite):
+            dono = objeto.responsavel if modelo is Contrato else objeto
+            resultados.append(Resultado(entidade, objeto, 1.0 if dono.cpf_digitos == digitos else 0.5))
+    return sorted(resultados, key=lambda resultado: -resultado.relevancia)
+
+
+# Sincronização com a sessão
+
+def _alterou_campos(objeto, campos):
+    estado = inspect(objeto)
+    return any(estado.attrs[campo].history.has_changes() for campo in campos)
+
+
+def _antes_do_flush(session, flush_context, instances):
+    pendentes = session.info.setdefault(_CHAVE_PENDENTES, [])
+    for objeto in list(session.new) + list(session.deleted):
+        entidade = _ENTIDADE_DO_MODELO.get(type(objeto))
+        if entidade:
+            pendentes.append((entidade, objeto))
+    for objeto in session.dirty:
+        entidade = _ENTIDADE_DO_MODELO.get(type(objeto))
+        if entidade and _alterou_campos(objeto, ENTIDADES[entidade][2]):
+            pendentes.append((entidade, objeto))
+
+
+def _depois_do_flush(session, flush_context):
+    pendentes = session.info.pop(_CHAVE_PENDENTES, None)
+    if not pendentes:
+        return
+    ids = defaultdict(set)
+    for entidade, objeto in pendentes:
+        if objeto.id is not None:
+            ids[entidade].add(objeto.id)
+
+    conexao = session.connection()
+    if ids['responsavel']:
+        # O nome do responsável é o título dos seus contratos
+        ids['contrato'].update(conexao.execute(
+            select(Contrato.id).where(Contrato.responsavel_id.in_(ids['responsavel']))
+        ).scalars())
+    for entidade, registros in ids.items():
+        reindexar(conexao, entidade, registros)
+
+
+def _criar_com_as_tabelas(metadata, conexao, **kwargs):
+    if conexao.dialect.name == 'sqlite':
+        criar_indice(conexao)
+
+
+def _remover_com_as_tabelas(metadata, conexao, **kwargs):
+    if conexao.dialect.name == 'sqlite':
+        conexao.exec_driver_sql(f'DROP TABLE IF EXISTS {TABELA_INDICE}')
+
+
+def registrar_eventos():
+    """Mantém o índice de busca em dia com os flushes da sessão e com db.create_all()"""
+    if not event.contains(db.session, 'before_flush', _antes_do_flush):
+        event.listen(db.session, 'before_flush', _antes_do_flush)
+        event.listen(db.session, 'after_flush', _depois_do_flush)
+        event.listen(db.metadata, 'after_create', _criar_com_as_tabelas)
+        event.listen(db.metadata, 'before_drop', _remover_com_as_tabelas)
+
+
+@busca_cli.command('reindexar')
+def reindexar_command():
+    """Reconstrói o índice de busca a partir das tabelas"""
+    reconstruir_indice(db.session.connection())
+    db.session.commit()
+    total = db.session.execute(text(f'SELECT count(*) FROM {TABELA_INDICE}')).scalar()
+    click.echo(f'Índice de busca reconstruído: {total} documentos.')
+
+
+@busca_cli.command('consultar')
+@click.argument('termo')
+@click.option('--limite', default=10, show_default=True, help='Resultados por entidade')
+def consultar_command(termo, limite):
+    """Mostra os resultados da busca e o tempo gasto"""
+    inicio = time.perf_counter()
+    resultados = buscar(termo, limite=limite)
+    duracao_ms = (time.perf_counter() - inicio) * 1000
+    for resultado in resultados:
+        click.echo(f'{resultado.relevancia:8.3f}  {resultado.entidade:<12} #{resultado.objeto.id}')
+    click.echo(f'{len(resultados)} resultado(s) em {duracao_ms:.1f} ms.')
@@ -0,0 +1,253 @@
+"""
+Cache de dados da aplicação (contadores e estatísticas dos dashboards)
+O backend padrão é um LRU em memória, por processo; com CACHE_TIPO=arquivos os
+valores ficam em disco e são compartilhados entre os workers do gunicorn.
+Cada função cacheada declara as tabelas de que depende: ao confirmar uma transação
+que alterou alguma delas, a versão da tabela muda e as entradas antigas deixam de valer.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, has_app_context
+from sqlalchemy import event
+
+from app import db
+
+AUSENTE = object()
+
+_CHAVE_PENDENTES = 'cache_tabelas_alteradas'
+
+
+class CacheMemoria:
+    """LRU em memória com validade por entrada"""
+
+    def __init__(self, max_itens=1024):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        self._versoes = {}
+        self._trava = threading.Lock()
+
+    def obter(self, chave):
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is None:
+                return AUSENTE
+            expira_em, valor = item
+            if expira_em is not None and expira_em <= time.monotonic():
+                del self._itens[chave]
+                return AUSENTE
+            self._itens.move_to_end(chave)
+            return valor
+
+    def gravar(self, chave, valor, ttl=None):
+        expira_em = time.monotonic() + ttl if ttl else None
+        with self._trava:
+            self._itens[chave] = (expira_em, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def versao(self, tabela):
+        return self._versoes.get(tabela, 0)
+
+    def nova_versao(self, tabela):
+        with self._trava:
+            self._versoes[tabela] = self._versoes.get(tabela, 0) + 1
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+            self._versoes.clear()
+
+
+class CacheArquivos:
+    """Entradas em arquivos pickle (um por chave), compartilhadas entre processos"""
+
+    LIMPEZA_A_CADA = 200  # gravações entre varreduras de arquivos expirados
+
+    def __init__(self, diretorio):
+        self.diretorio = os.path.abspath(diretorio)
+        self._gravacoes = 0
+
+    def _caminho(self, nome, extensao='.cache'):
+        return os.path.join(self.diretorio, hashlib.sha1(nome.encode('utf-8')).hexdigest() + extensao)
+
+    def _ler(self, caminho):
+        try:
+            with open(caminho, 'rb') as arquivo:
+                return pickle.load(arquivo)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return AUSENTE
+
+    def _escrever(self, caminho, conteudo):
+        os.makedirs(self.diretorio, exist_ok=True)
+        descritor, temporario = tempfile.mkstemp(suffix='.tmp', dir=self.diretorio)
+        try:
+            with os.fdopen(descritor, 'wb') as arquivo:
+                pickle.dump(conteudo, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporario, caminho)
+        except Exception:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+    def obter(self, chave):
+        item = self._ler(self._caminho(chave))
+        if item is AUSENTE:
+            return AUSENTE
+        expira_em, valor = item
+        if expira_em is not None and expira_em <= time.time():
+            return AUSENTE
+        return valor
+
+    def gravar(self, chave, valor, ttl=None):
+        self._escrever(self._caminho(chave), (time.time() + ttl if ttl else None, valor))
+        self._gravacoes += 1
+        if self._gravacoes % self.LIMPEZA_A_CADA == 0:
+            self.remover_expirados()
+
+    def versao(self, tabela):
+        versao = self._ler(self._caminho(tabela, '.versao'))
+        return 0 if versao is AUSENTE else versao
+
+    def nova_versao(self, tabela):
+        # Valor único em vez de contador: dois processos invalidando juntos não geram a mesma versão
+        self._escrever(self._caminho(tabela, '.versao'), time.time_ns())
+
+    def remover_expirados(self):
+        agora = time.time()
+        try:
+            entradas = list(os.scandir(self.diretorio))
+        except FileNotFoundError:
+            return
+        for entrada in entradas:
+            if not entrada.name.endswith('.cache'):
+                continue
+            item = self._ler(entrada.path)
+            if item is AUSENTE or (item[0] is not None and item[0] <= agora):
+                try:
+                    os.remove(entrada.path)
+                except FileNotFoundError:
+                    pass
+
+    def limpar(self):
+        try:
+            entradas = list(os.scandir(self.diretorio))
+        except FileNotFoundError:
+            return
+        for entrada in entradas:
+            if entrada.name.endswith(('.cache', '.versao')):
+                try:
+                    os.remove(entrada.path)
+                except FileNotFoundError:
+                    pass
+
+
+class CacheDados:
+    """Extensão Flask que escolhe o backend conforme CACHE_TIPO"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.config.get('CACHE_TIPO', 'memoria') == 'arquivos':
+            backend = CacheArquivos(app.config['CACHE_DIR'])
+        else:
+            backend = CacheMemoria(app.config.get('CACHE_MAX_ITENS', 1024))
+        app.extensions['cache_dados'] = backend
+
+    @property
+    def backend(self):
+        if not has_app_context():
+            return None
+        return current_app.extensions.get('cache_dados')
+
+
+cache_dados = CacheDados()
+
+
+def invalidar(*tabelas):
+    """Invalida as entradas que dependem das tabelas informadas"""
+    backend = cache_dados.backend
+    if backend is None:
+        return
+    for tabela in set(tabelas):
+        backend.nova_versao(tabela)
+
+
+def cacheado(ttl=None, dependencias=()):
+    """
+    Guarda o resultado da função por `ttl` segundos (padrão: CACHE_TTL_PADRAO), por
+    combinação de argumentos. `dependencias` são nomes de tabelas; alterá-las invalida o resultado.
+    """
+    def decorador(funcao):
+        prefixo = f'{funcao.__module__}.{funcao.__qualname__}'
+
+        @wraps(funcao)
+        def envolvida(*args, **kwargs):
+            backend = cache_dados.backend
+            if backend is None:
+                return funcao(*args, **kwargs)
+
+            versoes = tuple(backend.versao(tabela) for tabela in dependencias)
+            chave = f'{prefixo}:{args!r}:{sorted(kwargs.items())!r}:{versoes!r}'
+            valor = backend.obter(chave)
+            if valor is AUSENTE:
+                valor = funcao(*args, **kwargs)
+                backend.gravar(chave, valor, ttl or current_app.config.get('CACHE_TTL_PADRAO', 60))
+            return valor
+
+        envolvida.invalidar = lambda: invalidar(*dependencias)
+        return envolvida
+    return decorador
+
+
+def _tabelas_pendentes(session):
+    return session.info.setdefault(_CHAVE_PENDENTES, set())
+
+
+def _antes_do_flush(session, flush_context, instances):
+    pendentes = _tabelas_pendentes(session)
+    for objeto in list(session.new) + list(session.deleted):
+        pendentes.add(objeto.__table__.name)
+    for objeto in session.dirty:
+        if session.is_modified(objeto):
+            pendentes.add(objeto.__table__.name)
+
+
+def _ao_executar(estado):
+    # INSERT/UPDATE/DELETE em massa (db.session.execute(update(...))) não passam pelo flush
+    if estado.is_insert or estado.is_update or estado.is_delete:
+        tabela = getattr(estado.statement, 'table', None)
+        if tabela is not None:
+            _tabelas_pendentes(estado.session).add(tabela.name)
+
+
+def _depois_do_commit(session):
+    pendentes = session.info.pop(_CHAVE_PENDENTES, None)
+    if pendentes:
+        try:
+            invalidar(*pendentes)
+        except Exception as e:
+            current_app.logger.error(f'Erro ao invalidar o cache de dados: {str(e)}')
+
+
+def _depois_do_rollback(session, transacao_anterior):
+    if transacao_anterior.parent is None:
+        session.info.pop(_CHAVE_PENDENTES, None)
+
+
+def registrar_eventos():
+    """Invalida o cache ao confirmar transações que alteraram tabelas"""
+    if not event.contains(db.session, 'before_flush', _antes_do_flush):
+        event.listen(db.session, 'before_flush', _antes_do_flush)
+        event.listen(db.session, 'do_orm_execute', _ao_executar)
+        event.listen(db.session, 'after_commit', _depois_do_commit)
+        event.listen(db.session, 'after_soft_rollback', _depois_do_rollback)
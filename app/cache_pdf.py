@@ -0,0 +1,171 @@
+"""
+Cache de PDFs de contratos endereçado por conteúdo
+Cada PDF é gravado como <hash>.pdf, onde o hash vem dos dados normalizados do
+contrato e da versão do modelo: entradas idênticas compartilham o mesmo arquivo
+e não passam de novo pelo ReportLab. O diretório tem tamanho máximo e os
+arquivos menos usados recentemente são removidos primeiro; por isso o PDF de um
+contrato emitido (Contrato.arquivo) é sempre arquivado fora do cache com arquivar().
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+from flask import current_app, has_app_context
+
+DIRETORIO_PADRAO = os.path.join('static', 'contratos', 'cache')
+DIRETORIO_CONTRATOS = os.path.join('static', 'contratos')
+LIMITE_PADRAO_MB = 200
+
+_trava_remocao = threading.Lock()
+
+
+def normalizar(valor):
+    """Normaliza os dados de entrada para que a mesma informação gere sempre o mesmo hash"""
+    if isinstance(valor, dict):
+        return {str(chave): normalizar(item) for chave, item in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [normalizar(item) for item in valor]
+    if isinstance(valor, bool) or valor is None:
+        return valor
+    if isinstance(valor, (int, float, Decimal)):
+        return str(Decimal(str(valor)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+    if isinstance(valor, datetime):
+        return valor.date().isoformat()
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return ' '.join(str(valor).split())
+
+
+def chave_conteudo(modelo, versao, dados):
+    """Hash SHA-256 dos dados normalizados + identificação do modelo"""
+    conteudo = json.dumps(
+        {'modelo': modelo, 'versao': versao, 'dados': normalizar(dados)},
+        sort_keys=True, ensure_ascii=False, separators=(',', ':')
+    )
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+class CachePDF:
+    """Armazenamento deduplicado de PDFs com remoção LRU por tamanho total"""
+
+    def __init__(self, diretorio=DIRETORIO_PADRAO, limite_bytes=LIMITE_PADRAO_MB * 1024 * 1024):
+        self.diretorio = os.path.abspath(diretorio)
+        self.limite_bytes = limite_bytes
+
+    def caminho(self, chave):
+        return os.path.join(self.diretorio, f'{chave}.pdf')
+
+    def obter(self, chave):
+        """Caminho do PDF em cache (atualizando o último uso) ou None"""
+        caminho = self.caminho(chave)
+        try:
+            os.utime(caminho)
+        except FileNotFoundError:
+            return None
+        return caminho
+
+    def gravar(self, chave, gerar):
+        """Gera o PDF com gerar(caminho_temporario) e o publica atomicamente no cache"""
+        os.makedirs(self.diretorio, exist_ok=True)
+        descritor, temporario = tempfile.mkstemp(suffix='.pdf.tmp', dir=self.diretorio)
+        os.close(descritor)
+        try:
+            gerar(temporario)
+            os.replace(temporario, self.caminho(chave))
+        except Exception:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        self.remover_excedentes(manter=chave)
+        return self.caminho(chave)
+
+    def obter_ou_gerar(self, chave, gerar):
+        """Devolve o PDF em cache ou o gera uma única vez"""
+        return self.obter(chave) or self.gravar(chave, gerar)
+
+    def remover_excedentes(self, manter=None):
+        """Remove os PDFs usados há mais tempo até o cache caber no limite. Retorna quantos foram removidos."""
+        with _trava_remocao:
+            arquivos = []
+            total = 0
+            with os.scandir(self.diretorio) as entradas:
+                for entrada in entradas:
+                    if not entrada.name.endswith('.pdf'):
+                        continue
+                    try:
+                        info = entrada.stat()
+                    except FileNotFoundError:
+                        continue  # removido por outro processo
+                    arquivos.append((info.st_mtime, info.st_size, entrada.path))
+                    total += info.st_size
+
+            removidos = 0
+            for _, tamanho, caminho in sorted(arquivos):
+                if total <= self.limite_bytes:
+                    break
+                if manter and caminho == self.caminho(manter):
+                    continue
+                try:
+                    os.remove(caminho)
+                except FileNotFoundError:
+                    pass
+                total -= tamanho
+                removidos += 1
+            return removidos
+
+    def arquivar(self, caminho, nome, diretorio=None):
+        """
+        Cópia permanente de um PDF do cache (hard link quando possível, sem ocupar espaço
+        a mais), fora do alcance de remover_excedentes. Caminhos fora do cache são devolvidos como estão.
+        """
+        if os.path.dirname(os.path.abspath(caminho)) != self.diretorio:
+            return caminho
+        diretorio = os.path.abspath(diretorio or _diretorio_contratos())
+        os.makedirs(diretorio, exist_ok=True)
+        destino = os.path.join(diretorio, nome)
+        if os.path.exists(destino):
+            return destino
+        try:
+            os.link(caminho, destino)
+        except FileExistsError:
+            pass
+        except OSError:
+            # Sem suporte a hard link (outro volume, sistema de arquivos): copia e publica atomicamente
+            descritor, temporario = tempfile.mkstemp(suffix='.pdf.tmp', dir=diretorio)
+            os.close(descritor)
+            try:
+                shutil.copyfile(caminho, temporario)
+                os.replace(temporario, destino)
+            except Exception:
+                if os.path.exists(temporario):
+                    os.remove(temporario)
+                raise
+        return destino
+
+
+def _diretorio_contratos():
+    if not has_app_context():
+        return DIRETORIO_CONTRATOS
+    return current_app.config.get('PDF_CONTRATOS_DIR', DIRETORIO_CONTRATOS)
+
+
+def arquivar_contrato(contrato_id, caminho, cache=None):
+    """Caminho permanente do PDF emitido para o contrato (para gravar em Contrato.arquivo)"""
+    chave = os.path.splitext(os.path.basename(caminho))[0]
+    return (cache or cache_pdf()).arquivar(caminho, f'contrato_{contrato_id}_{chave}.pdf')
+
+
+def cache_pdf():
+    """Cache configurado para a aplicação atual (PDF_CACHE_DIR / PDF_CACHE_MAX_MB)"""
+    if not has_app_context():
+        return CachePDF()
+    config = current_app.config
+    return CachePDF(
+        config.get('PDF_CACHE_DIR', DIRETORIO_PADRAO),
+        config.get('PDF_CACHE_MAX_MB', LIMITE_PADRAO_MB) * 1024 * 1024
+    )
@@ -0,0 +1,109 @@
+"""
+Perfis de carregamento das listagens
+Cada perfil reúne as opções joinedload/selectinload de que o template da view precisa,
+para que a página carregue os relacionamentos em poucas consultas fixas em vez de uma
+por linha. O orçamento de consultas por página é conferido com flask consultas orcamento.
+"""
+
+from contextlib import contextmanager
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.models import db, User, Aluno, Contrato, ContratoAluno
+
+consultas_cli = AppGroup('consultas', help='Consultas SQL emitidas pelas páginas')
+
+# Responsável (nome/telefone) e alunos de cada contrato
+_CONTRATO_COM_PARTES = (
+    joinedload(Contrato.responsavel),
+    selectinload(Contrato.alunos).joinedload(ContratoAluno.aluno),
+)
+
+PERFIS = {
+    'lista_contratos': _CONTRATO_COM_PARTES,
+    'vencimentos': _CONTRATO_COM_PARTES,
+    'relatorio_contratos': _CONTRATO_COM_PARTES + (joinedload(Contrato.professor),),
+    'alunos_com_contratos': (
+        joinedload(Aluno.responsavel),
+        selectinload(Aluno.contratos).joinedload(ContratoAluno.contrato),
+    ),
+}
+
+
+def perfil_carregamento(nome):
+    """Opções de carregamento do perfil (para usar em query.options(*perfil_carregamento(...)))"""
+    return PERFIS[nome]
+
+
+@contextmanager
+def contador_consultas():
+    """Registra as instruções SQL executadas dentro do bloco"""
+    instrucoes = []
+
+    def registrar(conexao, cursor, instrucao, parametros, contexto, executemany):
+        instrucoes.append(instrucao)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', registrar)
+    try:
+        yield instrucoes
+    finally:
+        event.remove(engine, 'before_cursor_execute', registrar)
+
+
+# Páginas conferidas e número máximo de consultas de cada uma, independente do volume de dados
+ORCAMENTOS = {
+    '/contratos': 10,
+    '/contratos/vencimentos': 10,
+    '/relatorios/contratos': 10,
+    '/alunos/com-contratos': 10,
+}
+
+
+@consultas_cli.command('orcamento')
+@click.option('--email', default=None, help='Administrador usado nas requisições (padrão: o primeiro)')
+@click.option('--mostrar', is_flag=True, help='Lista as consultas de cada página')
+def orcamento_command(email, mostrar):
+    """Requisita cada listagem e falha se alguma emitir mais consultas que o orçamento ou não responder 2xx"""
+    consulta = User.query.filter_by(role='admin')
+    usuario = consulta.filter_by(email=email).first() if email else consulta.order_by(User.id).first()
+    if not usuario:
+        raise click.ClickException('Nenhum administrador encontrado.')
+    usuario_id = usuario.id
+    db.session.remove()
+
+    cliente = current_app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao['_user_id'] = str(usuario_id)
+
+    excedidas = 0
+    com_erro = 0
+    for url, maximo in ORCAMENTOS.items():
+        with contador_consultas() as instrucoes:
+            try:
+                status = cliente.get(url).status_code
+                resultado = f'HTTP {status}'
+            except Exception as e:
+                status = None
+                resultado = f'erro na página ({e.__class__.__name__})'
+        total = len(instrucoes)
+        # Uma página que quebra para antes de montar o template: a contagem não vale
+        falhou = status is None or not 200 <= status < 300
+        if falhou:
+            situacao = 'FALHOU'
+        else:
+            situacao = 'ok' if total <= maximo else 'EXCEDIDO'
+        excedidas += not falhou and total > maximo
+        com_erro += falhou
+        click.echo(f'{url:<28} {total:>3}/{maximo} consultas  {situacao}  [{resultado}]')
+        if mostrar or falhou or total > maximo:
+            for instrucao in instrucoes:
+                click.echo('    ' + ' '.join(instrucao.split())[:150])
+
+    if excedidas or com_erro:
+        raise click.ClickException(
+            f'{excedidas} página(s) acima do orçamento de consultas, {com_erro} página(s) com erro.'
+        )
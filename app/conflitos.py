@@ -0,0 +1,125 @@
+"""
+Detecção de conflitos de horário entre aulas
+Consultas indexadas por (professor_id, data_hora) / (aluno_id, data_hora)
+e árvore de intervalos em memória para verificar vários horários de uma vez
+"""
+
+from datetime import timedelta
+from sqlalchemy import and_, or_
+
+# Limite de duração de uma aula. Permite limitar a busca por data_hora
+# a uma janela fechada, de forma que o índice composto seja usado.
+DURACAO_MAXIMA_AULA_MINUTOS = 12 * 60
+DURACAO_MAXIMA_AULA = timedelta(minutes=DURACAO_MAXIMA_AULA_MINUTOS)
+
+
+class ArvoreIntervalos:
+    """
+    Árvore de intervalos estática sobre intervalos semiabertos [inicio, fim).
+    Os intervalos ficam ordenados pelo início e cada nó guarda o maior fim da
+    sua subárvore, o que permite responder sobreposições em O(log n + k).
+    """
+
+    def __init__(self, intervalos=()):
+        # Cada item é uma tupla (inicio, fim, valor)
+        self._itens = sorted(intervalos, key=lambda item: (item[0], item[1]))
+        self._maior_fim = [None] * len(self._itens)
+        self._construir(0, len(self._itens))
+
+    def __len__(self):
+        return len(self._itens)
+
+    def _construir(self, inicio, fim):
+        """Calcula o maior fim de cada subárvore (o nó é o meio do intervalo do vetor)"""
+        if inicio >= fim:
+            return None
+        meio = (inicio + fim) // 2
+        maior = self._itens[meio][1]
+        for maior_filho in (self._construir(inicio, meio), self._construir(meio + 1, fim)):
+            if maior_filho is not None and maior_filho > maior:
+                maior = maior_filho
+        self._maior_fim[meio] = maior
+        return maior
+
+    def sobrepostos(self, inicio, fim):
+        """Retorna os valores dos intervalos que se sobrepõem a [inicio, fim), ordenados pelo início"""
+        encontrados = []
+        pilha = [(0, len(self._itens))]
+        while pilha:
+            esquerda, direita = pilha.pop()
+            if esquerda >= direita:
+                continue
+            meio = (esquerda + direita) // 2
+            # Nenhum intervalo desta subárvore termina depois do início procurado
+            if self._maior_fim[meio] <= inicio:
+                continue
+            pilha.append((esquerda, meio))
+            item_inicio, item_fim, valor = self._itens[meio]
+            # Intervalos à direita começam depois deste; só descemos se este começa antes do fim
+            if item_inicio < fim:
+                if item_fim > inicio:
+                    encontrados.append((item_inicio, valor))
+                pilha.append((meio + 1, direita))
+        encontrados.sort(key=lambda item: item[0])
+        return [valor for _, valor in encontrados]
+
+    def sobrepoe(self, inicio, fim):
+        """Indica se algum intervalo se sobrepõe a [inicio, fim)"""
+        return bool(self.sobrepostos(inicio, fim))
+
+
+def _filtro_janela(coluna_entidade, entidade_id, inicio, fim):
+    """Filtro indexável: entidade + janela limitada de data_hora + término após o início"""
+    from app.models import Aula
+
+    return and_(
+        coluna_entidade == entidade_id,
+        Aula.data_hora > inicio - DURACAO_MAXIMA_AULA,
+        Aula.data_hora < fim,
+        Aula.data_hora_fim > inicio
+    )
+
+
+def consultar_aulas_no_periodo(professor_id, aluno_id, inicio, fim, excluir_ids=None):
+    """Busca as aulas do professor ou do aluno que se sobrepõem a [inicio, fim)"""
+    from app.models import Aula
+
+    filtros = []
+    if professor_id:
+        filtros.append(_filtro_janela(Aula.professor_id, int(professor_id), inicio, fim))
+    if aluno_id:
+        filtros.append(_filtro_janela(Aula.aluno_id, int(aluno_id), inicio, fim))
+    if not filtros:
+        return []
+
+    query = Aula.query.filter(or_(*filtros))
+    if excluir_ids:
+        query = query.filter(~Aula.id.in_(excluir_ids))
+
+    return query.order_by(Aula.data_hora).all()
+
+
+def carregar_arvore(professor_id, aluno_id, inicio, fim, excluir_ids=None):
+    """Monta a árvore de intervalos com as aulas do professor/aluno entre inicio e fim"""
+    aulas = consultar_aulas_no_periodo(professor_id, aluno_id, inicio, fim, excluir_ids)
+    return ArvoreIntervalos((aula.data_hora, aula.data_hora_fim, aula) for aula in aulas)
+
+
+def verificar_conflitos_lote(professor_id, aluno_id, horarios, excluir_ids=None):
+    """
+    Verifica vários horários (lista de tuplas (inicio, fim)) com uma única consulta.
+    Retorna uma lista de (inicio, fim, aulas_em_conflito) apenas para os horários com conflito.
+    """
+    if not horarios:
+        return []
+
+    primeiro_inicio = min(inicio for inicio, _ in horarios)
+    ultimo_fim = max(fim for _, fim in horarios)
+    arvore = carregar_arvore(professor_id, aluno_id, primeiro_inicio, ultimo_fim, excluir_ids)
+
+    conflitos = []
+    for inicio, fim in horarios:
+        aulas = arvore.sobrepostos(inicio, fim)
+        if aulas:
+            conflitos.append((inicio, fim, aulas))
+    return conflitos
@@ -0,0 +1,184 @@
+"""
+Instrumentação de desempenho das requisições
+Conta as instruções SQL e o tempo de banco de cada requisição (eventos do engine),
+devolve os números no cabeçalho Server-Timing, registra consultas e requisições
+lentas em um log rotativo e guarda amostras recentes por endpoint para /admin/perf.
+As amostras ficam na memória de cada processo.
+"""
+
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from logging.handlers import RotatingFileHandler
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from app import db
+
+logger = logging.getLogger('app.desempenho')
+
+_CHAVE_INICIOS = 'desempenho_inicios'
+_SEM_ROTA = '<404>'  # URLs sem rota ficam numa chave só, senão cada caminho viraria um endpoint
+
+
+def _percentil(valores_ordenados, percentual):
+    """Percentil pelo método do posto mais próximo"""
+    if not valores_ordenados:
+        return 0
+    posicao = max(0, -(-len(valores_ordenados) * percentual // 100) - 1)
+    return valores_ordenados[int(posicao)]
+
+
+def _resumir_sql(instrucao, limite=500):
+    return ' '.join(instrucao.split())[:limite]
+
+
+class Desempenho:
+    """Extensão Flask de contagem de consultas e tempos por requisição"""
+
+    def __init__(self, app=None):
+        self._amostras = defaultdict(deque)
+        self._lentas = defaultdict(list)  # endpoint -> heap (duração, instrução) das mais lentas
+        self._trava = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['desempenho'] = self
+        if not app.config.get('DESEMPENHO_ATIVO', True):
+            return
+
+        self.consulta_lenta_ms = app.config.get('DESEMPENHO_CONSULTA_LENTA_MS', 100)
+        self.requisicao_lenta_ms = app.config.get('DESEMPENHO_REQUISICAO_LENTA_MS', 1000)
+        self.max_amostras = app.config.get('DESEMPENHO_AMOSTRAS', 500)
+        self.server_timing = app.config.get('DESEMPENHO_SERVER_TIMING', True)
+        self._configurar_log(app.config.get('DESEMPENHO_LOG'))
+
+        with app.app_context():
+            engine = db.engine
+        if not event.contains(engine, 'before_cursor_execute', self._antes_da_instrucao):
+            event.listen(engine, 'before_cursor_execute', self._antes_da_instrucao)
+            event.listen(engine, 'after_cursor_execute', self._depois_da_instrucao)
+            event.listen(engine, 'handle_error', self._erro_na_instrucao)
+
+        app.before_request(self._iniciar_requisicao)
+        app.after_request(self._finalizar_requisicao)
+
+    def _configurar_log(self, caminho):
+        if not caminho or any(getattr(h, 'baseFilename', None) == os.path.abspath(caminho) for h in logger.handlers):
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        handler = RotatingFileHandler(caminho, maxBytes=1024 * 1024, backupCount=5, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    # Eventos do engine
+
+    def _antes_da_instrucao(self, conexao, cursor, instrucao, parametros, contexto, executemany):
+        conexao.info.setdefault(_CHAVE_INICIOS, []).append(time.perf_counter())
+
+    def _depois_da_instrucao(self, conexao, cursor, instrucao, parametros, contexto, executemany):
+        inicios = conexao.info.get(_CHAVE_INICIOS)
+        if not inicios:
+            return
+        duracao_ms = (time.perf_counter() - inicios.pop()) * 1000
+
+        endpoint = '-'
+        if has_request_context() and 'desempenho' in g:
+            medidas = g.desempenho
+            medidas['consultas'] += 1
+            medidas['tempo_db_ms'] += duracao_ms
+            endpoint = request.endpoint or _SEM_ROTA
+            self._registrar_lenta(endpoint, duracao_ms, instrucao)
+
+        if duracao_ms >= self.consulta_lenta_ms:
+            logger.warning(f'consulta lenta {duracao_ms:.1f} ms [{endpoint}] {_resumir_sql(instrucao)}')
+
+    def _erro_na_instrucao(self, contexto):
+        # Sem after_cursor_execute quando a instrução falha: descarta o início empilhado
+        conexao = contexto.connection
+        if conexao is not None and not conexao.closed:
+            inicios = conexao.info.get(_CHAVE_INICIOS)
+            if inicios:
+                inicios.pop()
+
+    # Ciclo da requisição
+
+    def _iniciar_requisicao(self):
+        g.desempenho = {'inicio': time.perf_counter(), 'consultas': 0, 'tempo_db_ms': 0.0}
+
+    def _finalizar_requisicao(self, resposta):
+        medidas = g.pop('desempenho', None)
+        if medidas is None or request.endpoint == 'static':
+            return resposta
+
+        total_ms = (time.perf_counter() - medidas['inicio']) * 1000
+        endpoint = request.endpoint or _SEM_ROTA
+        self._registrar_amostra(endpoint, total_ms, medidas['consultas'], medidas['tempo_db_ms'])
+
+        if self.server_timing:
+            resposta.headers.add(
+                'Server-Timing',
+                f'db;dur={medidas["tempo_db_ms"]:.1f};desc="{medidas["consultas"]} consultas", '
+                f'total;dur={total_ms:.1f}'
+            )
+        if total_ms >= self.requisicao_lenta_ms:
+            logger.warning(
+                f'requisição lenta {total_ms:.1f} ms [{endpoint}] {request.method} {request.path} '
+                f'{medidas["consultas"]} consultas, {medidas["tempo_db_ms"]:.1f} ms no banco'
+            )
+        return resposta
+
+    # Agregação
+
+    def _registrar_amostra(self, endpoint, total_ms, consultas, tempo_db_ms):
+        with self._trava:
+            amostras = self._amostras[endpoint]
+            amostras.append((total_ms, consultas, tempo_db_ms))
+            while len(amostras) > self.max_amostras:
+                amostras.popleft()
+
+    def _registrar_lenta(self, endpoint, duracao_ms, instrucao, quantidade=5):
+        with self._trava:
+            lentas = self._lentas[endpoint]
+            if len(lentas) < quantidade:
+                heapq.heappush(lentas, (duracao_ms, _resumir_sql(instrucao, 300)))
+            elif duracao_ms > lentas[0][0]:
+                heapq.heapreplace(lentas, (duracao_ms, _resumir_sql(instrucao, 300)))
+
+    def resumo_por_endpoint(self):
+        """p50/p95 de tempo, consultas e tempo de banco das amostras recentes de cada endpoint"""
+        with self._trava:
+            amostras = {endpoint: list(valores) for endpoint, valores in self._amostras.items()}
+            lentas = {endpoint: sorted(valores, reverse=True) for endpoint, valores in self._lentas.items()}
+
+        resumo = []
+        for endpoint, valores in amostras.items():
+            tempos = sorted(v[0] for v in valores)
+            consultas = sorted(v[1] for v in valores)
+            tempos_db = sorted(v[2] for v in valores)
+            resumo.append({
+                'endpoint': endpoint,
+                'requisicoes': len(valores),
+                'p50_ms': _percentil(tempos, 50),
+                'p95_ms': _percentil(tempos, 95),
+                'max_ms': tempos[-1],
+                'consultas_p50': _percentil(consultas, 50),
+                'consultas_p95': _percentil(consultas, 95),
+                'db_p95_ms': _percentil(tempos_db, 95),
+                'lentas': lentas.get(endpoint, [])
+            })
+        return sorted(resumo, key=lambda item: item['p95_ms'], reverse=True)
+
+    def limpar(self):
+        with self._trava:
+            self._amostras.clear()
+            self._lentas.clear()
+
+
+desempenho = Desempenho()
@@ -0,0 +1,89 @@
+"""
+Estatísticas dos contratos para os dashboards
+Todos os totais saem de uma consulta agrupada por status × faixa × plano e o
+histograma mensal de uma segunda consulta agrupada por mês de início; o resultado
+fica no cache de dados (app.cache) até o TTL ou até a próxima alteração em contratos
+"""
+
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import extract, func
+
+from app.models import db, Contrato
+from app.periodos import intervalo_do_mes, meses_anteriores, periodo_entre
+from app.status_contratos import atualizar_status_se_necessario
+from app.cache import cacheado
+
+MESES_HISTOGRAMA = 12
+
+
+def _linhas_por_situacao():
+    return db.session.query(
+        Contrato.status,
+        Contrato.faixa_vencimento,
+        Contrato.tipo_plano,
+        func.count(Contrato.id),
+        func.coalesce(func.sum(Contrato.valor_total), 0)
+    ).group_by(Contrato.status, Contrato.faixa_vencimento, Contrato.tipo_plano).all()
+
+
+def histograma_mensal(hoje, meses=MESES_HISTOGRAMA):
+    """Contratos por mês de início nos últimos meses, incluindo os meses sem contratos"""
+    periodo = meses_anteriores(meses, hoje)
+    inicio, _ = intervalo_do_mes(*periodo[0])
+    _, fim = intervalo_do_mes(*periodo[-1])
+
+    ano = extract('year', Contrato.data_inicio)
+    mes = extract('month', Contrato.data_inicio)
+    totais = {
+        (int(linha_ano), int(linha_mes)): total
+        for linha_ano, linha_mes, total in db.session.query(ano, mes, func.count(Contrato.id))
+        .filter(periodo_entre(Contrato.data_inicio, inicio, fim))
+        .group_by(ano, mes)
+    }
+    return [{'mes': f'{m:02d}/{a}', 'total': totais.get((a, m), 0)} for a, m in periodo]
+
+
+@cacheado(dependencias=('contrato',))
+def calcular_estatisticas(hoje):
+    """Totais, quebras por status/faixa/plano e histograma mensal dos contratos"""
+    por_status = defaultdict(int)
+    por_faixa = defaultdict(int)
+    planos_ativos = defaultdict(int)
+    planos_em_vigor = defaultdict(int)
+    total = receita_ativa = valor_em_vigor = 0
+
+    for status, faixa, tipo_plano, quantidade, valor in _linhas_por_situacao():
+        total += quantidade
+        por_status[status] += quantidade
+        por_faixa[faixa] += quantidade
+        if status == 'ativo':
+            planos_ativos[tipo_plano] += quantidade
+            receita_ativa += valor
+        if faixa != Contrato.FAIXA_VENCIDO:
+            planos_em_vigor[tipo_plano] += quantidade
+            valor_em_vigor += valor
+
+    return {
+        'total_contratos': total,
+        'por_status': dict(por_status),
+        'por_faixa': dict(por_faixa),
+        # Pelo status (mantido pelo motor de status)
+        'contratos_ativos': por_status['ativo'],
+        'contratos_vencidos': por_status['vencido'],
+        'receita_ativa': receita_ativa,
+        'por_plano_ativos': sorted(planos_ativos.items()),
+        # Pela validade (em vigor = ainda não venceu, qualquer status)
+        'contratos_em_vigor': total - por_faixa[Contrato.FAIXA_VENCIDO],
+        'contratos_validade_vencida': por_faixa[Contrato.FAIXA_VENCIDO],
+        'contratos_vencendo': por_faixa[Contrato.FAIXA_30_DIAS],
+        'valor_em_vigor': valor_em_vigor,
+        'por_plano_em_vigor': sorted(planos_em_vigor.items()),
+        'contratos_por_mes': histograma_mensal(hoje)
+    }
+
+
+def estatisticas_contratos():
+    """Estatísticas do dia (em cache até o TTL ou até a próxima alteração em contratos)"""
+    atualizar_status_se_necessario()
+    return calcular_estatisticas(date.today())
@@ -0,0 +1,296 @@
+"""
+Eventos em tempo real por usuário (Server-Sent Events em /eventos/stream)
+Os eventos (nova notificação, aula criada/cancelada, PDF de contrato pronto) são
+gravados em evento_fila no mesmo flush da alteração e, após o commit, entregues às
+conexões abertas neste processo. Uma thread por processo lê as linhas novas de
+evento_fila (gravadas por outros workers) enquanto houver conexões abertas; ao
+reconectar, o navegador envia Last-Event-ID e recebe o que perdeu. Os eventos mais
+velhos que EVENTOS_RETENCAO_MINUTOS são apagados junto com as gravações (no máximo
+uma vez a cada EVENTOS_LIMPEZA_SEGUNDOS por processo), sem depender do agendador.
+"""
+
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, event, func, insert, inspect, or_, select
+
+from app.models import db, User, Aula, Contrato, Notificacao, EventoFila
+
+_CHAVE_PENDENTES = 'eventos_a_entregar'
+
+TAMANHO_FILA_CONEXAO = 100
+LIMITE_REENVIO = 100
+INTERVALO_PING = 15  # segundos; mantém a conexão viva através de proxies
+
+_proxima_limpeza = 0.0  # time.monotonic() a partir do qual enfileirar() apaga os eventos expirados
+
+
+class BarramentoEventos:
+    """Distribui os eventos às conexões abertas neste processo"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._assinantes = {}  # usuario_id -> set de filas (uma por conexão)
+        self._trava = threading.Lock()
+        self._entregues_aqui = set()  # ids já entregues localmente, ignorados pela leitura da tabela
+        self._ultimo_id = None
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['eventos'] = self
+
+    @property
+    def conexoes(self):
+        return sum(len(filas) for filas in self._assinantes.values())
+
+    def assinar(self, usuario_id):
+        """Fila que recebe os eventos do usuário até cancelar()"""
+        fila = queue.Queue(maxsize=TAMANHO_FILA_CONEXAO)
+        with self._trava:
+            self._assinantes.setdefault(usuario_id, set()).add(fila)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._ler_tabela, name='eventos', daemon=True)
+                self._thread.start()
+        return fila
+
+    def cancelar(self, usuario_id, fila):
+        with self._trava:
+            filas = self._assinantes.get(usuario_id)
+            if filas is not None:
+                filas.discard(fila)
+                if not filas:
+                    del self._assinantes[usuario_id]
+
+    def entregar(self, eventos, locais=False):
+        """Coloca os eventos (id, usuario_id, tipo, dados) nas filas das conexões do usuário"""
+        with self._trava:
+            if locais and self._ultimo_id is not None:
+                self._entregues_aqui.update(evento[0] for evento in eventos)
+            for evento in eventos:
+                for fila in self._assinantes.get(evento[1], ()):
+                    try:
+                        fila.put_nowait(evento)
+                    except queue.Full:
+                        pass  # cliente lento: recupera pelo Last-Event-ID ao reconectar
+
+    def _ler_tabela(self):
+        intervalo = self.app.config.get('EVENTOS_INTERVALO', 1.0)
+        while True:
+            time.sleep(intervalo)
+            if not self._assinantes:
+                # Sem conexões não há o que entregar; ao voltar, começa do fim da tabela
+                self._ultimo_id = None
+                continue
+            with self.app.app_context():
+                try:
+                    self._entregar_novos()
+                except Exception as e:
+                    self.app.logger.error(f'Erro ao ler a fila de eventos: {str(e)}', exc_info=True)
+                finally:
+                    db.session.remove()
+
+    def _entregar_novos(self):
+        if self._ultimo_id is None:
+            self._ultimo_id = db.session.scalar(select(func.coalesce(func.max(EventoFila.id), 0)))
+            return
+        linhas = db.session.execute(
+            select(EventoFila.id, EventoFila.usuario_id, EventoFila.tipo, EventoFila.dados)
+            .where(EventoFila.id > self._ultimo_id)
+            .order_by(EventoFila.id).limit(1000)
+        ).all()
+        if not linhas:
+            return
+        self._ultimo_id = linhas[-1][0]
+        with self._trava:
+            novos = [tuple(linha) for linha in linhas if linha[0] not in self._entregues_aqui]
+            self._entregues_aqui = {i for i in self._entregues_aqui if i > self._ultimo_id}
+        self.entregar(novos)
+
+
+barramento = BarramentoEventos()
+
+
+def enfileirar(session, eventos):
+    """
+    Grava os eventos (usuario_id, tipo, dados) na transação da sessão; são entregues
+    às conexões deste processo após o commit. Usar também após inserções em lote,
+    que não passam pelos eventos da sessão.
+    """
+    if not eventos:
+        return
+    agora = datetime.utcnow()
+    linhas = [
+        {'usuario_id': usuario_id, 'tipo': tipo, 'dados': json.dumps(dados, default=str), 'criado_em': agora}
+        for usuario_id, tipo, dados in eventos
+    ]
+    tabela = EventoFila.__table__
+    _limpar_se_necessario(session.connection())
+    ids = session.connection().execute(
+        insert(tabela).returning(tabela.c.id, sort_by_parameter_order=True), linhas
+    ).scalars().all()
+    session.info.setdefault(_CHAVE_PENDENTES, []).extend(
+        (evento_id, linha['usuario_id'], linha['tipo'], linha['dados']) for evento_id, linha in zip(ids, linhas)
+    )
+
+
+def reenviar(usuario_id, ultimo_id):
+    """Eventos do usuário posteriores ao ultimo_id (reconexão com Last-Event-ID)"""
+    return [tuple(linha) for linha in db.session.execute(
+        select(EventoFila.id, EventoFila.usuario_id, EventoFila.tipo, EventoFila.dados)
+        .where(EventoFila.usuario_id == usuario_id, EventoFila.id > ultimo_id)
+        .order_by(EventoFila.id).limit(LIMITE_REENVIO)
+    ).all()]
+
+
+def formatar(evento):
+    evento_id, _, tipo, dados = evento
+    return f'id: {evento_id}\nevent: {tipo}\ndata: {dados}\n\n'
+
+
+def fluxo(usuario_id, pendentes=(), duracao_maxima=300):
+    """
+    Gerador do corpo text/event-stream. Não usa o banco: a conexão fica aberta no
+    máximo duracao_maxima segundos e o navegador reconecta sozinho (com Last-Event-ID).
+    """
+    fila = barramento.assinar(usuario_id)
+    try:
+        yield 'retry: 3000\n\n'
+        enviados = set()
+        for evento in pendentes:
+            enviados.add(evento[0])
+            yield formatar(evento)
+        fim = time.monotonic() + duracao_maxima
+        while time.monotonic() < fim:
+            try:
+                evento = fila.get(timeout=min(INTERVALO_PING, max(0.1, fim - time.monotonic())))
+            except queue.Empty:
+                yield ': ping\n\n'
+                continue
+            # O mesmo evento pode chegar pela entrega local e pela leitura da tabela
+            if evento[0] not in enviados:
+                enviados.add(evento[0])
+                yield formatar(evento)
+    finally:
+        barramento.cancelar(usuario_id, fila)
+
+
+def _apagar_expirados(conexao, minutos=None):
+    minutos = minutos or current_app.config.get('EVENTOS_RETENCAO_MINUTOS', 60)
+    limite = datetime.utcnow() - timedelta(minutes=minutos)
+    tabela = EventoFila.__table__
+    return conexao.execute(delete(tabela).where(tabela.c.criado_em < limite)).rowcount
+
+
+def _limpar_se_necessario(conexao):
+    global _proxima_limpeza
+    agora = time.monotonic()
+    if agora >= _proxima_limpeza:
+        _proxima_limpeza = agora + current_app.config.get('EVENTOS_LIMPEZA_SEGUNDOS', 300)
+        _apagar_expirados(conexao)
+
+
+def remover_antigos(minutos=None):
+    """Apaga os eventos mais velhos que EVENTOS_RETENCAO_MINUTOS; devolve quantos apagou"""
+    try:
+        removidos = _apagar_expirados(db.session.connection(), minutos)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return removidos
+
+
+# Geração dos eventos a partir das alterações da sessão
+
+def _usuarios_das_aulas(conexao, aulas):
+    """{(campo, id do perfil): [ids de usuário]} dos alunos e professores das aulas"""
+    alunos = {aula.aluno_id for aula in aulas if aula.aluno_id}
+    professores = {aula.professor_id for aula in aulas if aula.professor_id}
+    usuarios = {}
+    for usuario_id, aluno_id, professor_id in conexao.execute(
+        select(User.id, User.aluno_id, User.professor_id)
+        .where(or_(User.aluno_id.in_(alunos), User.professor_id.in_(professores)))
+    ):
+        if aluno_id in alunos:
+            usuarios.setdefault(('aluno', aluno_id), []).append(usuario_id)
+        if professor_id in professores:
+            usuarios.setdefault(('professor', professor_id), []).append(usuario_id)
+    return usuarios
+
+
+def _eventos_de_aulas(conexao, criadas, canceladas):
+    usuarios = _usuarios_das_aulas(conexao, criadas + canceladas)
+    eventos = []
+    for tipo, aulas in (('aula_criada', criadas), ('aula_cancelada', canceladas)):
+        for aula in aulas:
+            dados = {'id': aula.id, 'data_hora': aula.data_hora, 'recorrente': bool(aula.recorrente)}
+            destinatarios = set(usuarios.get(('aluno', aula.aluno_id), ()))
+            destinatarios.update(usuarios.get(('professor', aula.professor_id), ()))
+            eventos.extend((usuario_id, tipo, dados) for usuario_id in destinatarios)
+    return eventos
+
+
+def _eventos_de_contratos(conexao, contratos):
+    # Responsáveis do contrato e administradores (acompanham a lista de contratos)
+    responsaveis = {contrato.responsavel_id for contrato in contratos}
+    usuarios = conexao.execute(
+        select(User.id, User.responsavel_id)
+        .where(or_(User.responsavel_id.in_(responsaveis), User.role == 'admin'))
+    ).all()
+    eventos = []
+    for contrato in contratos:
+        dados = {'id': contrato.id, 'tipo_plano': contrato.tipo_plano}
+        eventos.extend(
+            (usuario_id, 'contrato_pdf_pronto', dados)
+            for usuario_id, responsavel_id in usuarios
+            if responsavel_id is None or responsavel_id == contrato.responsavel_id
+        )
+    return eventos
+
+
+def _pdf_ficou_pronto(contrato):
+    historico = inspect(contrato).attrs.pdf_status.history
+    return historico.has_changes() and contrato.pdf_status == 'pronto'
+
+
+def _depois_do_flush(session, flush_context):
+    # Em after_flush as listas new/dirty/deleted ainda mostram o estado anterior ao flush
+    eventos = [
+        (objeto.usuario_id, 'notificacao', {'id': objeto.id, 'titulo': objeto.titulo, 'tipo': objeto.tipo})
+        for objeto in session.new if isinstance(objeto, Notificacao)
+    ]
+    criadas = [objeto for objeto in session.new if isinstance(objeto, Aula)]
+    canceladas = [objeto for objeto in session.deleted if isinstance(objeto, Aula)]
+    contratos = [objeto for objeto in session.dirty if isinstance(objeto, Contrato) and _pdf_ficou_pronto(objeto)]
+
+    conexao = session.connection()
+    if criadas or canceladas:
+        eventos.extend(_eventos_de_aulas(conexao, criadas, canceladas))
+    if contratos:
+        eventos.extend(_eventos_de_contratos(conexao, contratos))
+    enfileirar(session, eventos)
+
+
+def _depois_do_commit(session):
+    pendentes = session.info.pop(_CHAVE_PENDENTES, None)
+    if pendentes:
+        barramento.entregar(pendentes, locais=True)
+
+
+def _depois_do_rollback(session, transacao_anterior):
+    if transacao_anterior.parent is None:
+        session.info.pop(_CHAVE_PENDENTES, None)
+
+
+def registrar_eventos():
+    """Publica notificações, aulas e PDFs prontos confirmados pela sessão"""
+    if not event.contains(db.session, 'after_flush', _depois_do_flush):
+        event.listen(db.session, 'after_flush', _depois_do_flush)
+        event.listen(db.session, 'after_commit', _depois_do_commit)
+        event.listen(db.session, 'after_soft_rollback', _depois_do_rollback)
@@ -0,0 +1,169 @@
+"""
+Fila local de geração de PDFs de contratos
+As tarefas ficam na tabela tarefa_pdf (no próprio banco da aplicação, sem broker externo)
+e são processadas em segundo plano por um pool de threads, iniciado na primeira requisição
+do processo para retomar as tarefas que ficaram pendentes antes de um reinício
+"""
+
+import threading
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import update, or_, and_
+
+from app.models import db, TarefaPDF
+from app.cache_pdf import arquivar_contrato
+
+# Prioridades: números menores são processados primeiro
+PRIORIDADE_NORMAL = 0
+PRIORIDADE_RENOVACAO = 5
+
+MAX_TENTATIVAS = 3
+TEMPO_MAXIMO_PROCESSAMENTO = timedelta(minutes=10)
+INTERVALO_VERIFICACAO = 5  # segundos entre verificações da fila ociosa
+
+fila_cli = AppGroup('fila-pdf', help='Fila de geração de PDFs de contratos')
+
+
+def enfileirar_contrato(contrato, prioridade=PRIORIDADE_NORMAL):
+    """Agenda a geração do PDF do contrato (gravado junto com a transação atual)"""
+    contrato.pdf_status = 'pendente'
+    tarefa = TarefaPDF(contrato=contrato, prioridade=prioridade)
+    db.session.add(tarefa)
+    return tarefa
+
+
+def _reservar_proxima_tarefa():
+    """Reserva atomicamente a próxima tarefa pendente (ou travada há muito tempo)"""
+    limite_travada = datetime.utcnow() - TEMPO_MAXIMO_PROCESSAMENTO
+    disponivel = or_(
+        TarefaPDF.status == 'pendente',
+        and_(TarefaPDF.status == 'processando', TarefaPDF.iniciado_em < limite_travada)
+    )
+
+    candidatas = db.session.query(TarefaPDF.id).filter(disponivel)\
+        .order_by(TarefaPDF.prioridade, TarefaPDF.id).limit(5).all()
+
+    for (tarefa_id,) in candidatas:
+        resultado = db.session.execute(
+            update(TarefaPDF)
+            .where(TarefaPDF.id == tarefa_id, disponivel)
+            .values(status='processando', iniciado_em=datetime.utcnow(),
+                    tentativas=TarefaPDF.tentativas + 1)
+        )
+        db.session.commit()
+        if resultado.rowcount == 1:
+            return db.session.get(TarefaPDF, tarefa_id)
+    return None
+
+
+def processar_tarefa(tarefa):
+    """Gera o PDF de uma tarefa reservada e registra o resultado"""
+    from app.gerador_contratos import gerar_contrato_pdf
+
+    contrato = tarefa.contrato
+    try:
+        alunos = [associacao.aluno for associacao in contrato.alunos]
+        contrato.arquivo = arquivar_contrato(contrato.id, gerar_contrato_pdf(
+            contrato.responsavel, alunos, contrato.tipo_plano, contrato.valor_total,
+            contrato.data_inicio, contrato.validade, contrato.observacoes or '', contrato.data_emissao
+        ))
+        contrato.pdf_status = 'pronto'
+        tarefa.status = 'concluida'
+        tarefa.erro = None
+        tarefa.concluido_em = datetime.utcnow()
+        db.session.commit()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Erro ao gerar PDF do contrato {tarefa.contrato_id}: {str(e)}', exc_info=True)
+        tarefa = db.session.get(TarefaPDF, tarefa.id)
+        tarefa.erro = str(e)[:500]
+        if tarefa.tentativas >= MAX_TENTATIVAS:
+            tarefa.status = 'erro'
+            tarefa.concluido_em = datetime.utcnow()
+            tarefa.contrato.pdf_status = 'erro'
+        else:
+            tarefa.status = 'pendente'
+        db.session.commit()
+        return False
+
+
+def processar_pendentes(limite=None):
+    """Processa tarefas pendentes no processo atual. Retorna quantas foram processadas."""
+    processadas = 0
+    while limite is None or processadas < limite:
+        tarefa = _reservar_proxima_tarefa()
+        if tarefa is None:
+            break
+        processar_tarefa(tarefa)
+        processadas += 1
+    return processadas
+
+
+class FilaPDF:
+    """Pool de threads que consome a fila de PDFs em segundo plano"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._threads = []
+        self._sinal = threading.Event()
+        self._trava = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['fila_pdf'] = self
+        app.before_request(self._iniciar_workers)
+
+    @property
+    def total_workers(self):
+        return self.app.config.get('PDF_FILA_WORKERS', 2) if self.app else 0
+
+    def _garantir_workers(self):
+        with self._trava:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.total_workers:
+                thread = threading.Thread(
+                    target=self._executar, name=f'fila-pdf-{len(self._threads) + 1}', daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _iniciar_workers(self):
+        # Os workers verificam a fila a cada INTERVALO_VERIFICACAO segundos, então
+        # também consomem as tarefas deixadas por um processo anterior
+        if self.total_workers > 0 and len(self._threads) < self.total_workers:
+            self._garantir_workers()
+
+    def notificar(self):
+        """Avisa os workers de que há tarefas novas (chamar após o commit)"""
+        if self.total_workers <= 0:
+            return
+        self._garantir_workers()
+        self._sinal.set()
+
+    def _executar(self):
+        while True:
+            self._sinal.wait(INTERVALO_VERIFICACAO)
+            self._sinal.clear()
+            with self.app.app_context():
+                try:
+                    processar_pendentes()
+                except Exception as e:
+                    self.app.logger.error(f'Erro no worker da fila de PDFs: {str(e)}', exc_info=True)
+                finally:
+                    db.session.remove()
+
+
+fila_pdf = FilaPDF()
+
+
+@fila_cli.command('processar')
+@click.option('--limite', type=int, default=None, help='Número máximo de tarefas a processar')
+def processar_command(limite):
+    """Processa as tarefas pendentes da fila no processo atual"""
+    total = processar_pendentes(limite)
+    click.echo(f'{total} tarefa(s) processada(s).')
@@ -36,8 +36,7 @@ class ResponsavelForm(FlaskForm):
 
     def validate_cpf(self, cpf):
         from app.models import Responsavel
-        responsavel = Responsavel.query.filter_by(cpf=cpf.data).first()
-        if responsavel:
+        if not Responsavel.validate_cpf(cpf.data):
             raise ValidationError('Este CPF já está cadastrado.')
 
     def validate_email(self, email):
@@ -82,8 +81,7 @@ class ProfessorForm(FlaskForm):
 
     def validate_cpf(self, cpf):
         from app.models import Professor  # Importação local aqui
-        professor = Professor.query.filter_by(cpf=cpf.data).first()
-        if professor is not None:
+        if not Professor.validate_cpf(cpf.data):
             raise ValidationError('Este CPF já está cadastrado.')
 
 class LoginForm(FlaskForm):
@@ -392,8 +390,7 @@ class AlunoForm(FlaskForm):
 
     def validate_cpf_responsavel(self, cpf_responsavel):
         from app.models import Responsavel
-        responsavel = Responsavel.query.filter_by(cpf=cpf_responsavel.data).first()
-        if responsavel:
+        if not Responsavel.validate_cpf(cpf_responsavel.data):
             raise ValidationError('Este CPF já está cadastrado para outro responsável.')
 
     def validate_email_responsavel(self, email_responsavel):
@@ -3,19 +3,32 @@ Módulo para geração automática de contratos em PDF
 Baseado nos modelos de contrato fornecidos pelo usuário
 """
 
-from datetime import datetime, date
+from copy import copy
+from datetime import date
 from reportlab.lib.pagesizes import A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER
-import os
+import threading
+
+from app.cache_pdf import cache_pdf, chave_conteudo
 
 class GeradorContratos:
+    # Incrementar sempre que o texto ou o layout dos modelos mudar (invalida o cache de PDFs)
+    VERSAO_MODELO = 1
+
     def __init__(self):
         self.styles = getSampleStyleSheet()
         self.setup_custom_styles()
         
+        # Parágrafos que não dependem do contrato, montados uma única vez (ver _clausulas_fixas)
+        self._cabecalho = [
+            Paragraph("CONTRATO DE CONSUMO – AULA PARTICULAR", self.title_style),
+            Paragraph("ÍMPETUS INSTITUTO DE EDUCAÇÃO", self.subtitle_style)
+        ]
+        self._paragrafos_fixos = {}
+        
         # Dados da empresa (ÍMPETUS INSTITUTO DE EDUCAÇÃO)
         self.dados_empresa = {
             'nome': 'ÍMPETUS INSTITUTO DE EDUCAÇÃO',
@@ -134,41 +147,31 @@ class GeradorContratos:
 
     def gerar_contrato_avulso(self, dados_contrato, caminho_arquivo):
         """Gera contrato para aula avulsa"""
-        doc = SimpleDocTemplate(caminho_arquivo, pagesize=A4)
-        story = []
-        
-        # Título
-        story.append(Paragraph("CONTRATO DE CONSUMO – AULA PARTICULAR", self.title_style))
-        story.append(Paragraph("ÍMPETUS INSTITUTO DE EDUCAÇÃO", self.subtitle_style))
-        story.append(Spacer(1, 20))
-        
-        # Partes do contrato
-        partes_texto = self._gerar_texto_partes(dados_contrato)
-        story.append(Paragraph(partes_texto, self.body_style))
-        story.append(Spacer(1, 20))
-        
-        # Cláusulas específicas para aula avulsa
-        clausulas = self._gerar_clausulas_avulsa(dados_contrato)
-        for clausula in clausulas:
-            story.append(Paragraph(clausula, self.body_style))
-            story.append(Spacer(1, 10))
-        
-        # Assinaturas
-        assinaturas = self._gerar_assinaturas(dados_contrato)
-        story.append(Spacer(1, 30))
-        story.append(Paragraph(assinaturas, self.body_style))
-        
-        doc.build(story)
-        return caminho_arquivo
+        mora_plano_piloto = dados_contrato.get('mora_plano_piloto', False)
+        return self._construir_pdf(
+            dados_contrato, caminho_arquivo,
+            ('aula_avulsa', mora_plano_piloto),
+            lambda: self._gerar_clausulas_avulsa(dados_contrato),
+            self._gerar_vigencia(dados_contrato, 'DÉCIMA SEGUNDA', 'terá prazo indeterminado.')
+        )
 
     def gerar_contrato_pacote(self, dados_contrato, tipo_pacote, caminho_arquivo):
         """Gera contrato para pacote de aulas (10 ou 20 aulas)"""
+        prazo_meses = self.tipos_contrato[tipo_pacote]['prazo']
+        return self._construir_pdf(
+            dados_contrato, caminho_arquivo,
+            (tipo_pacote,),
+            lambda: self._gerar_clausulas_pacote(dados_contrato, tipo_pacote),
+            self._gerar_vigencia(dados_contrato, 'DÉCIMA SEGUNDA', f'terá prazo de {prazo_meses}.')
+        )
+
+    def _construir_pdf(self, dados_contrato, caminho_arquivo, chave_clausulas, gerar_clausulas, vigencia):
+        """
+        Monta o documento: só partes, vigência e assinaturas são processadas por contrato;
+        título e cláusulas fixas do plano vêm dos parágrafos já montados
+        """
         doc = SimpleDocTemplate(caminho_arquivo, pagesize=A4)
-        story = []
-        
-        # Título
-        story.append(Paragraph("CONTRATO DE CONSUMO – AULA PARTICULAR", self.title_style))
-        story.append(Paragraph("ÍMPETUS INSTITUTO DE EDUCAÇÃO", self.subtitle_style))
+        story = [copy(paragrafo) for paragrafo in self._cabecalho]
         story.append(Spacer(1, 20))
         
         # Partes do contrato
@@ -176,10 +179,11 @@ class GeradorContratos:
         story.append(Paragraph(partes_texto, self.body_style))
         story.append(Spacer(1, 20))
         
-        # Cláusulas específicas para pacote
-        clausulas = self._gerar_clausulas_pacote(dados_contrato, tipo_pacote)
+        # Cláusulas do plano + vigência
+        clausulas = [copy(paragrafo) for paragrafo in self._clausulas_fixas(chave_clausulas, gerar_clausulas)]
+        clausulas.append(Paragraph(vigencia, self.body_style))
         for clausula in clausulas:
-            story.append(Paragraph(clausula, self.body_style))
+            story.append(clausula)
             story.append(Spacer(1, 10))
         
         # Assinaturas
@@ -190,6 +194,22 @@ class GeradorContratos:
         doc.build(story)
         return caminho_arquivo
 
+    def _clausulas_fixas(self, chave, gerar_clausulas):
+        """Parágrafos das cláusulas fixas do plano, interpretados uma única vez por processo"""
+        paragrafos = self._paragrafos_fixos.get(chave)
+        if paragrafos is None:
+            paragrafos = [Paragraph(texto, self.body_style) for texto in gerar_clausulas()]
+            self._paragrafos_fixos[chave] = paragrafos
+        return paragrafos
+
+    def _gerar_vigencia(self, dados, numero_clausula, prazo):
+        """Cláusula de vigência (varia com a data de início do contrato)"""
+        data_inicio = dados.get('data_inicio', date.today()).strftime('%d/%m/%Y')
+        return f"""
+        <b>DA VIGÊNCIA</b><br/>
+        <b>CLÁUSULA {numero_clausula}:</b> O presente Contrato se iniciará em {data_inicio} e {prazo}
+        """
+
     def _gerar_texto_partes(self, dados):
         """Gera o texto das partes do contrato"""
         # Formatação dos nomes dos alunos
@@ -275,13 +295,6 @@ class GeradorContratos:
         Nome da Empresa: {self.dados_empresa['representante']}
         """)
         
-        # DA VIGÊNCIA
-        data_inicio = dados.get('data_inicio', date.today()).strftime('%d/%m/%Y')
-        clausulas.append(f"""
-        <b>DA VIGÊNCIA</b><br/>
-        <b>CLÁUSULA DÉCIMA SEGUNDA:</b> O presente Contrato se iniciará em {data_inicio} e terá prazo indeterminado.
-        """)
-        
         return clausulas
 
     def _gerar_clausulas_pacote(self, dados, tipo_pacote):
@@ -332,18 +345,11 @@ class GeradorContratos:
         Nome da Empresa: {self.dados_empresa['representante']}
         """)
         
-        # DA VIGÊNCIA
-        data_inicio = dados.get('data_inicio', date.today()).strftime('%d/%m/%Y')
-        clausulas.append(f"""
-        <b>DA VIGÊNCIA</b><br/>
-        <b>CLÁUSULA DÉCIMA SEGUNDA:</b> O presente Contrato se iniciará em {data_inicio} e terá prazo de {prazo_meses}.
-        """)
-        
         return clausulas
 
     def _gerar_assinaturas(self, dados):
         """Gera a seção de assinaturas"""
-        data_hoje = datetime.now().strftime('%d de %B de %Y')
+        data_hoje = dados.get('data_emissao', date.today()).strftime('%d de %B de %Y')
         
         texto = f"""
         E, por assim estarem de acordo, as PARTES firmam o presente Contrato, em 02 (duas) vias de igual teor, 
@@ -390,32 +396,15 @@ class GeradorContratos:
 
     def gerar_contrato_assinatura_gold(self, dados_contrato, modalidade, caminho_arquivo):
         """Gera contrato para assinatura gold"""
-        doc = SimpleDocTemplate(caminho_arquivo, pagesize=A4)
-        story = []
-        
-        # Título
-        story.append(Paragraph("CONTRATO DE CONSUMO – AULA PARTICULAR", self.title_style))
-        story.append(Paragraph("ÍMPETUS INSTITUTO DE EDUCAÇÃO", self.subtitle_style))
-        story.append(Spacer(1, 20))
-        
-        # Partes do contrato
-        partes_texto = self._gerar_texto_partes(dados_contrato)
-        story.append(Paragraph(partes_texto, self.body_style))
-        story.append(Spacer(1, 20))
-        
-        # Cláusulas específicas para assinatura gold
-        clausulas = self._gerar_clausulas_assinatura_gold(dados_contrato, modalidade)
-        for clausula in clausulas:
-            story.append(Paragraph(clausula, self.body_style))
-            story.append(Spacer(1, 10))
-        
-        # Assinaturas
-        assinaturas = self._gerar_assinaturas(dados_contrato)
-        story.append(Spacer(1, 30))
-        story.append(Paragraph(assinaturas, self.body_style))
-        
-        doc.build(story)
-        return caminho_arquivo
+        return self._construir_pdf(
+            dados_contrato, caminho_arquivo,
+            ('assinatura_gold', modalidade),
+            lambda: self._gerar_clausulas_assinatura_gold(dados_contrato, modalidade),
+            self._gerar_vigencia(
+                dados_contrato, 'DÉCIMA TERCEIRA',
+                'terá prazo indeterminado, \n        vigendo-se até que o CONTRATANTE cancele sua assinatura.'
+            )
+        )
 
     def _gerar_clausulas_assinatura_gold(self, dados, modalidade):
         """Gera as cláusulas específicas para contrato de assinatura gold"""
@@ -512,17 +501,10 @@ class GeradorContratos:
         do professor.
         """)
         
-        # DA VIGÊNCIA
-        data_inicio = dados.get('data_inicio', date.today()).strftime('%d/%m/%Y')
-        clausulas.append(f"""
-        <b>DA VIGÊNCIA</b><br/>
-        <b>CLÁUSULA DÉCIMA TERCEIRA:</b> O presente Contrato se iniciará em {data_inicio} e terá prazo indeterminado, 
-        vigendo-se até que o CONTRATANTE cancele sua assinatura.
-        """)
-        
         return clausulas
 
-    def gerar_contrato_automatico(self, responsavel, alunos, tipo_plano, valor_total, data_inicio, validade, observacoes=""):
+    def gerar_contrato_automatico(self, responsavel, alunos, tipo_plano, valor_total, data_inicio, validade, observacoes="",
+                                  data_emissao=None):
         """
         Gera contrato automaticamente baseado nos dados fornecidos
         
@@ -534,13 +516,23 @@ class GeradorContratos:
             data_inicio: Data de início do contrato
             validade: Data de validade do contrato
             observacoes: Observações adicionais
+            data_emissao: Data impressa no contrato (padrão: data de início)
         
         Returns:
             Caminho do arquivo PDF gerado
         """
-        
-        # Preparar dados para o contrato
-        dados_contrato = {
+        dados_contrato = self.montar_dados_contrato(
+            responsavel, alunos, tipo_plano, valor_total, data_inicio, validade, observacoes, data_emissao
+        )
+        return self.gerar_contrato_dados(dados_contrato)
+
+    def montar_dados_contrato(self, responsavel, alunos, tipo_plano, valor_total, data_inicio, validade, observacoes="",
+                              data_emissao=None):
+        """
+        Extrai dos objetos do banco os dados do contrato (dicionário simples, pode ir para outro processo).
+        A data de emissão vem do contrato, nunca do dia atual: faz parte da chave do cache de PDFs.
+        """
+        return {
             'responsavel': {
                 'nome': responsavel.nome,
                 'cpf': responsavel.cpf,
@@ -563,17 +555,20 @@ class GeradorContratos:
             'data_inicio': data_inicio,
             'validade': validade,
             'observacoes': observacoes,
-            'mora_plano_piloto': any(aluno.mora_plano_piloto for aluno in alunos)
+            'mora_plano_piloto': any(aluno.mora_plano_piloto for aluno in alunos),
+            'data_emissao': data_emissao or data_inicio
         }
-        
-        # Determinar tipo de contrato e gerar arquivo
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        nome_arquivo = f"contrato_{responsavel.id}_{timestamp}.pdf"
-        caminho_arquivo = os.path.join("static", "contratos", nome_arquivo)
-        
-        # Criar diretório se não existir
-        os.makedirs(os.path.dirname(caminho_arquivo), exist_ok=True)
-        
+
+    def gerar_contrato_dados(self, dados_contrato, cache=None):
+        """Gera o PDF a partir dos dados montados (contratos com os mesmos dados reaproveitam o PDF já gerado)"""
+        cache = cache or cache_pdf()
+        chave = chave_conteudo('gerador_contratos', self.VERSAO_MODELO, dados_contrato)
+        return cache.obter_ou_gerar(
+            chave, lambda caminho_arquivo: self.renderizar(dados_contrato, dados_contrato['tipo_plano'], caminho_arquivo)
+        )
+
+    def renderizar(self, dados_contrato, tipo_plano, caminho_arquivo):
+        """Escolhe o modelo pelo tipo de plano e gera o PDF no caminho informado"""
         if tipo_plano == "Aula Avulsa":
             return self.gerar_contrato_avulso(dados_contrato, caminho_arquivo)
         elif tipo_plano == "Pacote 10 aulas":
@@ -598,14 +593,29 @@ class GeradorContratos:
             return self.gerar_contrato_avulso(dados_contrato, caminho_arquivo)
 
 
+_gerador = None
+_trava_gerador = threading.Lock()
+
+
+def obter_gerador():
+    """Instância única do gerador no processo (estilos e cláusulas fixas montados uma vez)"""
+    global _gerador
+    if _gerador is None:
+        with _trava_gerador:
+            if _gerador is None:
+                _gerador = GeradorContratos()
+    return _gerador
+
+
 # Função auxiliar para uso nas rotas Flask
-def gerar_contrato_pdf(responsavel, alunos, tipo_plano, valor_total, data_inicio, validade, observacoes=""):
+def gerar_contrato_pdf(responsavel, alunos, tipo_plano, valor_total, data_inicio, validade, observacoes="",
+                       data_emissao=None):
     """
     Função auxiliar para gerar contrato PDF
     Para ser usada nas rotas Flask
     """
-    gerador = GeradorContratos()
+    gerador = obter_gerador()
     return gerador.gerar_contrato_automatico(
         responsavel, alunos, tipo_plano, valor_total, 
-        data_inicio, validade, observacoes
+        data_inicio, validade, observacoes, data_emissao
     )
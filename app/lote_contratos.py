@@ -0,0 +1,178 @@
+"""
+Geração de contratos em lote (flask contratos gerar-lote)
+Os dados são lidos do banco no processo principal e os PDFs são renderizados
+em um pool de processos; os caminhos voltam para Contrato.arquivo em commits por lote
+"""
+
+import os
+import time
+from datetime import date
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import click
+from flask.cli import AppGroup
+from sqlalchemy import update
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.models import db, Contrato, ContratoAluno
+from app.gerador_contratos import GeradorContratos, obter_gerador
+from app.cache_pdf import CachePDF, arquivar_contrato, cache_pdf
+
+contratos_cli = AppGroup('contratos', help='Geração e manutenção de contratos')
+
+# Estado de cada processo do pool (criado uma única vez por processo)
+_gerador = None
+_cache = None
+
+
+def _iniciar_worker(diretorio_cache, limite_cache):
+    global _gerador, _cache
+    _gerador = obter_gerador()
+    _cache = CachePDF(diretorio_cache, limite_cache)
+
+
+def _renderizar_no_worker(contrato_id, dados_contrato):
+    """Executado no pool: devolve (contrato_id, caminho, segundos, erro)"""
+    inicio = time.perf_counter()
+    try:
+        caminho = _gerador.gerar_contrato_dados(dados_contrato, cache=_cache)
+        return contrato_id, caminho, time.perf_counter() - inicio, None
+    except Exception as e:
+        return contrato_id, None, time.perf_counter() - inicio, str(e)
+
+
+def consultar_contratos_lote(status=None, validade_de=None, validade_ate=None, tipo_plano=None):
+    """Contratos do filtro, já com responsável e alunos carregados"""
+    consulta = Contrato.query.options(
+        joinedload(Contrato.responsavel),
+        selectinload(Contrato.alunos).joinedload(ContratoAluno.aluno)
+    )
+    if status:
+        consulta = consulta.filter(Contrato.status == status)
+    if validade_de:
+        consulta = consulta.filter(Contrato.validade >= validade_de)
+    if validade_ate:
+        consulta = consulta.filter(Contrato.validade <= validade_ate)
+    if tipo_plano:
+        consulta = consulta.filter(Contrato.tipo_plano == tipo_plano)
+    return consulta.order_by(Contrato.id).all()
+
+
+def _gravar_resultados(resultados, cache=None):
+    """Arquiva os PDFs fora do cache e atualiza Contrato.arquivo de um lote de contratos em um único commit"""
+    if resultados:
+        db.session.execute(update(Contrato), [
+            {'id': contrato_id, 'arquivo': arquivar_contrato(contrato_id, caminho, cache), 'pdf_status': 'pronto'}
+            for contrato_id, caminho in resultados
+        ])
+    db.session.commit()
+
+
+@contratos_cli.command('gerar-lote')
+@click.option('--status', default='ativo', show_default=True, help='Status dos contratos ("" para todos)')
+@click.option('--validade-de', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Validade a partir de (AAAA-MM-DD)')
+@click.option('--validade-ate', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Validade até (AAAA-MM-DD)')
+@click.option('--tipo-plano', default=None, help='Tipo de plano exato')
+@click.option('--processos', type=int, default=None, help='Processos de renderização (padrão: núcleos disponíveis)')
+@click.option('--lote', type=int, default=50, show_default=True, help='Contratos gravados por commit')
+def gerar_lote_command(status, validade_de, validade_ate, tipo_plano, processos, lote):
+    """Gera os PDFs dos contratos filtrados em paralelo"""
+    contratos = consultar_contratos_lote(
+        status or None,
+        validade_de.date() if validade_de else None,
+        validade_ate.date() if validade_ate else None,
+        tipo_plano
+    )
+    if not contratos:
+        click.echo('Nenhum contrato encontrado para o filtro informado.')
+        return
+
+    gerador = obter_gerador()
+    tarefas = [
+        (contrato.id, gerador.montar_dados_contrato(
+            contrato.responsavel, [associacao.aluno for associacao in contrato.alunos],
+            contrato.tipo_plano, contrato.valor_total, contrato.data_inicio,
+            contrato.validade, contrato.observacoes or '', contrato.data_emissao
+        ))
+        for contrato in contratos
+    ]
+    db.session.expunge_all()
+
+    processos = processos or os.cpu_count() or 1
+    total = len(tarefas)
+    cache = cache_pdf()
+    click.echo(f'Gerando {total} contrato(s) com {processos} processo(s)...')
+
+    inicio = time.perf_counter()
+    pendentes_gravacao = []
+    erros = 0
+    with ProcessPoolExecutor(
+        max_workers=processos,
+        initializer=_iniciar_worker,
+        initargs=(cache.diretorio, cache.limite_bytes)
+    ) as executor:
+        futuros = [executor.submit(_renderizar_no_worker, contrato_id, dados) for contrato_id, dados in tarefas]
+        for feitos, futuro in enumerate(as_completed(futuros), start=1):
+            contrato_id, caminho, segundos, erro = futuro.result()
+            if erro:
+                erros += 1
+                click.echo(f'[{feitos}/{total}] contrato {contrato_id}: ERRO {erro}', err=True)
+                continue
+
+            click.echo(f'[{feitos}/{total}] contrato {contrato_id}: {segundos:.3f}s')
+            pendentes_gravacao.append((contrato_id, caminho))
+            if len(pendentes_gravacao) >= lote:
+                _gravar_resultados(pendentes_gravacao, cache)
+                pendentes_gravacao = []
+
+    _gravar_resultados(pendentes_gravacao, cache)
+
+    duracao = time.perf_counter() - inicio
+    click.echo(
+        f'Concluído: {total - erros} gerado(s), {erros} erro(s) em {duracao:.1f}s '
+        f'({total / duracao:.1f} contratos/s).'
+    )
+
+
+PLANOS_BENCHMARK = ['Aula Avulsa', 'Pacote 10 aulas', 'Pacote 20 aulas', 'Assinatura Gold 14 aulas']
+
+
+def _dados_benchmark(tipo_plano, indice):
+    return {
+        'responsavel': {
+            'nome': f'Responsável {indice}', 'cpf': '000.000.000-00', 'rg': '0000000',
+            'telefone': '(61) 90000-0000', 'email': 'responsavel@example.com',
+            'endereco': 'SQN 000 Bloco A', 'estado_civil': 'casado(a)', 'nacionalidade': 'brasileira'
+        },
+        'alunos': [{'nome': f'Aluno {indice}', 'cpf': '', 'rg': ''}],
+        'tipo_plano': tipo_plano,
+        'valor_total': 950.0,
+        'data_inicio': date.today(),
+        'validade': date.today(),
+        'observacoes': '',
+        'mora_plano_piloto': indice % 2 == 0,
+        'data_emissao': date.today()
+    }
+
+
+def medir_renderizacao(obter, tipo_plano, quantidade):
+    """Tempo médio (ms) por contrato, renderizando em memória sem passar pelo cache"""
+    inicio = time.perf_counter()
+    for indice in range(quantidade):
+        obter().renderizar(_dados_benchmark(tipo_plano, indice), tipo_plano, BytesIO())
+    return (time.perf_counter() - inicio) * 1000 / quantidade
+
+
+@contratos_cli.command('benchmark')
+@click.option('--quantidade', type=int, default=50, show_default=True, help='Contratos renderizados por plano em cada rodada')
+@click.option('--rodadas', type=int, default=5, show_default=True, help='Rodadas alternadas (vale o melhor tempo)')
+def benchmark_command(quantidade, rodadas):
+    """Compara o tempo de renderização com um gerador novo por contrato e com o gerador compartilhado"""
+    click.echo(f'{"Plano":<28}{"novo gerador":>14}{"compartilhado":>15}{"ganho":>8}')
+    for tipo_plano in PLANOS_BENCHMARK:
+        obter_gerador().renderizar(_dados_benchmark(tipo_plano, 0), tipo_plano, BytesIO())
+        antes = depois = float('inf')
+        for _ in range(rodadas):
+            antes = min(antes, medir_renderizacao(GeradorContratos, tipo_plano, quantidade))
+            depois = min(depois, medir_renderizacao(obter_gerador, tipo_plano, quantidade))
+        click.echo(f'{tipo_plano:<28}{antes:>11.2f} ms{depois:>12.2f} ms{antes / depois:>7.2f}x')
@@ -1,8 +1,9 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
-from sqlalchemy import func, Date
+from sqlalchemy import func, Date, event
+from app.utils import somente_digitos
 
 # Tabela de associação para Contrato e Aluno (muitos-para-muitos)
 contrato_aluno_associacao = db.Table(
@@ -13,6 +14,12 @@ contrato_aluno_associacao = db.Table(
 
 class User(db.Model, UserMixin):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Busca do usuário a partir do perfil (aluno.user, professor.user, responsavel.user)
+        db.Index('ix_users_aluno_id', 'aluno_id'),
+        db.Index('ix_users_professor_id', 'professor_id'),
+        db.Index('ix_users_responsavel_id', 'responsavel_id'),
+    )
     
     # Dados de autenticação
     id = db.Column(db.Integer, primary_key=True)
@@ -23,6 +30,8 @@ class User(db.Model, UserMixin):
     last_login = db.Column(db.DateTime)
     is_active = db.Column(db.Boolean, default=True)
     data_cadastro = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Contador desnormalizado de notificações não lidas (mantido por app.notificacoes)
+    notificacoes_nao_lidas = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relacionamentos (1:1 com Aluno/Professor/Responsavel)
     aluno_id = db.Column(db.Integer, db.ForeignKey('aluno.id', ondelete='CASCADE'), nullable=True)
@@ -101,6 +110,11 @@ class User(db.Model, UserMixin):
 
 class Responsavel(db.Model):
     __tablename__ = 'responsavel'
+    __table_args__ = (
+        db.Index('ix_responsavel_nome', 'nome'),
+        db.Index('ix_responsavel_cpf_digitos', 'cpf_digitos'),
+        db.Index('ix_responsavel_telefone_digitos', 'telefone_digitos'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
@@ -112,6 +126,9 @@ class Responsavel(db.Model):
     estado_civil = db.Column(db.String(20), default='')
     nacionalidade = db.Column(db.String(50), default='')
     data_cadastro = db.Column(db.DateTime, default=datetime.utcnow)
+    # Somente dígitos, para busca indexada por CPF/telefone em qualquer formato
+    cpf_digitos = db.Column(db.String(14))
+    telefone_digitos = db.Column(db.String(20))
 
     user = db.relationship('User', back_populates='responsavel', uselist=False)
     alunos = db.relationship('Aluno', back_populates='responsavel', lazy='dynamic')
@@ -122,10 +139,17 @@ class Responsavel(db.Model):
 
     @staticmethod
     def validate_cpf(cpf):
-        return not db.session.query(db.exists().where(Responsavel.cpf == cpf)).scalar()
+        return not db.session.query(db.exists().where(Responsavel.cpf_digitos == somente_digitos(cpf))).scalar()
 
 class Aluno(db.Model):
     __tablename__ = 'aluno'
+    __table_args__ = (
+        db.Index('ix_aluno_responsavel_id', 'responsavel_id'),
+        db.Index('ix_aluno_nome', 'nome'),
+        db.Index('ix_aluno_data_cadastro', 'data_cadastro'),
+        db.Index('ix_aluno_cpf_digitos', 'cpf_digitos'),
+        db.Index('ix_aluno_telefone_digitos', 'telefone_digitos'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
@@ -140,6 +164,8 @@ class Aluno(db.Model):
     telefone = db.Column(db.String(20), nullable=False)
     plano_adquirido = db.Column(db.String(50), default='')
     data_cadastro = db.Column(db.DateTime, default=datetime.utcnow)
+    cpf_digitos = db.Column(db.String(14))
+    telefone_digitos = db.Column(db.String(20))
 
     user = db.relationship('User', back_populates='aluno', uselist=False)
     responsavel = db.relationship('Responsavel', back_populates='alunos')
@@ -151,11 +177,16 @@ class Aluno(db.Model):
 
     @staticmethod
     def validate_cpf(cpf):
-        return not db.session.query(db.exists().where(Aluno.cpf == cpf)).scalar()
+        return not db.session.query(db.exists().where(Aluno.cpf_digitos == somente_digitos(cpf))).scalar()
 
 
 class Professor(db.Model):
     __tablename__ = 'professor'
+    __table_args__ = (
+        db.Index('ix_professor_nome', 'nome'),
+        db.Index('ix_professor_cpf_digitos', 'cpf_digitos'),
+        db.Index('ix_professor_telefone_digitos', 'telefone_digitos'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
@@ -174,6 +205,8 @@ class Professor(db.Model):
     valor_hora = db.Column(db.Float, default=0.0)
     tipo_atendimento = db.Column(db.String(50), default='presencial')
     data_cadastro = db.Column(db.DateTime, default=datetime.utcnow)
+    cpf_digitos = db.Column(db.String(14))
+    telefone_digitos = db.Column(db.String(20))
 
     user = db.relationship('User', back_populates='professor', uselist=False)
     aulas = db.relationship('Aula', backref='professor_rel', lazy=True)
@@ -191,17 +224,37 @@ class Professor(db.Model):
 
     @staticmethod
     def validate_cpf(cpf):
-        return not db.session.query(db.exists().where(Professor.cpf == cpf)).scalar()
+        return not db.session.query(db.exists().where(Professor.cpf_digitos == somente_digitos(cpf))).scalar()
+
+
+@event.listens_for(Responsavel, 'before_insert')
+@event.listens_for(Responsavel, 'before_update')
+@event.listens_for(Aluno, 'before_insert')
+@event.listens_for(Aluno, 'before_update')
+@event.listens_for(Professor, 'before_insert')
+@event.listens_for(Professor, 'before_update')
+def _preencher_digitos(mapper, connection, pessoa):
+    """Mantém cpf_digitos e telefone_digitos coerentes com cpf e telefone"""
+    pessoa.cpf_digitos = somente_digitos(pessoa.cpf)
+    pessoa.telefone_digitos = somente_digitos(pessoa.telefone)
 
 
 class Aula(db.Model):
     __tablename__ = 'aula'
+    __table_args__ = (
+        # Índices usados na detecção de conflitos e nas agendas por pessoa
+        db.Index('ix_aula_professor_data_hora', 'professor_id', 'data_hora'),
+        db.Index('ix_aula_aluno_data_hora', 'aluno_id', 'data_hora'),
+        # Agenda geral e aulas do dia (sem filtro por pessoa)
+        db.Index('ix_aula_data_hora', 'data_hora'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     aluno_id = db.Column(db.Integer, db.ForeignKey('aluno.id'), nullable=False)
     professor_id = db.Column(db.Integer, db.ForeignKey('professor.id'), nullable=False)
     data_hora = db.Column(db.DateTime, nullable=False)
     duracao = db.Column(db.Integer, nullable=False)  # em minutos
+    data_hora_fim = db.Column(db.DateTime)  # data_hora + duracao, preenchido automaticamente
     local = db.Column(db.String(50), nullable=False)
     tipo_aula = db.Column(db.String(20), nullable=False)
     realizada = db.Column(db.Boolean, default=False, nullable=False)
@@ -221,10 +274,53 @@ class Aula(db.Model):
     aulas_relacionadas = db.relationship('Aula', backref=db.backref('aula_principal', remote_side=[id]))
     materia = db.relationship('Materia', back_populates='aulas')
 
+    @staticmethod
+    def calcular_data_hora_fim(data_hora, duracao):
+        """Calcula o horário de término a partir do início e da duração em minutos"""
+        if data_hora is None or duracao is None:
+            return None
+        return data_hora + timedelta(minutes=int(duracao))
+
     def __repr__(self):
         return f'<Aula {self.id} - {self.data_hora}>'
 
 
+@event.listens_for(Aula, 'before_insert')
+@event.listens_for(Aula, 'before_update')
+def _preencher_data_hora_fim(mapper, connection, aula):
+    """Mantém data_hora_fim sincronizado com data_hora e duracao"""
+    aula.data_hora_fim = Aula.calcular_data_hora_fim(aula.data_hora, aula.duracao)
+
+
+class ResumoMensal(db.Model):
+    """Consolidado financeiro por mês × professor × aluno × local × tipo de aula"""
+    __tablename__ = 'resumo_mensal'
+    __table_args__ = (
+        db.UniqueConstraint('ano', 'mes', 'professor_id', 'aluno_id', 'local', 'tipo_aula',
+                            name='uq_resumo_mensal_celula'),
+        db.Index('ix_resumo_mensal_ano_mes', 'ano', 'mes'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    ano = db.Column(db.Integer, nullable=False)
+    mes = db.Column(db.Integer, nullable=False)
+    professor_id = db.Column(db.Integer, db.ForeignKey('professor.id'), nullable=False)
+    aluno_id = db.Column(db.Integer, db.ForeignKey('aluno.id'), nullable=False)
+    local = db.Column(db.String(50), nullable=False)
+    tipo_aula = db.Column(db.String(20), nullable=False)
+
+    total_aulas = db.Column(db.Integer, nullable=False, default=0)
+    aulas_realizadas = db.Column(db.Integer, nullable=False, default=0)
+    total_minutos = db.Column(db.Integer, nullable=False, default=0)
+    faturamento = db.Column(db.Float, nullable=False, default=0.0)
+    custo_professores = db.Column(db.Float, nullable=False, default=0.0)
+    deslocamento = db.Column(db.Float, nullable=False, default=0.0)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ResumoMensal {self.mes:02d}/{self.ano} P{self.professor_id} A{self.aluno_id}>'
+
+
 class Materia(db.Model):
     __tablename__ = 'materia'
     
@@ -287,6 +383,10 @@ class ProfessorMateria(db.Model):
 # Tabela de associação para relacionamento muitos-para-muitos entre Contrato e Aluno
 class ContratoAluno(db.Model):
     __tablename__ = 'contrato_aluno'
+    __table_args__ = (
+        # A chave primária começa por contrato_id; este cobre o caminho aluno -> contratos
+        db.Index('ix_contrato_aluno_aluno_contrato', 'aluno_id', 'contrato_id'),
+    )
     
     contrato_id = db.Column(db.Integer, db.ForeignKey('contrato.id'), primary_key=True)
     aluno_id = db.Column(db.Integer, db.ForeignKey('aluno.id'), primary_key=True)
@@ -301,6 +401,23 @@ class ContratoAluno(db.Model):
 
 class Contrato(db.Model):
     __tablename__ = 'contrato'
+    __table_args__ = (
+        # Filtros de vencimento: geral, por status e por responsável
+        db.Index('ix_contrato_validade', 'validade'),
+        db.Index('ix_contrato_status_validade', 'status', 'validade'),
+        db.Index('ix_contrato_responsavel_validade', 'responsavel_id', 'validade'),
+        db.Index('ix_contrato_professor_id', 'professor_id'),
+        db.Index('ix_contrato_data_inicio', 'data_inicio'),
+        db.Index('ix_contrato_data_upload', 'data_upload'),
+        db.Index('ix_contrato_faixa_validade', 'faixa_vencimento', 'validade'),
+    )
+
+    # Faixas de vencimento (mantidas por app.status_contratos)
+    FAIXA_VENCIDO = 'vencido'
+    FAIXA_30_DIAS = 'ate_30_dias'
+    FAIXA_90_DIAS = 'ate_90_dias'
+    FAIXA_REGULAR = 'regular'
+    LIMITES_FAIXAS = ((30, FAIXA_30_DIAS), (90, FAIXA_90_DIAS))
 
     id = db.Column(db.Integer, primary_key=True)
     responsavel_id = db.Column(db.Integer, db.ForeignKey('responsavel.id'), nullable=False)
@@ -315,6 +432,8 @@ class Contrato(db.Model):
     observacoes = db.Column(db.Text)
     data_upload = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='ativo')  # ativo, vencido, cancelado
+    pdf_status = db.Column(db.String(20))  # pendente, pronto, erro (geração em segundo plano)
+    faixa_vencimento = db.Column(db.String(20))  # vencido, ate_30_dias, ate_90_dias, regular
 
 # Relacionamentos
     responsavel = db.relationship('Responsavel', back_populates='contratos')
@@ -329,6 +448,11 @@ class Contrato(db.Model):
             return delta.days
         return None
     
+    @property
+    def data_emissao(self):
+        """Data impressa no PDF: a do cadastro do contrato (estável, o PDF não muda se for gerado de novo)"""
+        return self.data_upload.date() if self.data_upload else self.data_inicio
+    
     @property
     def esta_vencido(self):
         """Verifica se o contrato está vencido"""
@@ -341,10 +465,62 @@ class Contrato(db.Model):
         dias = self.dias_para_vencimento
         return dias is not None and 0 <= dias <= 30
 
+    @classmethod
+    def calcular_faixa(cls, validade, hoje=None):
+        """Faixa de vencimento da validade em relação a hoje"""
+        from datetime import date
+        if validade is None:
+            return None
+        dias = (validade - (hoje or date.today())).days
+        if dias < 0:
+            return cls.FAIXA_VENCIDO
+        for limite, faixa in cls.LIMITES_FAIXAS:
+            if dias <= limite:
+                return faixa
+        return cls.FAIXA_REGULAR
+
     def __repr__(self):
         return f'<Contrato {self.id}>'
 
+
+@event.listens_for(Contrato, 'before_insert')
+@event.listens_for(Contrato, 'before_update')
+def _preencher_faixa_vencimento(mapper, connection, contrato):
+    """Mantém faixa_vencimento coerente com a validade ao gravar o contrato"""
+    contrato.faixa_vencimento = Contrato.calcular_faixa(contrato.validade)
+
+
+class TarefaPDF(db.Model):
+    """Tarefa da fila de geração de PDFs de contratos"""
+    __tablename__ = 'tarefa_pdf'
+    __table_args__ = (
+        db.Index('ix_tarefa_pdf_status_prioridade', 'status', 'prioridade', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    contrato_id = db.Column(db.Integer, db.ForeignKey('contrato.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, processando, concluida, erro
+    prioridade = db.Column(db.Integer, nullable=False, default=0)
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    erro = db.Column(db.String(500))
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow)
+    iniciado_em = db.Column(db.DateTime)
+    concluido_em = db.Column(db.DateTime)
+
+    contrato = db.relationship('Contrato')
+
+    def __repr__(self):
+        return f'<TarefaPDF {self.id} contrato={self.contrato_id} {self.status}>'
+
 class Notificacao(db.Model):
+    __table_args__ = (
+        # Notificações do usuário (não lidas primeiro) em ordem cronológica
+        db.Index('ix_notificacao_usuario_lida_data', 'usuario_id', 'lida', 'data_criacao'),
+        db.Index('ix_notificacao_usuario_data', 'usuario_id', 'data_criacao'),
+        # Uma notificação automática por usuário e chave (notificações manuais ficam sem chave)
+        db.UniqueConstraint('usuario_id', 'chave_dedup', name='uq_notificacao_usuario_chave'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     titulo = db.Column(db.String(100), nullable=False)
@@ -352,6 +528,7 @@ class Notificacao(db.Model):
     tipo = db.Column(db.String(20), default='info')
     lida = db.Column(db.Boolean, default=False)
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+    chave_dedup = db.Column(db.String(100), nullable=True)
     
     # Relacionamento
     usuario = db.relationship('User', backref='notificacoes')
@@ -359,7 +536,47 @@ class Notificacao(db.Model):
     def __repr__(self):
         return f'<Notificacao {self.titulo}>'
 
+class EventoFila(db.Model):
+    """Eventos recentes para as conexões em tempo real (app.eventos); apagados após algum tempo"""
+    __tablename__ = 'evento_fila'
+    __table_args__ = (
+        # Reenvio a partir do Last-Event-ID
+        db.Index('ix_evento_fila_usuario_id', 'usuario_id', 'id'),
+        # Ids nunca reaproveitados depois da limpeza: leitores e clientes comparam id > último visto
+        {'sqlite_autoincrement': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    tipo = db.Column(db.String(30), nullable=False)
+    dados = db.Column(db.Text, nullable=False)  # JSON
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<EventoFila {self.id} {self.tipo}>'
+
+class NotificacaoArquivada(db.Model):
+    """Notificações lidas e antigas, movidas para fora da tabela consultada pelos dashboards"""
+    __table_args__ = (
+        db.Index('ix_notificacao_arquivada_usuario_data', 'usuario_id', 'data_criacao'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # mesmo id da notificação original
+    usuario_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    titulo = db.Column(db.String(100), nullable=False)
+    mensagem = db.Column(db.Text, nullable=False)
+    tipo = db.Column(db.String(20))
+    data_criacao = db.Column(db.DateTime, nullable=False)
+    data_arquivamento = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<NotificacaoArquivada {self.titulo}>'
+
 class Documento(db.Model):
+    __table_args__ = (
+        db.Index('ix_documento_aluno_id', 'aluno_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     aluno_id = db.Column(db.Integer, db.ForeignKey('aluno.id'), nullable=False)
     nome = db.Column(db.String(255), nullable=False)
@@ -0,0 +1,254 @@
+"""
+Geração de notificações em lote e contador de não lidas
+Cada notificação automática tem uma chave de deduplicação estável (chave_dedup, única
+por usuário). Os candidatos que ainda não têm notificação saem de uma consulta com
+anti-join contra notificacao, e as novas linhas entram em um único INSERT e um commit.
+User.notificacoes_nao_lidas é recalculado pelo índice (usuario_id, lida) a cada flush
+que cria, exclui ou marca notificações; o badge do layout lê só o usuário já carregado.
+A listagem é paginada por cursor em (data_criacao, id), e as notificações lidas antigas
+vão para notificacao_arquivada (flask notificacoes arquivar, tarefa do agendador).
+"""
+
+from datetime import date, datetime, timedelta
+import click
+from flask.cli import AppGroup
+from sqlalchemy import String, and_, cast, delete, event, func, inspect, insert, literal, select, tuple_, update
+
+from app.models import db, User, Contrato, Notificacao, NotificacaoArquivada
+from app.periodos import periodo_entre
+from app.eventos import enfileirar
+
+notificacoes_cli = AppGroup('notificacoes', help='Notificações automáticas')
+
+DIAS_AVISO_VENCIMENTO = 30
+DIAS_ARQUIVAMENTO = 90
+TAMANHO_PAGINA = 20
+TAMANHO_PAGINA_MAXIMO = 100
+LOTE_ARQUIVAMENTO = 5000
+
+_CHAVE_PENDENTES = 'notificacoes_usuarios_afetados'
+
+
+def recalcular_nao_lidas(conexao, usuario_ids):
+    """Atualiza o contador de não lidas dos usuários informados"""
+    usuario_ids = sorted({usuario_id for usuario_id in usuario_ids if usuario_id is not None})
+    if not usuario_ids:
+        return
+    nao_lidas = select(func.count(Notificacao.id)).where(
+        Notificacao.usuario_id == User.id, Notificacao.lida.is_(False)
+    ).scalar_subquery()
+    conexao.execute(
+        update(User.__table__).where(User.__table__.c.id.in_(usuario_ids))
+        .values(notificacoes_nao_lidas=nao_lidas)
+    )
+
+
+def _usuarios_afetados(notificacao):
+    """Usuário atual e anterior de uma notificação alterada, se a alteração mexe nas não lidas"""
+    estado = inspect(notificacao)
+    if not (estado.attrs.lida.history.has_changes() or estado.attrs.usuario_id.history.has_changes()):
+        return set()
+    return {notificacao.usuario_id, *estado.attrs.usuario_id.history.deleted}
+
+
+def _antes_do_flush(session, flush_context, instances):
+    pendentes = session.info.setdefault(_CHAVE_PENDENTES, set())
+    for objeto in list(session.new) + list(session.deleted):
+        if isinstance(objeto, Notificacao):
+            pendentes.add(objeto.usuario_id)
+    for objeto in session.dirty:
+        if isinstance(objeto, Notificacao):
+            pendentes.update(_usuarios_afetados(objeto))
+
+
+def _depois_do_flush(session, flush_context):
+    pendentes = session.info.pop(_CHAVE_PENDENTES, None)
+    if pendentes:
+        recalcular_nao_lidas(session.connection(), pendentes)
+
+
+def registrar_eventos():
+    """Mantém User.notificacoes_nao_lidas a cada flush que altera notificações"""
+    if not event.contains(db.session, 'before_flush', _antes_do_flush):
+        event.listen(db.session, 'before_flush', _antes_do_flush)
+        event.listen(db.session, 'after_flush', _depois_do_flush)
+
+
+def marcar_todas_lidas(usuario_id):
+    """Marca todas as notificações do usuário como lidas; devolve quantas estavam pendentes"""
+    try:
+        marcadas = db.session.execute(
+            update(Notificacao)
+            .where(Notificacao.usuario_id == usuario_id, Notificacao.lida.is_(False))
+            .values(lida=True)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.execute(
+            update(User).where(User.id == usuario_id).values(notificacoes_nao_lidas=0)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return marcadas
+
+
+def chave_vencimento(contrato_id, validade):
+    """Chave do aviso de vencimento (um por contrato e validade; renovar gera um novo aviso)"""
+    return f'vencimento:{contrato_id}:{validade.isoformat()}'
+
+
+def _expressao_chave_vencimento():
+    # Mesma chave de chave_vencimento, montada no banco para o anti-join
+    return (
+        literal('vencimento:') + cast(Contrato.id, String) + literal(':') + cast(Contrato.validade, String)
+    )
+
+
+def candidatos_vencimento(hoje, dias=DIAS_AVISO_VENCIMENTO):
+    """(contrato_id, tipo_plano, validade, usuario_id) dos contratos vencendo ainda sem aviso"""
+    chave = _expressao_chave_vencimento()
+    return db.session.query(
+        Contrato.id, Contrato.tipo_plano, Contrato.validade, User.id
+    ).join(
+        User, User.responsavel_id == Contrato.responsavel_id
+    ).outerjoin(
+        Notificacao, and_(Notificacao.usuario_id == User.id, Notificacao.chave_dedup == chave)
+    ).filter(
+        periodo_entre(Contrato.validade, hoje, hoje + timedelta(days=dias + 1)),
+        Notificacao.id.is_(None)
+    ).all()
+
+
+def inserir_notificacoes(linhas):
+    """INSERT único das notificações (dicts com as colunas); devolve quantas entraram (repetidas pela chave são ignoradas)"""
+    if not linhas:
+        return 0
+    # OR IGNORE: duas execuções simultâneas não duplicam avisos nem abortam o lote;
+    # o RETURNING traz só as linhas que de fato entraram
+    tabela = Notificacao.__table__
+    inseridas = db.session.execute(
+        insert(tabela).prefix_with('OR IGNORE', dialect='sqlite')
+        .returning(tabela.c.id, tabela.c.usuario_id, tabela.c.titulo, tabela.c.tipo),
+        linhas
+    ).all()
+    # O INSERT em massa não passa pelo flush: contadores e eventos tratados aqui, na mesma transação
+    recalcular_nao_lidas(db.session.connection(), (usuario_id for _, usuario_id, _, _ in inseridas))
+    enfileirar(db.session, [
+        (usuario_id, 'notificacao', {'id': notificacao_id, 'titulo': titulo, 'tipo': tipo})
+        for notificacao_id, usuario_id, titulo, tipo in inseridas
+    ])
+    return len(inseridas)
+
+
+def criar_notificacoes_vencimento(hoje=None, dias=DIAS_AVISO_VENCIMENTO):
+    """Avisa os responsáveis dos contratos que vencem nos próximos dias; devolve quantos avisos criou"""
+    hoje = hoje or date.today()
+    agora = datetime.utcnow()
+    linhas = [
+        {
+            'usuario_id': usuario_id,
+            'titulo': f'Contrato próximo ao vencimento - {tipo_plano}',
+            'mensagem': f'Seu contrato {tipo_plano} vence em {(validade - hoje).days} dias '
+                        f'({validade.strftime("%d/%m/%Y")}). Entre em contato para renovação.',
+            'tipo': 'warning',
+            'lida': False,
+            'data_criacao': agora,
+            'chave_dedup': chave_vencimento(contrato_id, validade),
+        }
+        for contrato_id, tipo_plano, validade, usuario_id in candidatos_vencimento(hoje, dias)
+    ]
+    try:
+        criadas = inserir_notificacoes(linhas)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return criadas
+
+
+def codificar_cursor(notificacao):
+    """Cursor da página seguinte à notificação (data_criacao e id, seguro para URL)"""
+    return f'{notificacao.data_criacao:%Y%m%d%H%M%S%f}-{notificacao.id}'
+
+
+def decodificar_cursor(cursor):
+    """(data_criacao, id) do cursor; ValueError se o cursor for inválido"""
+    data, _, notificacao_id = cursor.partition('-')
+    return datetime.strptime(data, '%Y%m%d%H%M%S%f'), int(notificacao_id)
+
+
+def consulta_pagina(usuario_id, cursor=None, limite=TAMANHO_PAGINA, modelo=Notificacao):
+    """SELECT de uma página (mais recentes primeiro) a partir do cursor, pelo índice (usuario_id, data_criacao)"""
+    consulta = select(modelo).where(modelo.usuario_id == usuario_id)
+    if cursor:
+        consulta = consulta.where(tuple_(modelo.data_criacao, modelo.id) < tuple_(*decodificar_cursor(cursor)))
+    return consulta.order_by(modelo.data_criacao.desc(), modelo.id.desc()).limit(limite)
+
+
+def pagina_notificacoes(usuario_id, cursor=None, limite=TAMANHO_PAGINA, arquivadas=False):
+    """(notificações, cursor da próxima página ou None); o custo não depende do tamanho do histórico"""
+    limite = max(1, min(limite, TAMANHO_PAGINA_MAXIMO))
+    modelo = NotificacaoArquivada if arquivadas else Notificacao
+    # Uma linha a mais indica se existe página seguinte sem precisar de COUNT
+    itens = db.session.scalars(consulta_pagina(usuario_id, cursor, limite + 1, modelo)).all()
+    if len(itens) > limite:
+        return itens[:limite], codificar_cursor(itens[limite - 1])
+    return itens, None
+
+
+def arquivar_notificacoes(dias=DIAS_ARQUIVAMENTO, lote=LOTE_ARQUIVAMENTO):
+    """Move as notificações lidas criadas há mais de `dias` dias para o arquivo; devolve quantas moveu"""
+    if dias <= DIAS_AVISO_VENCIMENTO:
+        # A chave de deduplicação dos avisos de vencimento precisa continuar na tabela ativa
+        raise ValueError(f'Arquive apenas notificações com mais de {DIAS_AVISO_VENCIMENTO} dias.')
+    limite = datetime.utcnow() - timedelta(days=dias)
+    agora = datetime.utcnow()
+    colunas = ('id', 'usuario_id', 'titulo', 'mensagem', 'tipo', 'data_criacao')
+    movidas = 0
+    while True:
+        # Lotes curtos: cada transação segura a escrita do SQLite por pouco tempo
+        ids = db.session.scalars(
+            select(Notificacao.id)
+            .where(Notificacao.lida.is_(True), Notificacao.data_criacao < limite)
+            .order_by(Notificacao.id).limit(lote)
+        ).all()
+        if not ids:
+            return movidas
+        try:
+            db.session.execute(
+                insert(NotificacaoArquivada).from_select(
+                    [*colunas, 'data_arquivamento'],
+                    select(*(getattr(Notificacao, coluna) for coluna in colunas), literal(agora))
+                    .where(Notificacao.id.in_(ids))
+                )
+            )
+            db.session.execute(
+                delete(Notificacao).where(Notificacao.id.in_(ids))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        movidas += len(ids)
+
+
+@notificacoes_cli.command('arquivar')
+@click.option('--dias', default=DIAS_ARQUIVAMENTO, show_default=True, help='Idade mínima das notificações lidas')
+def arquivar_command(dias):
+    """Move as notificações lidas antigas para a tabela de arquivo"""
+    try:
+        movidas = arquivar_notificacoes(dias)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--dias')
+    click.echo(f'{movidas} notificação(ões) arquivada(s).')
+
+
+@notificacoes_cli.command('vencimentos')
+@click.option('--dias', default=DIAS_AVISO_VENCIMENTO, show_default=True, help='Antecedência do aviso')
+def vencimentos_command(dias):
+    """Cria os avisos de contratos próximos ao vencimento"""
+    criadas = criar_notificacoes_vencimento(dias=dias)
+    click.echo(f'{criadas} notificação(ões) de vencimento criada(s).')
@@ -0,0 +1,46 @@
+"""
+Saída de PDFs para o navegador
+Os documentos são renderizados em um buffer na memória (que só vai para o disco acima de
+LIMITE_MEMORIA) e enviados com Content-Length e suporte a Range, sem arquivos temporários.
+Gravar em disco fica restrito aos documentos que precisam ser arquivados (ver cache_pdf).
+"""
+
+import os
+from tempfile import SpooledTemporaryFile
+from flask import request, send_file
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+
+LIMITE_MEMORIA = 8 * 1024 * 1024  # bytes mantidos em memória antes de transbordar para o disco
+
+
+def renderizar_pdf(desenhar):
+    """Executa desenhar(saida) sobre um buffer novo e o devolve posicionado no início"""
+    buffer = SpooledTemporaryFile(max_size=LIMITE_MEMORIA)
+    try:
+        desenhar(buffer)
+    except Exception:
+        buffer.close()
+        raise
+    buffer.seek(0)
+    return buffer
+
+
+def resposta_pdf(buffer, nome_arquivo, anexo=True, etag=None):
+    """Resposta de download do buffer com Content-Length, ETag opcional e requisições parciais (206)"""
+    tamanho = buffer.seek(0, os.SEEK_END)
+    buffer.seek(0)
+
+    resposta = send_file(
+        buffer,
+        mimetype='application/pdf',
+        as_attachment=anexo,
+        download_name=nome_arquivo,
+        etag=etag or False,
+        conditional=False
+    )
+    resposta.content_length = tamanho
+    try:
+        return resposta.make_conditional(request.environ, accept_ranges=True, complete_length=tamanho)
+    except RequestedRangeNotSatisfiable:
+        buffer.close()
+        raise
@@ -0,0 +1,58 @@
+"""
+Períodos de calendário como predicados de intervalo
+Dia, mês ou intervalo viram sempre [inicio, fim) comparado direto com a coluna,
+sem func.date/extract no WHERE, para que os índices em data_hora/validade sejam usados
+"""
+
+from datetime import date, datetime, time, timedelta
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import Date, DateTime, and_, true
+
+
+def intervalo_do_dia(dia):
+    """Retorna o intervalo semiaberto [inicio, fim) do dia"""
+    inicio = datetime.combine(dia.date() if isinstance(dia, datetime) else dia, time.min)
+    return inicio, inicio + timedelta(days=1)
+
+
+def intervalo_do_mes(ano, mes):
+    """Retorna o intervalo semiaberto [inicio, fim) do mês"""
+    inicio = datetime(ano, mes, 1)
+    return inicio, inicio + relativedelta(months=1)
+
+
+def meses_anteriores(quantidade, referencia=None):
+    """(ano, mês) dos últimos meses até o de referência, do mais antigo ao mais recente"""
+    referencia = (referencia or date.today()).replace(day=1)
+    meses = [referencia - relativedelta(months=i) for i in range(quantidade)]
+    return [(mes.year, mes.month) for mes in reversed(meses)]
+
+
+def _limite(coluna, valor):
+    # Colunas Date comparam com date; DateTime com datetime
+    tipo = coluna.type
+    if isinstance(tipo, Date) and not isinstance(tipo, DateTime) and isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(tipo, DateTime) and not isinstance(valor, datetime):
+        return datetime.combine(valor, time.min)
+    return valor
+
+
+def periodo_entre(coluna, inicio=None, fim=None):
+    """coluna em [inicio, fim); um limite None deixa o intervalo aberto daquele lado"""
+    condicoes = []
+    if inicio is not None:
+        condicoes.append(coluna >= _limite(coluna, inicio))
+    if fim is not None:
+        condicoes.append(coluna < _limite(coluna, fim))
+    return and_(*condicoes) if condicoes else true()
+
+
+def periodo_do_dia(coluna, dia):
+    """coluna dentro do dia informado"""
+    return periodo_entre(coluna, *intervalo_do_dia(dia))
+
+
+def periodo_do_mes(coluna, ano, mes):
+    """coluna dentro do mês informado"""
+    return periodo_entre(coluna, *intervalo_do_mes(ano, mes))
@@ -0,0 +1,126 @@
+"""
+Verificação dos planos das consultas frequentes (flask indices verificar)
+Roda EXPLAIN QUERY PLAN nas consultas dos dashboards e listagens e aponta
+as que ainda percorrem uma tabela inteira ou ordenam em uma B-tree temporária
+"""
+
+from datetime import date, datetime, timedelta
+import click
+from flask.cli import AppGroup
+from sqlalchemy import and_, func, select
+
+from app.models import (
+    db, Aula, Aluno, Professor, Responsavel, Contrato, ContratoAluno, Notificacao, NotificacaoArquivada, Documento, User,
+    EventoFila
+)
+from app.periodos import periodo_do_dia, periodo_do_mes
+from app.busca import filtro_documento
+from app.notificacoes import consulta_pagina
+
+indices_cli = AppGroup('indices', help='Índices e planos de consulta do banco')
+
+# Ids de exemplo: o plano do SQLite não depende dos valores dos parâmetros
+_ID = 1
+_CURSOR = '20260101000000000000-1'
+
+
+def consultas_frequentes():
+    """Consultas (descrição, select) com os mesmos predicados usados nas rotas"""
+    hoje = date.today()
+    agora = datetime.now()
+    em_30_dias = hoje + timedelta(days=30)
+
+    return [
+        ('aulas do dia', select(func.count(Aula.id)).where(periodo_do_dia(Aula.data_hora, hoje))),
+        ('agenda do mês', select(Aula).where(
+            periodo_do_mes(Aula.data_hora, hoje.year, hoje.month)).order_by(Aula.data_hora)),
+        ('próximas aulas do aluno', select(Aula).where(
+            Aula.aluno_id == _ID, Aula.data_hora >= agora).order_by(Aula.data_hora).limit(5)),
+        ('próximas aulas do professor', select(Aula).where(
+            Aula.professor_id == _ID, Aula.data_hora >= agora).order_by(Aula.data_hora).limit(5)),
+        ('histórico de aulas do aluno', select(Aula).where(
+            Aula.aluno_id == _ID).order_by(Aula.data_hora.desc()).limit(10)),
+        ('notificações não lidas', select(Notificacao).where(
+            Notificacao.usuario_id == _ID, Notificacao.lida.is_(False)
+        ).order_by(Notificacao.data_criacao.desc()).limit(5)),
+        ('notificações do usuário (primeira página)', consulta_pagina(_ID)),
+        ('notificações do usuário (página seguinte)', consulta_pagina(_ID, _CURSOR)),
+        ('notificações arquivadas do usuário', consulta_pagina(_ID, _CURSOR, modelo=NotificacaoArquivada)),
+        ('eventos do usuário desde a última conexão', select(EventoFila).where(
+            EventoFila.usuario_id == _ID, EventoFila.id > _ID).order_by(EventoFila.id).limit(100)),
+        ('contratos ativos (validade)', select(func.count(Contrato.id)).where(Contrato.validade >= hoje)),
+        ('contratos vencidos (validade)', select(func.count(Contrato.id)).where(Contrato.validade < hoje)),
+        ('contratos vencendo', select(Contrato).where(
+            and_(Contrato.validade <= em_30_dias, Contrato.validade >= hoje)).order_by(Contrato.validade)),
+        ('contratos vencendo do responsável', select(Contrato).where(
+            Contrato.responsavel_id == _ID, Contrato.validade <= em_30_dias, Contrato.validade >= hoje
+        ).order_by(Contrato.validade)),
+        ('contratos vencendo (faixa)', select(Contrato).where(
+            Contrato.faixa_vencimento == Contrato.FAIXA_30_DIAS).order_by(Contrato.validade)),
+        ('contratos ativos vencidos (status)', select(Contrato).where(
+            Contrato.validade < hoje, Contrato.status == 'ativo')),
+        ('contratos ativos por vencimento', select(Contrato).where(
+            Contrato.status == 'ativo').order_by(Contrato.validade.asc())),
+        ('contratos por mês de início', select(func.count(Contrato.id)).where(
+            periodo_do_mes(Contrato.data_inicio, hoje.year, hoje.month))),
+        ('lista de contratos', select(Contrato).order_by(Contrato.data_upload.desc())),
+        ('contratos do aluno', select(Contrato).join(Contrato.alunos).join(ContratoAluno.aluno).where(
+            Aluno.id == _ID)),
+        ('documentos do aluno', select(Documento).where(Documento.aluno_id == _ID)),
+        ('alunos do responsável', select(Aluno).where(Aluno.responsavel_id == _ID)),
+        ('lista de alunos por nome', select(Aluno).order_by(Aluno.nome).limit(10)),
+        ('lista de alunos por cadastro', select(Aluno).order_by(Aluno.data_cadastro.desc()).limit(10)),
+        ('lista de professores', select(Professor).order_by(Professor.nome).limit(10)),
+        ('lista de responsáveis', select(Responsavel).order_by(Responsavel.nome)),
+        ('usuário do aluno', select(User).where(User.aluno_id == _ID)),
+        ('usuário do professor', select(User).where(User.professor_id == _ID)),
+        ('usuário do responsável', select(User).where(User.responsavel_id == _ID)),
+        ('responsável por CPF/telefone', select(Responsavel).where(filtro_documento(Responsavel, '123456'))),
+        ('aluno por CPF/telefone', select(Aluno).where(filtro_documento(Aluno, '123456'))),
+        ('professor por CPF/telefone', select(Professor).where(filtro_documento(Professor, '123456'))),
+        ('aluno por CPF exato', select(Aluno).where(Aluno.cpf_digitos == '12345678900')),
+    ]
+
+
+def _parametro(valor):
+    # Datas no mesmo formato de texto que o SQLAlchemy grava no SQLite
+    if isinstance(valor, (date, datetime)):
+        return str(valor)
+    return valor
+
+
+def plano_da_consulta(consulta):
+    """Linhas de detalhe do EXPLAIN QUERY PLAN da consulta"""
+    compilada = consulta.compile(dialect=db.engine.dialect)
+    parametros = tuple(_parametro(compilada.params[nome]) for nome in compilada.positiontup or ())
+    linhas = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {compilada}', parametros)
+    return [linha[-1] for linha in linhas]
+
+
+def problemas_do_plano(detalhes):
+    """Passos do plano que percorrem a tabela inteira ou ordenam sem índice"""
+    return [
+        detalhe for detalhe in detalhes
+        if (detalhe.startswith('SCAN ') and ' USING ' not in detalhe) or 'TEMP B-TREE' in detalhe
+    ]
+
+
+@indices_cli.command('verificar')
+@click.option('--detalhes', is_flag=True, help='Mostra o plano completo de cada consulta')
+def verificar_command(detalhes):
+    """Confere se cada consulta frequente é resolvida por índice"""
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException('A verificação usa EXPLAIN QUERY PLAN e só está disponível no SQLite.')
+
+    falhas = 0
+    for descricao, consulta in consultas_frequentes():
+        plano = plano_da_consulta(consulta)
+        problemas = problemas_do_plano(plano)
+        click.echo(f'[{"ERRO" if problemas else " ok "}] {descricao}')
+        for detalhe in (plano if detalhes else problemas):
+            click.echo(f'        {detalhe}')
+        falhas += bool(problemas)
+
+    if falhas:
+        raise click.ClickException(f'{falhas} consulta(s) sem índice adequado.')
+    click.echo('Todas as consultas frequentes usam índices.')
@@ -0,0 +1,62 @@
+"""
+Expansão de agendamentos recorrentes
+Gera todas as ocorrências por aritmética de datas (no estilo RRULE),
+sem percorrer o calendário dia a dia
+"""
+
+from datetime import datetime, timedelta
+from dateutil.relativedelta import relativedelta
+
+# Intervalo, em semanas, entre ocorrências de cada tipo de recorrência semanal
+SEMANAS_POR_TIPO = {
+    'semanal': 1,
+    'quinzenal': 2
+}
+
+TIPOS_RECORRENCIA = tuple(SEMANAS_POR_TIPO) + ('mensal',)
+
+
+def _limite_exclusivo(data_fim):
+    """A data final é inclusiva: aceita ocorrências até o fim desse dia"""
+    return datetime(data_fim.year, data_fim.month, data_fim.day) + timedelta(days=1)
+
+
+def expandir_regra(data_base, tipo, dia_semana, data_fim):
+    """
+    Retorna as datas de uma regra de recorrência a partir de data_base (inclusive) até data_fim.
+    Regras semanais/quinzenais começam no primeiro dia_semana a partir de data_base;
+    regras mensais repetem o dia do mês de data_base.
+    """
+    if tipo not in TIPOS_RECORRENCIA:
+        raise ValueError(f"Tipo de recorrência inválido: {tipo}")
+
+    limite = _limite_exclusivo(data_fim)
+    if data_base >= limite:
+        return []
+
+    if tipo == 'mensal':
+        ocorrencias = []
+        meses = 0
+        ocorrencia = data_base
+        while ocorrencia < limite:
+            ocorrencias.append(ocorrencia)
+            meses += 1
+            # Sempre a partir da data base, para não acumular o ajuste de fim de mês
+            ocorrencia = data_base + relativedelta(months=meses)
+        return ocorrencias
+
+    primeira = data_base + timedelta(days=(int(dia_semana) - data_base.weekday()) % 7)
+    if primeira >= limite:
+        return []
+
+    passo = timedelta(weeks=SEMANAS_POR_TIPO[tipo])
+    total = (limite - primeira - timedelta(microseconds=1)) // passo + 1
+    return [primeira + passo * i for i in range(total)]
+
+
+def expandir_recorrencias(data_base, regras):
+    """Expande uma lista de regras ({'tipo', 'dia_semana', 'data_fim'}) em datas únicas e ordenadas"""
+    ocorrencias = set()
+    for regra in regras:
+        ocorrencias.update(expandir_regra(data_base, regra['tipo'], regra['dia_semana'], regra['data_fim']))
+    return sorted(ocorrencias)
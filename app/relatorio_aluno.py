@@ -0,0 +1,282 @@
+"""
+Extrato de aulas do aluno em PDF (ReportLab)
+Logo e estilos são carregados uma vez por processo. Extratos de meses já encerrados ficam
+gravados em disco e só são descartados quando uma aula do aluno naquele mês é alterada.
+"""
+
+import glob
+import os
+import threading
+import time
+from datetime import date, timedelta
+from itertools import groupby
+from xml.sax.saxutils import escape
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import event, inspect
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+from app.models import db, Aula, Aluno, Professor
+from app.relatorios import mes_encerrado
+from app.periodos import intervalo_do_mes, periodo_entre
+from app.cache_pdf import CachePDF, cache_pdf
+
+VERSAO_MODELO = 2  # incrementar ao alterar o layout (extratos já gravados deixam de ser usados)
+
+EMPRESA = {
+    'nome': 'ÍMPETUS INSTITUTO DE EDUCAÇÃO',
+    'cnpj': '36.207.755/0001-09',
+    'endereco': 'SCLN 103 Bloco B Sala 7'
+}
+
+_CHAVE_PENDENTES = 'extratos_invalidar'
+
+relatorios_cli = AppGroup('relatorios', help='Relatórios e extratos em PDF')
+
+_recursos = None
+_trava_recursos = threading.Lock()
+
+
+class _Recursos:
+    """Estilos e logo compartilhados por todos os extratos do processo"""
+
+    def __init__(self, caminho_logo):
+        estilos = getSampleStyleSheet()
+        self.titulo = ParagraphStyle('ExtratoTitulo', parent=estilos['Heading1'], fontSize=18,
+                                     alignment=TA_CENTER, spaceBefore=10, spaceAfter=15)
+        self.texto = ParagraphStyle('ExtratoTexto', parent=estilos['Normal'], fontSize=12, leading=18)
+        self.total = ParagraphStyle('ExtratoTotal', parent=self.texto, fontName='Helvetica-Bold',
+                                    alignment=TA_RIGHT)
+        self.rodape = ParagraphStyle('ExtratoRodape', parent=estilos['Normal'], fontSize=10,
+                                     textColor=colors.HexColor('#666666'), alignment=TA_RIGHT)
+        self.tabela = TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f2f2f2')),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dddddd')),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6)
+        ])
+        self.logo = ImageReader(caminho_logo) if caminho_logo and os.path.exists(caminho_logo) else None
+
+
+def recursos():
+    global _recursos
+    if _recursos is None:
+        with _trava_recursos:
+            if _recursos is None:
+                _recursos = _Recursos(
+                    os.path.join(current_app.root_path, 'static', 'img', 'Logo_Impetus-preto.png')
+                )
+    return _recursos
+
+
+def _cabecalho(canvas, doc):
+    """Logo e dados da empresa no topo da primeira página"""
+    r = recursos()
+    largura, altura = A4
+    topo = altura - 2 * cm
+    canvas.saveState()
+    if r.logo:
+        canvas.drawImage(r.logo, 2 * cm, topo - 2 * cm, height=2 * cm, width=4 * cm,
+                         preserveAspectRatio=True, anchor='sw', mask='auto')
+    canvas.setFont('Helvetica-Bold', 12)
+    canvas.drawRightString(largura - 2 * cm, topo - 0.5 * cm, EMPRESA['nome'])
+    canvas.setFont('Helvetica', 10)
+    canvas.drawRightString(largura - 2 * cm, topo - 1.1 * cm, f"CNPJ: {EMPRESA['cnpj']}")
+    canvas.drawRightString(largura - 2 * cm, topo - 1.6 * cm, f"Endereço: {EMPRESA['endereco']}")
+    canvas.setLineWidth(2)
+    canvas.setStrokeColor(colors.HexColor('#333333'))
+    canvas.line(2 * cm, topo - 2.3 * cm, largura - 2 * cm, topo - 2.3 * cm)
+    canvas.restoreState()
+
+
+def desenhar_extrato(saida, aluno_nome, aulas, periodo, data_emissao):
+    """
+    Desenha o extrato em `saida` (caminho ou arquivo aberto).
+    `aulas` são linhas com data_hora, professor_nome, duracao e valor_aula.
+    """
+    r = recursos()
+    doc = SimpleDocTemplate(saida, pagesize=A4, leftMargin=2 * cm, rightMargin=2 * cm,
+                            topMargin=2 * cm, bottomMargin=2 * cm)
+    story = [
+        Spacer(1, 2.5 * cm),
+        Paragraph(f'Relatório de Aulas - {escape(aluno_nome)}', r.titulo),
+        Paragraph(f'Período: {periodo}', r.texto),
+        Paragraph(f"Data: {data_emissao.strftime('%d/%m/%Y')}", r.texto),
+        Spacer(1, 10)
+    ]
+
+    if not aulas:
+        story.append(Paragraph('Nenhuma aula encontrada no período selecionado.', r.texto))
+    else:
+        linhas = [['Data', 'Professor', 'Duração (min)', 'Valor (R$)']]
+        linhas.extend([
+            aula.data_hora.strftime('%d/%m/%Y'), aula.professor_nome, str(aula.duracao),
+            f'{aula.valor_aula:.2f}'
+        ] for aula in aulas)
+        tabela = Table(linhas, colWidths=[3 * cm, 7 * cm, 3.5 * cm, 3.5 * cm], repeatRows=1)
+        tabela.setStyle(r.tabela)
+        story.append(tabela)
+        story.append(Spacer(1, 10))
+
+        total_horas = sum(aula.duracao for aula in aulas) / 60
+        total_devido = sum(aula.valor_aula for aula in aulas)
+        story.append(Paragraph(f'Total de Aulas: {len(aulas)}', r.total))
+        story.append(Paragraph(f'Total de Horas: {total_horas:.1f}h', r.total))
+        story.append(Paragraph(f'Valor Total Devido: R$ {total_devido:.2f}', r.total))
+
+    story.append(Spacer(1, 30))
+    story.append(Paragraph(f"Emitido em {data_emissao.strftime('%d/%m/%Y')}", r.rodape))
+
+    doc.build(story, onFirstPage=_cabecalho)
+    return saida
+
+
+def consultar_aulas(aluno_ids=None, inicio=None, fim=None):
+    """Aulas realizadas (intervalo semiaberto [inicio, fim)) já com o nome do professor"""
+    consulta = db.session.query(
+        Aula.aluno_id, Aula.data_hora, Professor.nome.label('professor_nome'),
+        Aula.duracao, Aula.valor_aula
+    ).join(Professor, Aula.professor_id == Professor.id)\
+     .filter(Aula.realizada.is_(True))
+    if aluno_ids is not None:
+        consulta = consulta.filter(Aula.aluno_id.in_(aluno_ids))
+    consulta = consulta.filter(periodo_entre(Aula.data_hora, inicio, fim))
+    return consulta.order_by(Aula.aluno_id, Aula.data_hora).all()
+
+
+def descrever_periodo(inicio=None, fim=None):
+    if not inicio and not fim:
+        return 'todas as aulas realizadas'
+    de = inicio.strftime('%d/%m/%Y') if inicio else 'início'
+    ate = (fim - timedelta(days=1)).strftime('%d/%m/%Y') if fim else 'hoje'
+    return f'{de} a {ate}'
+
+
+def mes_fechado_do_periodo(inicio, fim):
+    """(ano, mês) se [inicio, fim) cobre exatamente um mês já encerrado, senão None"""
+    if not inicio or not fim or intervalo_do_mes(inicio.year, inicio.month) != (inicio, fim):
+        return None
+    if not mes_encerrado(inicio.year, inicio.month):
+        return None
+    return inicio.year, inicio.month
+
+
+def cache_extratos():
+    """Cache de extratos mensais (subdiretório do cache de PDFs)"""
+    base = cache_pdf()
+    return CachePDF(os.path.join(base.diretorio, 'extratos'), base.limite_bytes)
+
+
+def _chave_extrato(aluno_id, ano, mes):
+    return f'extrato_{aluno_id}_{ano}_{mes:02d}_v{VERSAO_MODELO}'
+
+
+def extrato_mensal(aluno, ano, mes, aulas=None, cache=None):
+    """Caminho do extrato do mês encerrado, gerado apenas se ainda não estiver em cache"""
+    cache = cache or cache_extratos()
+    chave = _chave_extrato(aluno.id, ano, mes)
+
+    def gerar(caminho):
+        linhas = aulas if aulas is not None else consultar_aulas([aluno.id], *intervalo_do_mes(ano, mes))
+        inicio, fim = intervalo_do_mes(ano, mes)
+        # Emitido no dia seguinte ao fim do mês, não no dia da primeira geração: o PDF fica em cache
+        desenhar_extrato(caminho, aluno.nome, linhas, descrever_periodo(inicio, fim), fim.date())
+
+    return cache.obter_ou_gerar(chave, gerar)
+
+
+def invalidar_extratos(particoes, cache=None):
+    """Descarta os extratos gravados das partições (ano, mês, aluno); ano/mês None = todos os meses do aluno"""
+    diretorio = (cache or cache_extratos()).diretorio
+    for ano, mes, aluno_id in particoes:
+        if aluno_id is None:
+            padrao = 'extrato_*.pdf'
+        elif ano is None:
+            padrao = f'extrato_{aluno_id}_*.pdf'
+        else:
+            padrao = f'extrato_{aluno_id}_{ano}_{mes:02d}_*.pdf'
+        for caminho in glob.glob(os.path.join(diretorio, padrao)):
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+
+
+def _valores(estado, atributo, atual):
+    historico = estado.attrs[atributo].history
+    return {atual, *historico.deleted}
+
+
+def _antes_do_flush(session, flush_context, instances):
+    pendentes = session.info.setdefault(_CHAVE_PENDENTES, set())
+    for obj in list(session.new) + list(session.deleted) + list(session.dirty):
+        if isinstance(obj, Aula):
+            estado = inspect(obj)
+            for data_hora in _valores(estado, 'data_hora', obj.data_hora):
+                for aluno_id in _valores(estado, 'aluno_id', obj.aluno_id):
+                    if data_hora is not None and aluno_id is not None:
+                        pendentes.add((data_hora.year, data_hora.month, int(aluno_id)))
+        elif isinstance(obj, Aluno) and inspect(obj).attrs.nome.history.has_changes():
+            pendentes.add((None, None, obj.id))
+        elif isinstance(obj, Professor) and inspect(obj).attrs.nome.history.has_changes():
+            pendentes.add((None, None, None))
+
+
+def _depois_do_commit(session):
+    pendentes = session.info.pop(_CHAVE_PENDENTES, None)
+    if pendentes:
+        try:
+            invalidar_extratos(pendentes)
+        except Exception as e:
+            current_app.logger.error(f'Erro ao invalidar extratos: {str(e)}')
+
+
+def _depois_do_rollback(session):
+    session.info.pop(_CHAVE_PENDENTES, None)
+
+
+def registrar_eventos():
+    """Descarta extratos gravados quando aulas (ou nomes exibidos neles) mudam"""
+    if not event.contains(db.session, 'before_flush', _antes_do_flush):
+        event.listen(db.session, 'before_flush', _antes_do_flush)
+        event.listen(db.session, 'after_commit', _depois_do_commit)
+        event.listen(db.session, 'after_soft_rollback', lambda session, transacao: _depois_do_rollback(session))
+
+
+def gerar_extratos_do_mes(ano, mes):
+    """Gera (ou reaproveita) os extratos de todos os alunos com aulas no mês. Retorna quantos foram gerados."""
+    aulas = consultar_aulas(None, *intervalo_do_mes(ano, mes))
+    por_aluno = {aluno_id: list(linhas) for aluno_id, linhas in groupby(aulas, key=lambda a: a.aluno_id)}
+    if not por_aluno:
+        return 0
+
+    cache = cache_extratos()
+    for aluno in Aluno.query.filter(Aluno.id.in_(por_aluno)).all():
+        extrato_mensal(aluno, ano, mes, aulas=por_aluno[aluno.id], cache=cache)
+    return len(por_aluno)
+
+
+@relatorios_cli.command('extratos')
+@click.option('--ano', type=int, default=None, help='Ano (padrão: mês anterior)')
+@click.option('--mes', type=int, default=None, help='Mês (padrão: mês anterior)')
+def extratos_command(ano, mes):
+    """Gera os extratos do mês encerrado para todos os alunos com aulas realizadas"""
+    if not ano or not mes:
+        anterior = date.today().replace(day=1) - timedelta(days=1)
+        ano, mes = anterior.year, anterior.month
+    if not mes_encerrado(ano, mes):
+        raise click.UsageError('Extratos só podem ser gerados para meses já encerrados.')
+
+    inicio = time.perf_counter()
+    total = gerar_extratos_do_mes(ano, mes)
+    click.echo(f'{total} extrato(s) de {mes:02d}/{ano} prontos em {time.perf_counter() - inicio:.1f}s.')
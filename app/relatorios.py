@@ -0,0 +1,219 @@
+"""
+Motor do relatório mensal
+Lê o mês com uma única consulta agrupada (filtro por intervalo em data_hora)
+e consolida todos os totais e detalhamentos em Python. Meses já encerrados
+são lidos do consolidado resumo_mensal.
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import func
+
+from app.models import db, Aula, Aluno, Professor, ResumoMensal
+from app.periodos import intervalo_do_mes, periodo_do_mes
+
+
+def consultar_linhas_mes(ano, mes):
+    """
+    Consulta única do mês agrupada por professor × aluno × local × tipo de aula.
+    Cada linha já traz as somas necessárias para todos os blocos do relatório.
+    """
+    return db.session.query(
+        Aula.professor_id,
+        Professor.nome.label('professor_nome'),
+        Professor.valor_hora,
+        Aula.aluno_id,
+        Aluno.nome.label('aluno_nome'),
+        Aluno.plano_adquirido,
+        Aula.local,
+        Aula.tipo_aula,
+        func.count(Aula.id).label('total_aulas'),
+        func.coalesce(func.sum(Aula.duracao), 0).label('total_minutos'),
+        func.coalesce(func.sum(Aula.valor_aula), 0).label('valor_total'),
+        func.coalesce(func.sum(Aula.custo_aula), 0).label('custo_total'),
+        func.coalesce(func.sum(func.coalesce(Aula.deslocamento, 0)), 0).label('deslocamento_total')
+    ).join(Professor, Aula.professor_id == Professor.id)\
+     .join(Aluno, Aula.aluno_id == Aluno.id)\
+     .filter(periodo_do_mes(Aula.data_hora, ano, mes))\
+     .group_by(
+        Aula.professor_id, Professor.nome, Professor.valor_hora,
+        Aula.aluno_id, Aluno.nome, Aluno.plano_adquirido,
+        Aula.local, Aula.tipo_aula
+     ).all()
+
+
+def consultar_linhas_resumo(ano, mes):
+    """Mesmas linhas de consultar_linhas_mes, lidas do consolidado resumo_mensal"""
+    return db.session.query(
+        ResumoMensal.professor_id,
+        Professor.nome.label('professor_nome'),
+        Professor.valor_hora,
+        ResumoMensal.aluno_id,
+        Aluno.nome.label('aluno_nome'),
+        Aluno.plano_adquirido,
+        ResumoMensal.local,
+        ResumoMensal.tipo_aula,
+        ResumoMensal.total_aulas,
+        ResumoMensal.total_minutos,
+        ResumoMensal.faturamento.label('valor_total'),
+        ResumoMensal.custo_professores.label('custo_total'),
+        ResumoMensal.deslocamento.label('deslocamento_total')
+    ).join(Professor, ResumoMensal.professor_id == Professor.id)\
+     .join(Aluno, ResumoMensal.aluno_id == Aluno.id)\
+     .filter(ResumoMensal.ano == ano, ResumoMensal.mes == mes).all()
+
+
+def mes_encerrado(ano, mes, hoje=None):
+    """Indica se o mês já terminou"""
+    hoje = hoje or datetime.now()
+    _, fim = intervalo_do_mes(ano, mes)
+    return fim <= datetime(hoje.year, hoje.month, 1)
+
+
+def _percentual(parte, total):
+    return parte * 100.0 / total if total else 0.0
+
+
+def _horas(minutos):
+    return round(minutos / 60, 1)
+
+
+def consolidar_relatorio(linhas):
+    """Reduz as linhas agrupadas no contexto usado por relatorios/mensal.html"""
+    total_aulas = 0
+    total_minutos = 0
+    faturamento_total = 0.0
+    custo_professores = 0.0
+    deslocamento_total = 0.0
+
+    professores = {}
+    alunos = {}
+    relacoes = {}
+    planos = defaultdict(set)
+    locais = defaultdict(int)
+    tipos = defaultdict(int)
+
+    for linha in linhas:
+        total_aulas += linha.total_aulas
+        total_minutos += linha.total_minutos
+        faturamento_total += linha.valor_total
+        custo_professores += linha.custo_total
+        deslocamento_total += linha.deslocamento_total
+
+        professor = professores.setdefault(linha.professor_id, {
+            'nome': linha.professor_nome,
+            'valor_hora': linha.valor_hora or 0,
+            'total_aulas': 0,
+            'total_minutos': 0,
+            'valor_gerado': 0.0,
+            'alunos': defaultdict(int)
+        })
+        professor['total_aulas'] += linha.total_aulas
+        professor['total_minutos'] += linha.total_minutos
+        professor['valor_gerado'] += linha.valor_total
+        professor['alunos'][linha.aluno_nome] += linha.total_aulas
+
+        aluno = alunos.setdefault(linha.aluno_id, {
+            'nome': linha.aluno_nome,
+            'plano_adquirido': linha.plano_adquirido,
+            'total_aulas': 0,
+            'total_minutos': 0,
+            'valor_total': 0.0,
+            'professores': defaultdict(int)
+        })
+        aluno['total_aulas'] += linha.total_aulas
+        aluno['total_minutos'] += linha.total_minutos
+        aluno['valor_total'] += linha.valor_total
+        aluno['professores'][linha.professor_nome] += linha.total_aulas
+
+        relacao = relacoes.setdefault((linha.aluno_id, linha.professor_id), {
+            'aluno_nome': linha.aluno_nome,
+            'professor_nome': linha.professor_nome,
+            'total_aulas': 0,
+            'total_minutos': 0,
+            'valor_total': 0.0,
+            'custo_professor': 0.0
+        })
+        relacao['total_aulas'] += linha.total_aulas
+        relacao['total_minutos'] += linha.total_minutos
+        relacao['valor_total'] += linha.valor_total
+        relacao['custo_professor'] += linha.custo_total
+
+        planos[linha.plano_adquirido].add(linha.aluno_id)
+        locais[linha.local] += linha.total_aulas
+        tipos[linha.tipo_aula] += linha.total_aulas
+
+    alunos_ativos = len(alunos)
+
+    aulas_por_professor = [{
+        'nome': prof['nome'],
+        'total_aulas': prof['total_aulas'],
+        'horas_ministradas': _horas(prof['total_minutos']),
+        'valor_gerado': prof['valor_gerado'],
+        'valor_hora': prof['valor_hora'],
+        'custo_total': (prof['total_minutos'] / 60) * prof['valor_hora'],
+        'alunos_atendidos': [
+            {'nome': nome, 'total_aulas': total}
+            for nome, total in sorted(prof['alunos'].items())
+        ]
+    } for prof in sorted(professores.values(), key=lambda p: p['nome'])]
+
+    aulas_por_aluno = [{
+        'nome': aluno['nome'],
+        'plano_adquirido': aluno['plano_adquirido'],
+        'total_aulas': aluno['total_aulas'],
+        'horas_recebidas': _horas(aluno['total_minutos']),
+        'valor_total': aluno['valor_total'],
+        'professores': [
+            {'nome': nome, 'total_aulas': total}
+            for nome, total in sorted(aluno['professores'].items())
+        ]
+    } for aluno in sorted(alunos.values(), key=lambda a: a['nome'])]
+
+    relacoes_aluno_professor = [dict(
+        relacao,
+        total_horas=relacao['total_minutos'] / 60,
+        valor_aula=relacao['valor_total'] / relacao['total_aulas'] if relacao['total_aulas'] else 0
+    ) for relacao in sorted(relacoes.values(), key=lambda r: (r['aluno_nome'], r['professor_nome']))]
+
+    alunos_por_plano = [{
+        'plano_adquirido': plano,
+        'total': len(ids),
+        'percentual': _percentual(len(ids), alunos_ativos)
+    } for plano, ids in sorted(planos.items(), key=lambda item: item[0] or '')]
+
+    aulas_por_local = [{
+        'local': local,
+        'total': total,
+        'percentual': _percentual(total, total_aulas)
+    } for local, total in sorted(locais.items(), key=lambda item: item[0] or '')]
+
+    aulas_por_tipo = [{
+        'tipo_aula': tipo,
+        'total': total,
+        'percentual': _percentual(total, total_aulas)
+    } for tipo, total in sorted(tipos.items(), key=lambda item: item[0] or '')]
+
+    return {
+        'total_aulas': total_aulas,
+        'alunos_ativos': alunos_ativos,
+        'professores_ativos': len(professores),
+        'horas_ministradas': _horas(total_minutos),
+        'faturamento_total': faturamento_total,
+        'custo_professores': custo_professores,
+        'deslocamento_total': deslocamento_total,
+        'lucro_liquido': faturamento_total - custo_professores - deslocamento_total,
+        'aulas_por_professor': aulas_por_professor,
+        'aulas_por_aluno': aulas_por_aluno,
+        'relacoes_aluno_professor': relacoes_aluno_professor,
+        'alunos_por_plano': alunos_por_plano,
+        'aulas_por_local': aulas_por_local,
+        'aulas_por_tipo': aulas_por_tipo
+    }
+
+
+def gerar_relatorio_mensal(ano, mes):
+    """Gera o contexto completo do relatório mensal"""
+    if mes_encerrado(ano, mes):
+        return consolidar_relatorio(consultar_linhas_resumo(ano, mes))
+    return consolidar_relatorio(consultar_linhas_mes(ano, mes))
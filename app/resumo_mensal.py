@@ -0,0 +1,167 @@
+"""
+Consolidado financeiro mensal (tabela resumo_mensal)
+Mantido de forma incremental: a cada flush que cria, altera ou exclui aulas,
+apenas as partições (ano, mês, professor) afetadas são recalculadas
+"""
+
+from datetime import date
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, func, case, inspect, select, and_, or_, extract
+
+from app.models import db, Aula, ResumoMensal
+from app.periodos import intervalo_do_mes, periodo_do_mes, periodo_entre
+
+_CHAVE_PENDENTES = 'resumo_mensal_particoes'
+
+resumo_cli = AppGroup('resumo-mensal', help='Manutenção do consolidado mensal de aulas')
+
+
+def particao_da_aula(data_hora, professor_id):
+    """Partição (ano, mês, professor) do consolidado à qual a aula pertence"""
+    if data_hora is None or professor_id is None:
+        return None
+    return (data_hora.year, data_hora.month, int(professor_id))
+
+
+def _valores_anteriores(estado, atributo, atual):
+    """Valores do atributo antes do flush (o atual, se não houve alteração)"""
+    historico = estado.attrs[atributo].history
+    return list(historico.deleted) or [atual]
+
+
+def _particoes_afetadas(aula):
+    """Partições da aula antes e depois da alteração"""
+    particoes = {particao_da_aula(aula.data_hora, aula.professor_id)}
+    estado = inspect(aula)
+    if estado.persistent or estado.deleted:
+        for data_hora in _valores_anteriores(estado, 'data_hora', aula.data_hora):
+            for professor_id in _valores_anteriores(estado, 'professor_id', aula.professor_id):
+                particoes.add(particao_da_aula(data_hora, professor_id))
+    particoes.discard(None)
+    return particoes
+
+
+def _colunas_agregadas():
+    return (
+        func.count(Aula.id).label('total_aulas'),
+        func.coalesce(func.sum(case((Aula.realizada.is_(True), 1), else_=0)), 0).label('aulas_realizadas'),
+        func.coalesce(func.sum(Aula.duracao), 0).label('total_minutos'),
+        func.coalesce(func.sum(Aula.valor_aula), 0).label('faturamento'),
+        func.coalesce(func.sum(Aula.custo_aula), 0).label('custo_professores'),
+        func.coalesce(func.sum(func.coalesce(Aula.deslocamento, 0)), 0).label('deslocamento')
+    )
+
+
+def recalcular_particoes(conexao, particoes):
+    """Recalcula as linhas do consolidado das partições informadas"""
+    tabela = ResumoMensal.__table__
+    for ano, mes, professor_id in sorted(particoes):
+        linhas = conexao.execute(
+            select(Aula.aluno_id, Aula.local, Aula.tipo_aula, *_colunas_agregadas())
+            .where(Aula.professor_id == professor_id, periodo_do_mes(Aula.data_hora, ano, mes))
+            .group_by(Aula.aluno_id, Aula.local, Aula.tipo_aula)
+        ).all()
+
+        conexao.execute(tabela.delete().where(
+            tabela.c.ano == ano, tabela.c.mes == mes, tabela.c.professor_id == professor_id
+        ))
+        if linhas:
+            conexao.execute(tabela.insert(), [
+                dict(linha._mapping, ano=ano, mes=mes, professor_id=professor_id)
+                for linha in linhas
+            ])
+
+
+def atualizar_particoes(particoes):
+    """Atualiza o consolidado na transação atual (usado após inserções em lote, que não disparam eventos)"""
+    particoes = {p for p in particoes if p is not None}
+    if particoes:
+        recalcular_particoes(db.session.connection(), particoes)
+
+
+def _antes_do_flush(session, flush_context, instances):
+    pendentes = session.info.setdefault(_CHAVE_PENDENTES, set())
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Aula):
+            pendentes.update(_particoes_afetadas(obj))
+    for obj in session.dirty:
+        if isinstance(obj, Aula) and session.is_modified(obj, include_collections=False):
+            pendentes.update(_particoes_afetadas(obj))
+
+
+def _depois_do_flush(session, flush_context):
+    pendentes = session.info.pop(_CHAVE_PENDENTES, None)
+    if pendentes:
+        recalcular_particoes(session.connection(), pendentes)
+
+
+def registrar_eventos():
+    """Liga a manutenção incremental do consolidado aos flushes da sessão"""
+    if not event.contains(db.session, 'before_flush', _antes_do_flush):
+        event.listen(db.session, 'before_flush', _antes_do_flush)
+        event.listen(db.session, 'after_flush', _depois_do_flush)
+
+
+def reconstruir_resumo_mensal(ano=None):
+    """Reconstrói o consolidado a partir das aulas (todas ou de um ano). Retorna o número de linhas geradas."""
+    tabela = ResumoMensal.__table__
+    ano_aula = extract('year', Aula.data_hora)
+    mes_aula = extract('month', Aula.data_hora)
+
+    consulta = select(
+        ano_aula.label('ano'), mes_aula.label('mes'),
+        Aula.professor_id, Aula.aluno_id, Aula.local, Aula.tipo_aula,
+        *_colunas_agregadas()
+    ).group_by(ano_aula, mes_aula, Aula.professor_id, Aula.aluno_id, Aula.local, Aula.tipo_aula)
+
+    remocao = tabela.delete()
+    if ano:
+        inicio, _ = intervalo_do_mes(ano, 1)
+        fim, _ = intervalo_do_mes(ano + 1, 1)
+        consulta = consulta.where(periodo_entre(Aula.data_hora, inicio, fim))
+        remocao = remocao.where(tabela.c.ano == ano)
+
+    linhas = [dict(linha._mapping) for linha in db.session.execute(consulta)]
+    for linha in linhas:
+        linha['ano'] = int(linha['ano'])
+        linha['mes'] = int(linha['mes'])
+
+    db.session.execute(remocao)
+    if linhas:
+        db.session.execute(tabela.insert(), linhas)
+    db.session.commit()
+    return len(linhas)
+
+
+def tendencia_mensal(meses=36):
+    """Totais por mês dos últimos `meses` meses, lidos apenas do consolidado"""
+    hoje = date.today()
+    indice_inicial = hoje.year * 12 + hoje.month - (meses - 1)  # inclui o mês atual
+    ano_inicial, mes_inicial = divmod(indice_inicial, 12)
+    ano_inicial, mes_inicial = (ano_inicial - 1, 12) if mes_inicial == 0 else (ano_inicial, mes_inicial)
+
+    return db.session.query(
+        ResumoMensal.ano,
+        ResumoMensal.mes,
+        func.sum(ResumoMensal.total_aulas).label('total_aulas'),
+        func.sum(ResumoMensal.faturamento).label('faturamento'),
+        func.sum(ResumoMensal.custo_professores).label('custo_professores'),
+        func.sum(ResumoMensal.deslocamento).label('deslocamento')
+    ).filter(or_(
+        ResumoMensal.ano > ano_inicial,
+        and_(ResumoMensal.ano == ano_inicial, ResumoMensal.mes >= mes_inicial)
+    ), or_(
+        # Aulas recorrentes já criadas para os meses seguintes ficam de fora
+        ResumoMensal.ano < hoje.year,
+        and_(ResumoMensal.ano == hoje.year, ResumoMensal.mes <= hoje.month)
+    )).group_by(ResumoMensal.ano, ResumoMensal.mes)\
+      .order_by(ResumoMensal.ano, ResumoMensal.mes).all()
+
+
+@resumo_cli.command('reconstruir')
+@click.option('--ano', type=int, default=None, help='Reconstrói apenas o ano informado')
+def reconstruir_command(ano):
+    """Reconstrói o consolidado mensal a partir da tabela de aulas"""
+    total = reconstruir_resumo_mensal(ano)
+    click.echo(f'Consolidado mensal reconstruído: {total} linha(s).')
@@ -1,17 +1,14 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, abort, jsonify, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, abort, jsonify, send_file, Response
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash
 from datetime import datetime, timedelta, date
 from dateutil.relativedelta import relativedelta
-from io import BytesIO
 import os
-from sqlalchemy import func, extract, and_, or_, distinct
+from sqlalchemy import and_
 import calendar
-from weasyprint import HTML
 from pytz import timezone
 from functools import wraps
-import tempfile
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet
@@ -19,7 +16,7 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.units import inch
 from functools import wraps
 
-from app.models import db, User, Aluno, Professor, Aula, Contrato, Notificacao, Documento, Responsavel
+from app.models import db, User, Aluno, Professor, Aula, Contrato, ContratoAluno, Notificacao, Documento, Responsavel
 from app.forms import (
     ProfessorForm,
     RegistrationForm,
@@ -32,7 +29,30 @@ from app.forms import (
 )
 from app.utils import (
     allowed_file, validar_cpf, enviar_email_confirmacao,
-    generate_confirmation_token, verificar_conflitos_horario
+    generate_confirmation_token
+)
+from app.conflitos import DURACAO_MAXIMA_AULA_MINUTOS, verificar_conflitos_lote
+from app.recorrencia import expandir_recorrencias
+from app.relatorios import gerar_relatorio_mensal
+from app.periodos import periodo_do_dia, periodo_do_mes, periodo_entre
+from app.status_contratos import atualizar_status_se_necessario
+from app.estatisticas_contratos import estatisticas_contratos
+from app.cache import cacheado
+from app.carregamento import perfil_carregamento
+from app.desempenho import desempenho
+from app.busca import buscar, ids_correspondentes
+from app.notificacoes import (
+    criar_notificacoes_vencimento, marcar_todas_lidas, pagina_notificacoes,
+    TAMANHO_PAGINA as TAMANHO_PAGINA_NOTIFICACOES
+)
+from app.agendador import agendador
+from app.eventos import fluxo as fluxo_eventos, reenviar as reenviar_eventos
+from app.autocompletar import autocompletar, ENTIDADES as ENTIDADES_AUTOCOMPLETAR, LIMITE_PADRAO
+from app.resumo_mensal import atualizar_particoes, particao_da_aula, tendencia_mensal
+from app.cache_pdf import arquivar_contrato, cache_pdf, chave_conteudo
+from app.pdf_saida import renderizar_pdf, resposta_pdf
+from app.relatorio_aluno import (
+    consultar_aulas, desenhar_extrato, descrever_periodo, extrato_mensal, mes_fechado_do_periodo
 )
 
 # Configuração de Blueprints
@@ -58,6 +78,15 @@ def criar_notificacao(usuario_id, titulo, mensagem, tipo='info'):
     db.session.commit()
     return notificacao
 
+def notificacoes_nao_lidas_recentes(limite=5):
+    """Últimas notificações não lidas do usuário atual (sem consulta quando o contador está zerado)"""
+    if not current_user.notificacoes_nao_lidas:
+        return []
+    return Notificacao.query.filter_by(
+        usuario_id=current_user.id,
+        lida=False
+    ).order_by(Notificacao.data_criacao.desc()).limit(limite).all()
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in {'pdf', 'doc', 'docx', 'jpg', 'png'}
@@ -209,30 +238,36 @@ def dashboard():
 @admin_required
 def admin_dashboard():
     """Dashboard administrativo com estatísticas do sistema"""
-    total_alunos = Aluno.query.count()
-    total_professores = Professor.query.count()
-    total_responsaveis = Responsavel.query.count()
-    total_contratos = Contrato.query.count()
-    contratos_ativos = Contrato.query.filter(Contrato.validade >= date.today()).count()
-
-    aulas_hoje = Aula.query.filter(
-        func.date(Aula.data_hora) == datetime.today().date()
-    ).count()
-
-# Contratos vencendo nos próximos 30 dias
-    data_limite = date.today() + timedelta(days=30)
-    contratos_vencendo = Contrato.query.filter(
-        and_(Contrato.validade <= data_limite, Contrato.validade >= date.today())
-    ).count()
-
-    return render_template('admin/dashboard.html',
-                         total_alunos=total_alunos,
-                         total_professores=total_professores,
-                         total_responsaveis=total_responsaveis,
-                         total_contratos=total_contratos,
-                         contratos_ativos=contratos_ativos,
-                         contratos_vencendo=contratos_vencendo,
-                         aulas_hoje=aulas_hoje)
+    atualizar_status_se_necessario()
+    return render_template('admin/dashboard.html', **estatisticas_admin(date.today()))
+
+@cacheado(dependencias=('aluno', 'professor', 'responsavel', 'contrato', 'aula', 'resumo_mensal'))
+def estatisticas_admin(hoje):
+    """Contadores e tendência do dashboard administrativo (em cache entre alterações)"""
+    estatisticas_contrato = estatisticas_contratos()
+    return {
+        'total_alunos': Aluno.query.count(),
+        'total_professores': Professor.query.count(),
+        'total_responsaveis': Responsavel.query.count(),
+        'total_contratos': estatisticas_contrato['total_contratos'],
+        'contratos_ativos': estatisticas_contrato['contratos_em_vigor'],
+        'contratos_vencendo': estatisticas_contrato['contratos_vencendo'],
+        'aulas_hoje': Aula.query.filter(periodo_do_dia(Aula.data_hora, hoje)).count(),
+        # Tendência dos últimos anos lida do consolidado mensal
+        'tendencia': [linha._asdict() for linha in tendencia_mensal(meses=36)]
+    }
+
+@main_bp.route('/admin/perf', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def admin_perf():
+    """Tempos e consultas SQL por endpoint (amostras recentes deste processo)"""
+    if request.method == 'POST':
+        desempenho.limpar()
+        flash('Amostras de desempenho zeradas.', 'success')
+        return redirect(url_for('main.admin_perf'))
+    return render_template('admin/perf.html', endpoints=desempenho.resumo_por_endpoint(),
+                           tarefas=agendador.resumo(), agendador_ativo=agendador.ativo_neste_processo)
 
 @main_bp.route('/aluno/dashboard')
 @login_required
@@ -247,11 +282,7 @@ def aluno_dashboard():
         Aula.data_hora >= datetime.now()
     ).order_by(Aula.data_hora).limit(5).all()
     
-    # Busca notificações não lidas
-    notificacoes = Notificacao.query.filter_by(
-        usuario_id=current_user.id,
-        lida=False
-    ).order_by(Notificacao.data_criacao.desc()).limit(5).all()
+    notificacoes = notificacoes_nao_lidas_recentes()
 
     # Busca contratos do aluno
     contratos = Contrato.query.join(Contrato.alunos).filter(Aluno.id == aluno.id).all()
@@ -276,11 +307,7 @@ def professor_dashboard():
         Aula.data_hora >= datetime.now()
     ).order_by(Aula.data_hora).limit(5).all()
 
-    # Busca notificações não lidas
-    notificacoes = Notificacao.query.filter_by(
-        usuario_id=current_user.id,
-        lida=False
-    ).order_by(Notificacao.data_criacao.desc()).limit(5).all()
+    notificacoes = notificacoes_nao_lidas_recentes()
 
     return render_template('professor/dashboard.html',
                          professor=professor,
@@ -294,6 +321,7 @@ def responsavel_dashboard():
     if current_user.role != 'responsavel' or not current_user.responsavel:
         abort(403)
 
+    atualizar_status_se_necessario()
     responsavel = current_user.responsavel
     alunos = responsavel.alunos
     contratos = responsavel.contratos
@@ -312,8 +340,9 @@ def responsavel_dashboard():
     proximas_aulas = proximas_aulas[:10]  # Limitar a 10 aulas
     
     # Contratos próximos ao vencimento
-    data_limite = date.today() + timedelta(days=30)
-    contratos_vencendo = [c for c in contratos if c.validade <= data_limite and c.validade >= date.today()]
+    contratos_vencendo = contratos.filter(
+        Contrato.faixa_vencimento == Contrato.FAIXA_30_DIAS
+    ).order_by(Contrato.validade).all()
 
     return render_template('responsavel/dashboard.html',
                          responsavel=responsavel,
@@ -443,16 +472,18 @@ def editar_responsavel(id):
 @login_required
 def lista_contratos():
     """Lista todos os contratos"""
+    atualizar_status_se_necessario()
+    consulta = Contrato.query.options(*perfil_carregamento('lista_contratos'))
     if current_user.role == 'responsavel':
-        contratos = current_user.responsavel.contratos
+        consulta = consulta.filter(Contrato.responsavel_id == current_user.responsavel.id)
     elif current_user.role == 'aluno':
-        contratos = Contrato.query.join(Contrato.alunos).filter(Aluno.id == current_user.aluno.id).all()
-    else:
-        contratos = Contrato.query.all()
+        consulta = consulta.join(Contrato.alunos).filter(ContratoAluno.aluno_id == current_user.aluno.id)
+    contratos = consulta.all()
     
-    # Verificar contratos próximos ao vencimento (30 dias)
-    data_limite = date.today() + timedelta(days=30)
-    contratos_vencendo = [c for c in contratos if c.validade <= data_limite and c.validade >= date.today()]
+    # Contratos próximos ao vencimento (30 dias)
+    contratos_vencendo = consulta.filter(
+        Contrato.faixa_vencimento == Contrato.FAIXA_30_DIAS
+    ).order_by(Contrato.validade).all()
     
     return render_template('contratos/lista.html', 
                          contratos=contratos, contratos_vencendo=contratos_vencendo)
@@ -493,7 +524,7 @@ def novo_contrato():
             
             # Gerar o contrato automaticamente preenchido
             arquivo_contrato = gerar_contrato_automatico(contrato.id)
-            contrato.arquivo = arquivo_contrato
+            contrato.arquivo = arquivar_contrato(contrato.id, arquivo_contrato)
             db.session.commit()
             
             flash('Contrato criado com sucesso!', 'success')
@@ -577,26 +608,56 @@ def download_contrato(id):
     if not contrato.arquivo or not os.path.exists(contrato.arquivo):
         # Gerar o contrato se não existir
         arquivo_contrato = gerar_contrato_automatico(id)
-        contrato.arquivo = arquivo_contrato
+        contrato.arquivo = arquivar_contrato(contrato.id, arquivo_contrato)
         db.session.commit()
+    else:
+        # Gravado dentro do cache antes do arquivamento: tira do alcance da remoção LRU
+        arquivo = arquivar_contrato(contrato.id, contrato.arquivo)
+        if arquivo != contrato.arquivo:
+            contrato.arquivo = arquivo
+            db.session.commit()
     
     return send_file(contrato.arquivo, as_attachment=True, 
                     download_name=f'contrato_{contrato.id}.pdf')
 
 # ========== FUNÇÃO PARA GERAR CONTRATO AUTOMATICAMENTE ==========
+VERSAO_MODELO_CONTRATO = 1  # incrementar ao alterar o modelo abaixo (invalida o cache de PDFs)
+
+def dados_cache_contrato(contrato, data_emissao):
+    """Dados do contrato que influenciam o PDF gerado (chave do cache)"""
+    responsavel = contrato.responsavel
+    return {
+        'responsavel': [responsavel.nome, responsavel.estado_civil, responsavel.rg, responsavel.cpf,
+                        responsavel.email, responsavel.telefone, responsavel.endereco,
+                        responsavel.nacionalidade],
+        'alunos': [associacao.aluno.nome for associacao in contrato.alunos],
+        'tipo_plano': contrato.tipo_plano,
+        'data_inicio': contrato.data_inicio,
+        'validade': contrato.validade,
+        'valor_total': contrato.valor_total,
+        'servicos_incluidos': contrato.servicos_incluidos,
+        'data_emissao': data_emissao
+    }
+
 def gerar_contrato_automatico(contrato_id):
-    """Gera um contrato PDF automaticamente preenchido"""
+    """Gera um contrato PDF automaticamente preenchido (reaproveitando o cache quando possível)"""
     contrato = Contrato.query.get_or_404(contrato_id)
-    responsavel = contrato.responsavel
-    alunos = contrato.alunos
+    # Data do próprio contrato: o mesmo contrato gera sempre o mesmo PDF (e a mesma chave de cache)
+    data_emissao = contrato.data_emissao
     
-    # Criar arquivo temporário
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-    temp_path = temp_file.name
-    temp_file.close()
+    chave = chave_conteudo('contrato_resumido', VERSAO_MODELO_CONTRATO,
+                           dados_cache_contrato(contrato, data_emissao))
+    return cache_pdf().obter_ou_gerar(
+        chave, lambda caminho: renderizar_contrato_automatico(contrato, data_emissao, caminho)
+    )
+
+def renderizar_contrato_automatico(contrato, data_emissao, caminho):
+    """Desenha o PDF do contrato no caminho informado"""
+    responsavel = contrato.responsavel
+    alunos = [associacao.aluno for associacao in contrato.alunos]
     
     # Criar o PDF
-    doc = SimpleDocTemplate(temp_path, pagesize=letter)
+    doc = SimpleDocTemplate(caminho, pagesize=letter)
     styles = getSampleStyleSheet()
     story = []
 
@@ -662,7 +723,7 @@ def gerar_contrato_automatico(contrato_id):
     # Assinaturas
     story.append(Spacer(1, 24))
     assinaturas_text = f"""
-    Data: {date.today().strftime('%d/%m/%Y')}<br/><br/>
+    Data: {data_emissao.strftime('%d/%m/%Y')}<br/><br/>
     
     _________________________________<br/>
     IMPETUS INSTITUTO DE EDUCAÇÃO<br/>
@@ -676,15 +737,7 @@ def gerar_contrato_automatico(contrato_id):
     
     # Gerar o PDF
     doc.build(story)
-    
-    # Mover para o diretório de contratos
-    contratos_dir = os.path.join(current_app.root_path, 'static', 'contratos')
-    os.makedirs(contratos_dir, exist_ok=True)
-    
-    final_path = os.path.join(contratos_dir, f'contrato_{contrato_id}.pdf')
-    os.rename(temp_path, final_path)
-    
-    return final_path
+    return caminho
 
 def obter_clausulas_contrato(tipo_plano):
     """Retorna as cláusulas específicas para cada tipo de plano"""
@@ -725,14 +778,9 @@ def listar_alunos():
 
         query = Aluno.query
 
-        if search:
-            query = query.filter(
-                or_(
-                    Aluno.nome.ilike(f'%{search}%'),
-                    Aluno.cpf.ilike(f'%{search}%'),
-                    Aluno.telefone.ilike(f'%{search}%')
-                )
-            )
+        correspondentes = ids_correspondentes('aluno', search)
+        if correspondentes is not None:
+            query = query.filter(Aluno.id.in_(correspondentes))
 
         # Ordenação
         if sort == 'nome':
@@ -922,13 +970,12 @@ def relatorio_contratos():
     data_fim = request.args.get('data_fim')
     status = request.args.get('status', 'todos')
     
-    query = Contrato.query
-    
-    if data_inicio:
-        query = query.filter(Contrato.data_inicio >= datetime.strptime(data_inicio, '%Y-%m-%d').date())
-    
-    if data_fim:
-        query = query.filter(Contrato.data_inicio <= datetime.strptime(data_fim, '%Y-%m-%d').date())
+    # data_fim é inclusiva: o intervalo vai até o início do dia seguinte
+    query = Contrato.query.options(*perfil_carregamento('relatorio_contratos')).filter(periodo_entre(
+        Contrato.data_inicio,
+        datetime.strptime(data_inicio, '%Y-%m-%d').date() if data_inicio else None,
+        datetime.strptime(data_fim, '%Y-%m-%d').date() + timedelta(days=1) if data_fim else None
+    ))
     
     if status == 'ativos':
         query = query.filter(Contrato.validade >= date.today())
@@ -1030,14 +1077,9 @@ def listar_professores():
 
         query = Professor.query
 
-        if search:
-            query = query.filter(
-                or_(
-                    Professor.nome.ilike(f'%{search}%'),
-                    Professor.cpf.ilike(f'%{search}%'),
-                    Professor.disciplina.ilike(f'%{search}%')
-                )
-            )
+        correspondentes = ids_correspondentes('professor', search)
+        if correspondentes is not None:
+            query = query.filter(Professor.id.in_(correspondentes))
         
         if disciplina:
             query = query.filter(Professor.disciplina.ilike(f'%{disciplina}%'))
@@ -1161,7 +1203,7 @@ def cadastrar_professor():
                 flash('Este e-mail já está cadastrado', 'error')
                 return redirect(url_for('main.cadastrar_professor'))
 
-            if Professor.query.filter_by(cpf=request.form['cpf']).first():
+            if not Professor.validate_cpf(request.form['cpf']):
                 flash('Este CPF já está cadastrado', 'error')
                 return redirect(url_for('main.cadastrar_professor'))
 
@@ -1259,12 +1301,8 @@ def agenda():
     else:
         aulas_query = Aula.query
     
-    start_date = datetime(year, month, 1)
-    end_date = datetime(year, month + 1, 1) if month < 12 else datetime(year + 1, 1, 1)
-    
     aulas = aulas_query.filter(
-        Aula.data_hora >= start_date,
-        Aula.data_hora < end_date
+        periodo_do_mes(Aula.data_hora, year, month)
     ).order_by(Aula.data_hora).all()
     
     proximas_aulas = aulas_query.filter(
@@ -1309,70 +1347,71 @@ def novo_agendamento():
                         'data_fim': datetime.strptime(fim, '%Y-%m-%d')
                     })
         
-        # Verificar conflitos antes de criar
+        if duracao <= 0 or duracao > DURACAO_MAXIMA_AULA_MINUTOS:
+            raise ValueError(f"A duração deve estar entre 1 e {DURACAO_MAXIMA_AULA_MINUTOS} minutos")
+
+        # Expandir todas as ocorrências (a primeira é sempre o horário escolhido)
         data_base = datetime.strptime(data_hora, '%Y-%m-%dT%H:%M')
-        data_fim = data_base + timedelta(minutes=duracao)
+        ocorrencias = [data_base]
+        if recorrencias:
+            ocorrencias = sorted(set(ocorrencias) | set(expandir_recorrencias(data_base, recorrencias)))
         
-        conflitos = verificar_conflitos_horario(professor_id, aluno_id, data_base, data_fim)
+        # Verificar conflitos de todas as ocorrências com uma única consulta
+        horarios = [(inicio, Aula.calcular_data_hora_fim(inicio, duracao)) for inicio in ocorrencias]
+        conflitos = verificar_conflitos_lote(professor_id, aluno_id, horarios)
         if conflitos:
-            raise ValueError(f"Conflito de horário: {conflitos[0].data_hora.strftime('%d/%m/%Y %H:%M')}")
+            inicio_conflito, _, aulas_conflito = conflitos[0]
+            raise ValueError(
+                f"Conflito de horário em {len(conflitos)} ocorrência(s), a primeira em "
+                f"{inicio_conflito.strftime('%d/%m/%Y %H:%M')} "
+                f"(aula às {aulas_conflito[0].data_hora.strftime('%H:%M')})"
+            )
         
-        # Tratar tipo de aula
-        if tipo_aula == 'individual':
-            aluno_id = int(aluno_id) if aluno_id else None
-            grupo_id = None
-        else:
-            grupo_id = int(request.form.get('grupo_id')) if request.form.get('grupo_id') else None
-            aluno_id = None
+        # Aluno da aula (vazio em aulas de grupo sem aluno selecionado)
+        aluno_id = int(aluno_id) if aluno_id else None
         
-        # Tratar local
+        # Tratar local (o modelo não tem coluna própria para o link)
         link_aula = request.form.get('linkAula') if local == 'online' else None
+        if link_aula:
+            observacoes = f"Link: {link_aula}\n{observacoes}".strip()
         
-        # Criar agendamentos
-        if not recorrencias:
-            # Cria apenas um agendamento se não houver recorrência
-            aula = Aula(
-                data_hora=data_base,
-                duracao=duracao,
-                professor_id=professor_id,
-                aluno_id=aluno_id,
-                grupo_id=grupo_id,
-                materia_id=materia_id,
-                local=local,
-                link_aula=link_aula,
-                observacoes=observacoes,
-                criado_por=current_user.id
+        dados_aula = {
+            'duracao': duracao,
+            'professor_id': professor_id,
+            'aluno_id': aluno_id,
+            'materia_id': materia_id,
+            'local': local,
+            'tipo_aula': tipo_aula,
+            'observacoes': observacoes
+        }
+        if recorrencias:
+            tipos = {rec['tipo'] for rec in recorrencias}
+            dados_aula.update(
+                recorrente=True,
+                frequencia=2 if tipos == {'quinzenal'} else 1,
+                dias_semana=','.join(sorted({str(rec['dia_semana']) for rec in recorrencias})),
+                data_fim=max(rec['data_fim'] for rec in recorrencias)
             )
-            db.session.add(aula)
-        else:
-            for rec in recorrencias:
-                data_atual = data_base
-                while data_atual <= rec['data_fim']:
-                    # Verifica se o dia da semana corresponde (para recorrência semanal)
-                    if rec['tipo'] == 'semanal' and data_atual.weekday() != rec['dia_semana']:
-                        data_atual += timedelta(days=1)
-                        continue
-                    
-                    aula = Aula(
-                        data_hora=data_atual,
-                        duracao=duracao,
-                        professor_id=professor_id,
-                        aluno_id=aluno_id,
-                        grupo_id=grupo_id,
-                        materia_id=materia_id,
-                        local=local,
-                        link_aula=link_aula,
-                        observacoes=observacoes,
-                        criado_por=current_user.id,
-                        recorrencia=rec
-                    )
-                    db.session.add(aula)
-                    
-                    # Avança para a próxima data
-                    if rec['tipo'] == 'semanal':
-                        data_atual += timedelta(weeks=1)
-                    elif rec['tipo'] == 'mensal':
-                        data_atual = data_atual + relativedelta(months=1)
+        
+        # A primeira ocorrência é a aula principal; as demais são inseridas em lote
+        aula = Aula(data_hora=data_base, **dados_aula)
+        db.session.add(aula)
+        db.session.flush()
+        
+        demais = [inicio for inicio in ocorrencias if inicio != data_base]
+        if demais:
+            db.session.execute(db.insert(Aula), [
+                dict(
+                    dados_aula,
+                    data_hora=inicio,
+                    data_hora_fim=Aula.calcular_data_hora_fim(inicio, duracao),
+                    aula_principal_id=aula.id
+                )
+                for inicio in demais
+            ])
+            
+            # Inserções em lote não passam pelos eventos da sessão
+            atualizar_particoes({particao_da_aula(inicio, professor_id) for inicio in demais})
         
         db.session.commit()
         
@@ -1435,19 +1474,16 @@ def api_aulas():
     if current_user.role == 'aluno':
         aulas = Aula.query.filter(
             Aula.aluno_id == current_user.aluno.id,
-            Aula.data_hora >= start_date,
-            Aula.data_hora <= end_date
+            periodo_entre(Aula.data_hora, start_date, end_date)
         ).all()
     elif current_user.role == 'professor':
         aulas = Aula.query.filter(
             Aula.professor_id == current_user.professor.id,
-            Aula.data_hora >= start_date,
-            Aula.data_hora <= end_date
+            periodo_entre(Aula.data_hora, start_date, end_date)
         ).all()
     else:
         aulas = Aula.query.filter(
-            Aula.data_hora >= start_date,
-            Aula.data_hora <= end_date
+            periodo_entre(Aula.data_hora, start_date, end_date)
         ).all()
     
     eventos = []
@@ -1471,183 +1507,20 @@ def relatorio_mensal():
     ano = request.args.get('ano', type=int, default=now.year)
     mes = request.args.get('mes', type=int, default=now.month)
     
-    # Consulta básica para filtrar por mês/ano
-    aulas_query = Aula.query.filter(
-        extract('year', Aula.data_hora) == ano,
-        extract('month', Aula.data_hora) == mes
-    )
-    
-    # Totais gerais
-    total_aulas = aulas_query.count()
-    alunos_ativos = aulas_query.distinct(Aula.aluno_id).count()
-    professores_ativos = aulas_query.distinct(Aula.professor_id).count()
-    
-    # Horas ministradas (soma da duração em minutos convertida para horas)
-    horas_ministradas = aulas_query.with_entities(
-        func.sum(Aula.duracao).label('total_minutos')
-    ).first().total_minutos or 0
-    horas_ministradas = round(horas_ministradas / 60, 1)
-    
-    # Cálculos financeiros
-    faturamento_total = aulas_query.with_entities(
-        func.sum(Aula.valor_aula).label('total_valor')
-    ).first().total_valor or 0
-    
-    custo_professores = aulas_query.with_entities(
-        func.sum(Aula.custo_aula).label('total_custo')
-    ).first().total_custo or 0
-    
-    deslocamento_total = aulas_query.with_entities(
-        func.sum(func.coalesce(Aula.deslocamento, 0)).label('total_deslocamento')
-    ).first().total_deslocamento or 0
-    
-    lucro_liquido = faturamento_total - custo_professores - deslocamento_total
+    # Todos os totais e detalhamentos saem de uma única consulta do mês
+    relatorio = gerar_relatorio_mensal(ano, mes)
     custos_fixos = 1780.00
     
-    # Aulas por professor
-    aulas_por_professor = db.session.query(
-        Professor.nome,
-        func.count(Aula.id).label('total_aulas'),
-        func.sum(Aula.duracao).label('total_minutos'),
-        func.sum(Aula.valor_aula).label('valor_gerado'),
-        func.count(distinct(Aula.aluno_id)).label('total_alunos')
-    ).join(Aula, Aula.professor_id == Professor.id)\
-     .filter(
-        extract('year', Aula.data_hora) == ano,
-        extract('month', Aula.data_hora) == mes
-     ).group_by(Professor.nome).all()
-
-    
-    # Adicionando horas formatadas e alunos atendidos
-    aulas_por_professor = [{
-        'nome': prof.nome,
-        'total_aulas': prof.total_aulas,
-        'horas_ministradas': round(prof.total_minutos / 60, 1),
-        'valor_gerado': prof.valor_gerado or 0,
-        'valor_hora': prof.valor_hora or 0,
-        'custo_total': (prof.total_minutos / 60) * (prof.valor_hora or 0),
-        'alunos_atendidos': get_alunos_por_professor(prof.nome, mes, ano)
-    } for prof in aulas_por_professor]
-    
-    # Aulas por aluno
-    aulas_por_aluno = db.session.query(
-        Aluno.nome,
-        Aluno.plano_adquirido,
-        func.count(Aula.id).label('total_aulas'),
-        func.sum(Aula.duracao).label('total_minutos'),
-        func.count(distinct(Aula.professor_id)).label('total_professores')
-    ).join(Aula, Aula.aluno_id == Aluno.id)\
-     .filter(
-        extract('year', Aula.data_hora) == ano,
-        extract('month', Aula.data_hora) == mes
-     ).group_by(Aluno.nome, Aluno.plano_adquirido).all()
-    
-    # Adicionando horas formatadas e professores
-    aulas_por_aluno = [{
-        'nome': aluno.nome,
-        'plano_adquirido': aluno.plano_adquirido,
-        'total_aulas': aluno.total_aulas,
-        'horas_recebidas': round(aluno.total_minutos / 60, 1),
-        'professores': get_professores_por_aluno(aluno.nome, mes, ano)
-    } for aluno in aulas_por_aluno]
-    
-    # Relação aluno-professor detalhada
-    relacoes_aluno_professor = db.session.query(
-        Aluno.nome.label('aluno_nome'),
-        Professor.nome.label('professor_nome'),
-        func.count(Aula.id).label('total_aulas'),
-        func.sum(Aula.duracao).label('total_minutos'),
-        func.sum(Aula.valor_aula).label('valor_total')
-    ).join(Aula, Aula.aluno_id == Aluno.id)\
-     .join(Professor, Aula.professor_id == Professor.id)\
-     .filter(
-        extract('year', Aula.data_hora) == ano,
-        extract('month', Aula.data_hora) == mes
-     ).group_by(Aluno.nome, Professor.nome).all()
-    
-    # Alunos por plano
-    alunos_por_plano = db.session.query(
-        Aluno.plano_adquirido,
-        func.count(distinct(Aluno.id)).label('total'),
-        (func.count(distinct(Aluno.id)) * 100.0 / alunos_ativos).label('percentual')
-    ).join(Aula, Aula.aluno_id == Aluno.id)\
-     .filter(
-        extract('year', Aula.data_hora) == ano,
-        extract('month', Aula.data_hora) == mes
-     ).group_by(Aluno.plano_adquirido).all()
-    
-    # Aulas por local
-    aulas_por_local = db.session.query(
-        Aula.local,
-        func.count(Aula.id).label('total'),
-        (func.count(Aula.id) * 100.0 / total_aulas).label('percentual')
-    ).filter(
-        extract('year', Aula.data_hora) == ano,
-        extract('month', Aula.data_hora) == mes
-    ).group_by(Aula.local).all()
-    
-    # Aulas por tipo
-    aulas_por_tipo = db.session.query(
-        Aula.tipo_aula,
-        func.count(Aula.id).label('total'),
-        (func.count(Aula.id) * 100.0 / total_aulas).label('percentual')
-    ).filter(
-        extract('year', Aula.data_hora) == ano,
-        extract('month', Aula.data_hora) == mes
-    ).group_by(Aula.tipo_aula).all()
-    
     # Lista de meses para o dropdown
     meses = [(i, calendar.month_name[i]) for i in range(1, 13)]
-
     
     return render_template('relatorios/mensal.html',
         mes=mes,
         ano=ano,
         meses=meses,
         ano_atual=now.year,
-        total_aulas=total_aulas,
-        alunos_ativos=alunos_ativos,
-        professores_ativos=professores_ativos,
-        horas_ministradas=horas_ministradas,
-        faturamento_total=faturamento_total,
-        custo_professores=custo_professores,
         custos_fixos=custos_fixos,
-        aulas_por_professor=aulas_por_professor,
-        aulas_por_aluno=aulas_por_aluno,
-        relacoes_aluno_professor=relacoes_aluno_professor,
-        alunos_por_plano=alunos_por_plano,
-        aulas_por_local=aulas_por_local,
-        aulas_por_tipo=aulas_por_tipo)
-
-def get_alunos_por_professor(professor_nome, mes, ano):
-    """Retorna lista de alunos atendidos por um professor específico"""
-    alunos = db.session.query(
-        Aluno.nome,
-        func.count(Aula.id).label('total_aulas')
-    ).join(Aula, Aula.aluno_id == Aluno.id)\
-     .join(Professor, Aula.professor_id == Professor.id)\
-     .filter(
-        Professor.nome == professor_nome,
-        extract('year', Aula.data_hora) == ano,
-        extract('month', Aula.data_hora) == mes
-     ).group_by(Aluno.nome).all()
-    
-    return [{'nome': a.nome, 'total_aulas': a.total_aulas} for a in alunos]
-
-def get_professores_por_aluno(aluno_nome, mes, ano):
-    """Retorna lista de professores que atenderam um aluno específico"""
-    professores = db.session.query(
-        Professor.nome,
-        func.count(Aula.id).label('total_aulas')
-    ).join(Aula, Aula.professor_id == Professor.id)\
-     .join(Aluno, Aula.aluno_id == Aluno.id)\
-     .filter(
-        Aluno.nome == aluno_nome,
-        extract('year', Aula.data_hora) == ano,
-        extract('month', Aula.data_hora) == mes
-     ).group_by(Professor.nome).all()
-    
-    return [{'nome': p.nome, 'total_aulas': p.total_aulas} for p in professores]
+        **relatorio)
 
 # ========== ROTAS PARA Relatório Personalizado ==========
 @main_bp.route('/relatorios/aluno/<int:aluno_id>/pdf')
@@ -1664,88 +1537,24 @@ def relatorio_aluno_pdf(aluno_id):
         if not Aula.query.filter_by(professor_id=current_user.professor.id, aluno_id=aluno_id).first():
             abort(403)
     
-    # Filtros
+    # Filtros (intervalo semiaberto: o dia final é incluído por inteiro)
     data_inicio = request.args.get('data_inicio')
     data_fim = request.args.get('data_fim')
-    
-    query = Aula.query.filter(
-        Aula.aluno_id == aluno_id,
-        Aula.realizada.is_(True)
-    )
-    
-    if data_inicio:
-        query = query.filter(Aula.data_hora >= datetime.strptime(data_inicio, '%Y-%m-%d'))
-    if data_fim:
-        # Adiciona 23:59:59 ao final do dia
-        data_fim = datetime.strptime(data_fim, '%Y-%m-%d') + timedelta(days=1) - timedelta(seconds=1)
-        query = query.filter(Aula.data_hora <= data_fim)
-    
-    aulas = query.order_by(Aula.data_hora).all()
-    
-    # Cálculos
-    total_aulas = len(aulas)
-    total_horas = sum(aula.duracao for aula in aulas) / 60
-    total_devido = sum(aula.valor_aula for aula in aulas)
-    
-    # Caminho para o logo (ajuste conforme sua estrutura)
-    logo_path = os.path.join(current_app.root_path, 'static', 'img', 'Logo_Impetus-preto.png')
-    if not os.path.exists(logo_path):
-        logo_path = None  # Ou use um logo padrão
-    
-    # Renderizar HTML
-    html = render_template('relatorios/aluno_pdf.html',
-        aluno=aluno,
-        aulas=aulas,
-        total_aulas=total_aulas,
-        total_horas=total_horas,
-        total_devido=total_devido,
-        logo_path=logo_path,
-        data_emissao=now.strftime('%d/%m/%Y'),
-        current_user=current_user
-    )
-    
-    # Gerar PDF
-    pdf = HTML(string=html).write_pdf()
-    
-    # Criar resposta
-    buffer = BytesIO(pdf)
-    return send_file(
-        buffer,
-        mimetype='application/pdf',
-        as_attachment=True,
-        download_name=f'relatorio_{aluno.nome}_{now.strftime("%Y%m%d")}.pdf'
-    )
-
-# --- FUNÇÕES AUXILIARES PARA RELATÓRIOS ---
-def get_alunos_por_professor(professor_nome, mes, ano):
-    """Retorna lista de alunos atendidos por um professor específico"""
-    alunos = db.session.query(
-        Aluno.nome,
-        func.count(Aula.id).label('total_aulas')
-    ).join(Aula, Aula.aluno_id == Aluno.id)\
-     .join(Professor, Aula.professor_id == Professor.id)\
-     .filter(
-        Professor.nome == professor_nome,
-        extract('year', Aula.data_hora) == ano,
-        extract('month', Aula.data_hora) == mes
-     ).group_by(Aluno.nome).all()
-    
-    return [{'nome': a.nome, 'total_aulas': a.total_aulas} for a in alunos]
-
-def get_professores_por_aluno(aluno_nome, mes, ano):
-    """Retorna lista de professores que atenderam um aluno específico"""
-    professores = db.session.query(
-        Professor.nome,
-        func.count(Aula.id).label('total_aulas')
-    ).join(Aula, Aula.professor_id == Professor.id)\
-     .join(Aluno, Aula.aluno_id == Aluno.id)\
-     .filter(
-        Aluno.nome == aluno_nome,
-        extract('year', Aula.data_hora) == ano,
-        extract('month', Aula.data_hora) == mes
-     ).group_by(Professor.nome).all()
-    
-    return [{'nome': p.nome, 'total_aulas': p.total_aulas} for p in professores]
+    inicio = datetime.strptime(data_inicio, '%Y-%m-%d') if data_inicio else None
+    fim = datetime.strptime(data_fim, '%Y-%m-%d') + timedelta(days=1) if data_fim else None
+    nome_arquivo = f'relatorio_{aluno.nome}_{now.strftime("%Y%m%d")}.pdf'
+    
+    # Meses encerrados vêm do extrato já gravado
+    mes_fechado = mes_fechado_do_periodo(inicio, fim)
+    if mes_fechado:
+        caminho = extrato_mensal(aluno, *mes_fechado)
+        return send_file(caminho, mimetype='application/pdf', as_attachment=True, download_name=nome_arquivo)
+    
+    aulas = consultar_aulas([aluno.id], inicio, fim)
+    buffer = renderizar_pdf(lambda saida: desenhar_extrato(
+        saida, aluno.nome, aulas, descrever_periodo(inicio, fim), now.date()
+    ))
+    return resposta_pdf(buffer, nome_arquivo)
 
 # ========== ROTAS PARA CONTRATOS ==========
 @main_bp.route('/contratos', methods=['GET'])
@@ -1788,8 +1597,9 @@ def contratos_vencimentos():
     dias_alerta = request.args.get('dias', 30, type=int)
     data_limite = date.today() + timedelta(days=dias_alerta)
     
+    consulta = Contrato.query.options(*perfil_carregamento('vencimentos'))
     if current_user.role == 'responsavel':
-        contratos_vencendo = Contrato.query.filter(
+        contratos_vencendo = consulta.filter(
             and_(
                 Contrato.responsavel_id == current_user.responsavel.id,
                 Contrato.validade <= data_limite, 
@@ -1797,7 +1607,7 @@ def contratos_vencimentos():
             )
         ).order_by(Contrato.validade).all()
     else:
-        contratos_vencendo = Contrato.query.filter(
+        contratos_vencendo = consulta.filter(
             and_(Contrato.validade <= data_limite, Contrato.validade >= date.today())
         ).order_by(Contrato.validade).all()
     
@@ -1812,9 +1622,9 @@ def alunos_com_contratos():
         abort(403)
         
     # Buscar alunos que estão associados a pelo menos um contrato
-    alunos_com_contrato = db.session.query(Aluno).join(
-        Contrato.alunos
-    ).distinct().all()
+    alunos_com_contrato = Aluno.query.filter(
+        Aluno.contratos.any()
+    ).options(*perfil_carregamento('alunos_com_contratos')).order_by(Aluno.nome).all()
     
     return render_template('alunos/com_contratos.html', alunos=alunos_com_contrato)
 
@@ -1825,44 +1635,15 @@ def dashboard_contratos():
     if current_user.role not in ['admin']:
         abort(403)
         
-    total_contratos = Contrato.query.count()
-    contratos_ativos = Contrato.query.filter(Contrato.validade >= date.today()).count()
-    contratos_vencidos = Contrato.query.filter(Contrato.validade < date.today()).count()
-    
-    # Contratos vencendo nos próximos 30 dias
-    data_limite = date.today() + timedelta(days=30)
-    contratos_vencendo = Contrato.query.filter(
-        and_(Contrato.validade <= data_limite, Contrato.validade >= date.today())
-    ).count()
-    
-    # Valor total dos contratos ativos
-    valor_total_ativo = db.session.query(db.func.sum(Contrato.valor_total)).filter(
-        Contrato.validade >= date.today()
-    ).scalar() or 0
-    
+    # Aqui "ativo" segue a validade (contratos ainda não vencidos, qualquer status)
+    dados = estatisticas_contratos()
     estatisticas = {
-        'total_contratos': total_contratos,
-        'contratos_ativos': contratos_ativos,
-        'contratos_vencidos': contratos_vencidos,
-        'contratos_vencendo': contratos_vencendo,
-        'valor_total_ativo': valor_total_ativo
-    }
-    
-    # Contratos por tipo de plano
-    contratos_por_plano = db.session.query(
-        Contrato.tipo_plano, 
-        db.func.count(Contrato.id)
-    ).filter(
-        Contrato.validade >= date.today()
-    ).group_by(Contrato.tipo_plano).all()
-    
-    estatisticas = {
-        'total_contratos': total_contratos,
-        'contratos_ativos': contratos_ativos,
-        'contratos_vencidos': contratos_vencidos,
-        'contratos_vencendo': contratos_vencendo,
-        'valor_total_ativo': valor_total_ativo,
-        'contratos_por_plano': contratos_por_plano
+        'total_contratos': dados['total_contratos'],
+        'contratos_ativos': dados['contratos_em_vigor'],
+        'contratos_vencidos': dados['contratos_validade_vencida'],
+        'contratos_vencendo': dados['contratos_vencendo'],
+        'valor_total_ativo': dados['valor_em_vigor'],
+        'contratos_por_plano': dados['por_plano_em_vigor']
     }
     
     return render_template('dashboard/contratos.html', estatisticas=estatisticas)
@@ -1891,6 +1672,23 @@ def api_alunos_responsavel(responsavel_id):
     alunos = [{'id': aluno.id, 'nome': aluno.nome} for aluno in responsavel.alunos]
     return jsonify(alunos)
 
+@api_bp.route('/autocompletar/<entidade>')
+@login_required
+def api_autocompletar(entidade):
+    """Sugestões (id e rótulo) para campos com autocompletar; responde 304 se nada mudou"""
+    if current_user.role not in ['admin', 'professor']:
+        abort(403)
+    if entidade not in ENTIDADES_AUTOCOMPLETAR:
+        abort(404)
+
+    termo = request.args.get('q', '').strip()
+    limite = request.args.get('limite', LIMITE_PADRAO, type=int)
+    resposta = jsonify(autocompletar.buscar(entidade, termo, limite))
+    # Revalidação pelo navegador: a mesma lista gera o mesmo ETag
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    resposta.add_etag()
+    return resposta.make_conditional(request)
+
 @api_bp.route('/contrato/<int:contrato_id>/status')
 @login_required
 def api_status_contrato(contrato_id):
@@ -1916,12 +1714,40 @@ def api_status_contrato(contrato_id):
 @main_bp.route('/notificacoes')
 @login_required
 def listar_notificacoes():
-    """Lista todas as notificações do usuário"""
-    notificacoes = Notificacao.query.filter_by(
-        usuario_id=current_user.id
-    ).order_by(Notificacao.data_criacao.desc()).all()
+    """Lista as notificações do usuário, uma página por vez (cursor em ?cursor=)"""
+    arquivadas = request.args.get('arquivadas') == '1'
+    try:
+        notificacoes, proximo_cursor = pagina_notificacoes(
+            current_user.id,
+            cursor=request.args.get('cursor'),
+            limite=request.args.get('limite', TAMANHO_PAGINA_NOTIFICACOES, type=int),
+            arquivadas=arquivadas
+        )
+    except ValueError:
+        abort(400)
     
-    return render_template('notificacoes/lista.html', notificacoes=notificacoes)
+    return render_template('notificacoes/lista.html',
+                         notificacoes=notificacoes,
+                         proximo_cursor=proximo_cursor,
+                         arquivadas=arquivadas)
+
+@main_bp.route('/eventos/stream')
+@login_required
+def eventos_stream():
+    """Canal de eventos em tempo real do usuário (Server-Sent Events)"""
+    if not current_app.config.get('EVENTOS_ATIVO', False):
+        abort(404)
+    
+    # O que foi perdido desde a última conexão é lido agora; o fluxo em si não usa o banco
+    ultimo_id = request.headers.get('Last-Event-ID', type=int)
+    pendentes = reenviar_eventos(current_user.id, ultimo_id) if ultimo_id else []
+    resposta = Response(
+        fluxo_eventos(current_user.id, pendentes, current_app.config.get('EVENTOS_DURACAO_MAXIMA', 300)),
+        mimetype='text/event-stream'
+    )
+    resposta.headers['Cache-Control'] = 'no-cache'
+    resposta.headers['X-Accel-Buffering'] = 'no'  # nginx não deve acumular o fluxo
+    return resposta
 
 @main_bp.route('/notificacao/<int:id>/marcar-lida')
 @login_required
@@ -1935,32 +1761,14 @@ def marcar_notificacao_lida(id):
     notificacao.lida = True
     db.session.commit()
     
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'nao_lidas': current_user.notificacoes_nao_lidas})
 
-# ========== FUNÇÃO PARA CRIAR NOTIFICAÇÕES AUTOMÁTICAS ==========
-def verificar_e_criar_notificacoes_vencimento():
-    """Verifica contratos próximos ao vencimento e cria notificações"""
-    data_limite = date.today() + timedelta(days=30)
-    contratos_vencendo = Contrato.query.filter(
-        and_(Contrato.validade <= data_limite, Contrato.validade >= date.today())
-    ).all()
-    
-    for contrato in contratos_vencendo:
-        dias_restantes = (contrato.validade - date.today()).days
-        
-        # Verificar se já existe notificação para este contrato
-        notificacao_existente = Notificacao.query.filter_by(
-            usuario_id=contrato.responsavel.user.id if contrato.responsavel.user else None,
-            titulo=f'Contrato próximo ao vencimento - {contrato.tipo_plano}'
-        ).first()
-        
-        if not notificacao_existente and contrato.responsavel.user:
-            criar_notificacao(
-                usuario_id=contrato.responsavel.user.id,
-                titulo=f'Contrato próximo ao vencimento - {contrato.tipo_plano}',
-                mensagem=f'Seu contrato {contrato.tipo_plano} vence em {dias_restantes} dias ({contrato.validade.strftime("%d/%m/%Y")}). Entre em contato para renovação.',
-                tipo='warning'
-            )
+@main_bp.route('/notificacoes/marcar-todas-lidas', methods=['POST'])
+@login_required
+def marcar_todas_notificacoes_lidas():
+    """Marca todas as notificações do usuário como lidas"""
+    marcadas = marcar_todas_lidas(current_user.id)
+    return jsonify({'success': True, 'marcadas': marcadas, 'nao_lidas': 0})
 
 @main_bp.route('/admin/verificar-vencimentos')
 @login_required
@@ -1968,8 +1776,8 @@ def verificar_e_criar_notificacoes_vencimento():
 def verificar_vencimentos():
     """Executa verificação manual de vencimentos e cria notificações"""
     try:
-        verificar_e_criar_notificacoes_vencimento()
-        flash('Verificação de vencimentos executada com sucesso!', 'success')
+        criadas = criar_notificacoes_vencimento()
+        flash(f'Verificação de vencimentos executada com sucesso! {criadas} notificação(ões) criada(s).', 'success')
     except Exception as e:
         flash(f'Erro ao verificar vencimentos: {str(e)}', 'error')
     
@@ -1983,48 +1791,27 @@ def busca_avancada():
     termo = request.args.get('q', '').strip()
     tipo = request.args.get('tipo', 'todos')
     
-    resultados = {
-        'alunos': [],
-        'responsaveis': [],
-        'contratos': [],
-        'professores': []
+    # Grupo da página -> entidade do índice de busca
+    grupos = {
+        'alunos': 'aluno',
+        'responsaveis': 'responsavel',
+        'contratos': 'contrato',
+        'professores': 'professor'
     }
+    resultados = {grupo: [] for grupo in grupos}
     
+    # Lista única, da maior para a menor relevância
+    ranking = []
     if termo:
-        if tipo in ['todos', 'alunos']:
-            resultados['alunos'] = Aluno.query.filter(
-                or_(
-                    Aluno.nome.ilike(f'%{termo}%'),
-                    Aluno.cpf.ilike(f'%{termo}%')
-                )
-            ).limit(10).all()
-        
-        if tipo in ['todos', 'responsaveis']:
-            resultados['responsaveis'] = Responsavel.query.filter(
-                or_(
-                    Responsavel.nome.ilike(f'%{termo}%'),
-                    Responsavel.cpf.ilike(f'%{termo}%')
-                )
-            ).limit(10).all()
-        
-        if tipo in ['todos', 'contratos']:
-            resultados['contratos'] = Contrato.query.join(Responsavel).filter(
-                or_(
-                    Responsavel.nome.ilike(f'%{termo}%'),
-                    Contrato.tipo_plano.ilike(f'%{termo}%')
-                )
-            ).limit(10).all()
-        
-        if tipo in ['todos', 'professores']:
-            resultados['professores'] = Professor.query.filter(
-                or_(
-                    Professor.nome.ilike(f'%{termo}%'),
-                    Professor.disciplina.ilike(f'%{termo}%')
-                )
-            ).limit(10).all()
+        entidades = list(grupos.values()) if tipo == 'todos' else [grupos[tipo]] if tipo in grupos else []
+        ranking = buscar(termo, entidades, limite=10)
+        grupo_da_entidade = {entidade: grupo for grupo, entidade in grupos.items()}
+        for resultado in ranking:
+            resultados[grupo_da_entidade[resultado.entidade]].append(resultado.objeto)
     
     return render_template('busca/resultados.html', 
                          resultados=resultados, 
+                         ranking=ranking,
                          termo=termo, 
                          tipo=tipo)
 
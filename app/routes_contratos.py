@@ -4,8 +4,7 @@ Integra todas as funcionalidades desenvolvidas
 """
 
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, send_file
-from datetime import datetime, date, timedelta
-from sqlalchemy import and_, or_
+from datetime import datetime
 import os
 import json
 
@@ -14,13 +13,12 @@ from app.models import (
     db, Contrato, Aluno, Professor, Responsavel, ContratoAluno
 )
 
-# Importar gerador de contratos - CORREÇÃO AQUI
-try:
-    from app.gerador_contratos import gerar_contrato_pdf
-except ImportError:
-    # Fallback caso o gerador não esteja disponível
-    def gerar_contrato_pdf(*args, **kwargs):
-        raise Exception("Gerador de contratos não disponível")
+# Fila de geração dos PDFs de contratos (o gerador roda nos workers da fila)
+from app.fila_pdf import fila_pdf, enfileirar_contrato, PRIORIDADE_RENOVACAO
+from app.status_contratos import atualizar_status_se_necessario
+from app.estatisticas_contratos import estatisticas_contratos
+from app.carregamento import perfil_carregamento
+from app.busca import ids_correspondentes
 
 # Criar blueprint para as rotas de contratos
 contratos_bp = Blueprint('contratos', __name__, url_prefix='/contratos')
@@ -28,42 +26,28 @@ contratos_bp = Blueprint('contratos', __name__, url_prefix='/contratos')
 @contratos_bp.route('/')
 def lista_contratos():
     """Página principal de listagem de contratos"""
-    contratos = Contrato.query.order_by(Contrato.data_upload.desc()).all()
+    contratos = Contrato.query.options(*perfil_carregamento('lista_contratos')).order_by(Contrato.data_upload.desc()).all()
     return render_template('contratos/lista.html', contratos=contratos)
 
 @contratos_bp.route('/vencimentos')
 def vencimentos():
     """Página de vencimentos de contratos"""
-    hoje = date.today()
+    atualizar_status_se_necessario()
     
-    # Contratos vencidos
-    contratos_vencidos = Contrato.query.filter(
-        Contrato.validade < hoje,
-        Contrato.status == 'ativo'
-    ).all()
+    # Totais por faixa de vencimento em uma única consulta
+    totais = dict(
+        db.session.query(Contrato.faixa_vencimento, db.func.count(Contrato.id))
+        .filter(Contrato.status.in_(['ativo', 'vencido']))
+        .group_by(Contrato.faixa_vencimento).all()
+    )
+    contratos_vencidos = totais.get(Contrato.FAIXA_VENCIDO, 0)
+    contratos_30_dias = totais.get(Contrato.FAIXA_30_DIAS, 0)
+    contratos_90_dias = contratos_30_dias + totais.get(Contrato.FAIXA_90_DIAS, 0)
     
-    # Contratos que vencem nos próximos 30 dias
-    data_30_dias = hoje + timedelta(days=30)
-    contratos_30_dias = Contrato.query.filter(
-        and_(
-            Contrato.validade >= hoje,
-            Contrato.validade <= data_30_dias,
-            Contrato.status == 'ativo'
-        )
-    ).all()
-    
-    # Contratos que vencem nos próximos 90 dias
-    data_90_dias = hoje + timedelta(days=90)
-    contratos_90_dias = Contrato.query.filter(
-        and_(
-            Contrato.validade >= hoje,
-            Contrato.validade <= data_90_dias,
-            Contrato.status == 'ativo'
-        )
-    ).all()
-    
-    # Todos os contratos ativos para a tabela
-    contratos = Contrato.query.filter(Contrato.status == 'ativo').order_by(Contrato.validade.asc()).all()
+    # Contratos em vigor ou vencidos sem renovação para a tabela
+    contratos = Contrato.query.options(*perfil_carregamento('vencimentos')).filter(
+        Contrato.status.in_(['ativo', 'vencido'])
+    ).order_by(Contrato.validade.asc()).all()
     
     # Calcular valor total
     valor_total = sum(contrato.valor_total for contrato in contratos)
@@ -157,20 +141,13 @@ def novo_contrato():
                 )
                 db.session.add(contrato_aluno)
             
-            # Gerar PDF do contrato
-            try:
-                caminho_pdf = gerar_contrato_pdf(
-                    responsavel, alunos, tipo_plano, valor_total,
-                    data_inicio, validade, observacoes
-                )
-                contrato.arquivo = caminho_pdf
-            except Exception as e:
-                print(f"Erro ao gerar PDF: {e}")
-                # Continuar mesmo se houver erro na geração do PDF
+            # O PDF é gerado em segundo plano pela fila
+            enfileirar_contrato(contrato)
             
             db.session.commit()
+            fila_pdf.notificar()
             
-            flash('Contrato criado com sucesso!', 'success')
+            flash('Contrato criado com sucesso! O PDF está sendo gerado.', 'success')
             return redirect(url_for('contratos.visualizar_contrato', contrato_id=contrato.id))
             
         except Exception as e:
@@ -185,10 +162,32 @@ def visualizar_contrato(contrato_id):
     
     if contrato.arquivo and os.path.exists(contrato.arquivo):
         return send_file(contrato.arquivo, as_attachment=False)
+    elif contrato.pdf_status == 'pendente':
+        flash('O PDF do contrato ainda está sendo gerado. Tente novamente em instantes.', 'info')
+        return redirect(url_for('contratos.lista_contratos'))
+    elif contrato.pdf_status == 'pronto':
+        # O arquivo saiu do cache de PDFs: gerar novamente em segundo plano
+        enfileirar_contrato(contrato)
+        db.session.commit()
+        fila_pdf.notificar()
+        flash('O PDF do contrato está sendo gerado novamente. Tente em instantes.', 'info')
+        return redirect(url_for('contratos.lista_contratos'))
     else:
         flash('Arquivo do contrato não encontrado.', 'error')
         return redirect(url_for('contratos.lista_contratos'))
 
+@contratos_bp.route('/<int:contrato_id>/pdf-status')
+def status_pdf_contrato(contrato_id):
+    """API consultada pela interface enquanto o PDF é gerado"""
+    contrato = Contrato.query.get_or_404(contrato_id)
+    
+    return jsonify({
+        'contrato_id': contrato.id,
+        'pdf_status': contrato.pdf_status,
+        'pronto': contrato.pdf_status == 'pronto',
+        'url': url_for('contratos.visualizar_contrato', contrato_id=contrato.id) if contrato.pdf_status == 'pronto' else None
+    })
+
 @contratos_bp.route('/<int:contrato_id>/editar', methods=['GET', 'POST'])
 def editar_contrato(contrato_id):
     """Editar contrato existente"""
@@ -261,25 +260,18 @@ def renovar_contrato():
         # Marcar contrato original como renovado
         contrato_original.status = 'renovado'
         
-        # Gerar PDF do novo contrato
-        try:
-            alunos = [ca.aluno for ca in contrato_original.alunos]
-            caminho_pdf = gerar_contrato_pdf(
-                contrato_original.responsavel, alunos, 
-                novo_contrato.tipo_plano, novo_contrato.valor_total,
-                novo_contrato.data_inicio, novo_contrato.validade, 
-                novo_contrato.observacoes
-            )
-            novo_contrato.arquivo = caminho_pdf
-        except Exception as e:
-            print(f"Erro ao gerar PDF: {e}")
+        # Gerar PDF do novo contrato em segundo plano (renovações têm prioridade menor)
+        enfileirar_contrato(novo_contrato, prioridade=PRIORIDADE_RENOVACAO)
         
         db.session.commit()
+        fila_pdf.notificar()
         
         return jsonify({
             'success': True,
             'message': 'Contrato renovado com sucesso!',
-            'novo_contrato_id': novo_contrato.id
+            'novo_contrato_id': novo_contrato.id,
+            'pdf_status': novo_contrato.pdf_status,
+            'pdf_status_url': url_for('contratos.status_pdf_contrato', contrato_id=novo_contrato.id)
         })
         
     except Exception as e:
@@ -361,14 +353,13 @@ def api_buscar_responsaveis():
         if len(termo) < 3:
             return jsonify([])
         
-        # Buscar por nome, CPF ou telefone
+        # Buscar por nome (índice de busca) ou pelo início do CPF/telefone
+        correspondentes = ids_correspondentes('responsavel', termo)
+        if correspondentes is None:
+            return jsonify([])
         responsaveis = Responsavel.query.filter(
-            or_(
-                Responsavel.nome.ilike(f'%{termo}%'),
-                Responsavel.cpf.ilike(f'%{termo}%'),
-                Responsavel.telefone.ilike(f'%{termo}%')
-            )
-        ).limit(10).all()
+            Responsavel.id.in_(correspondentes)
+        ).order_by(Responsavel.nome).limit(10).all()
         
         responsaveis_data = []
         for resp in responsaveis:
@@ -392,55 +383,15 @@ def api_buscar_responsaveis():
 @contratos_bp.route('/dashboard')
 def dashboard_contratos():
     """Dashboard de contratos"""
-    hoje = date.today()
-    
-    # Estatísticas gerais
-    total_contratos = Contrato.query.count()
-    contratos_ativos = Contrato.query.filter_by(status='ativo').count()
-    contratos_vencidos = Contrato.query.filter(
-        Contrato.validade < hoje,
-        Contrato.status == 'ativo'
-    ).count()
-    
-    # Contratos por tipo
-    contratos_por_tipo = db.session.query(
-        Contrato.tipo_plano,
-        db.func.count(Contrato.id).label('total')
-    ).filter_by(status='ativo').group_by(Contrato.tipo_plano).all()
-    
-    # Receita total
-    receita_total = db.session.query(
-        db.func.sum(Contrato.valor_total)
-    ).filter_by(status='ativo').scalar() or 0
-    
-    # Contratos por mês (últimos 12 meses)
-    contratos_por_mes = []
-    for i in range(12):
-        data_mes = hoje.replace(day=1) - timedelta(days=30*i)
-        inicio_mes = data_mes.replace(day=1)
-        fim_mes = (inicio_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        
-        total_mes = Contrato.query.filter(
-            and_(
-                Contrato.data_inicio >= inicio_mes,
-                Contrato.data_inicio <= fim_mes
-            )
-        ).count()
-        
-        contratos_por_mes.append({
-            'mes': inicio_mes.strftime('%m/%Y'),
-            'total': total_mes
-        })
-    
-    contratos_por_mes.reverse()
+    estatisticas = estatisticas_contratos()
     
     return render_template('contratos/dashboard_contratos.html',
-                         total_contratos=total_contratos,
-                         contratos_ativos=contratos_ativos,
-                         contratos_vencidos=contratos_vencidos,
-                         contratos_por_tipo=contratos_por_tipo,
-                         receita_total=receita_total,
-                         contratos_por_mes=contratos_por_mes)
+                         total_contratos=estatisticas['total_contratos'],
+                         contratos_ativos=estatisticas['contratos_ativos'],
+                         contratos_vencidos=estatisticas['contratos_vencidos'],
+                         contratos_por_tipo=estatisticas['por_plano_ativos'],
+                         receita_total=estatisticas['receita_ativa'],
+                         contratos_por_mes=estatisticas['contratos_por_mes'])
 
 # Função para registrar o blueprint na aplicação Flask
 def register_contratos_routes(app):
@@ -0,0 +1,70 @@
+"""
+Motor de status dos contratos
+Uma única instrução UPDATE recalcula faixa_vencimento de todos os contratos e
+passa para 'vencido' os ativos cuja validade já passou. Roda diariamente
+(tarefa status-contratos do agendador ou flask contratos atualizar-status) e, sem
+o agendador, na primeira consulta do dia de cada processo; as listagens filtram e contam direto por status/faixa no SQL.
+"""
+
+import threading
+from datetime import date, timedelta
+import click
+from flask import current_app
+from sqlalchemy import and_, case, or_, update
+
+from app.models import db, Contrato
+
+_trava = threading.Lock()
+_ultimo_dia_atualizado = None
+
+
+def expressao_faixa(hoje):
+    """CASE equivalente a Contrato.calcular_faixa para a data informada"""
+    return case(
+        (Contrato.validade < hoje, Contrato.FAIXA_VENCIDO),
+        *[
+            (Contrato.validade <= hoje + timedelta(days=limite), faixa)
+            for limite, faixa in Contrato.LIMITES_FAIXAS
+        ],
+        else_=Contrato.FAIXA_REGULAR
+    )
+
+
+def atualizar_status_contratos(hoje=None):
+    """Aplica as transições do dia em um único UPDATE. Retorna quantos contratos mudaram."""
+    hoje = hoje or date.today()
+    faixa = expressao_faixa(hoje)
+    expira = and_(Contrato.status == 'ativo', Contrato.validade < hoje)
+
+    resultado = db.session.execute(
+        update(Contrato)
+        .where(or_(expira, Contrato.faixa_vencimento.is_distinct_from(faixa)))
+        .values(
+            status=case((expira, 'vencido'), else_=Contrato.status),
+            faixa_vencimento=faixa
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return resultado.rowcount
+
+
+def atualizar_status_se_necessario():
+    """Executa a atualização do dia se este processo ainda não a fez"""
+    global _ultimo_dia_atualizado
+    hoje = date.today()
+    if _ultimo_dia_atualizado == hoje or current_app.config.get('AGENDADOR_ATIVO'):
+        return
+    with _trava:
+        if _ultimo_dia_atualizado != hoje:
+            atualizar_status_contratos(hoje)
+            _ultimo_dia_atualizado = hoje
+
+
+@click.command('atualizar-status')
+@click.option('--data', 'data_referencia', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Data de referência (AAAA-MM-DD, padrão: hoje)')
+def atualizar_status_command(data_referencia):
+    """Atualiza status e faixa de vencimento dos contratos (agendar diariamente)"""
+    alterados = atualizar_status_contratos(data_referencia.date() if data_referencia else None)
+    click.echo(f'{alterados} contrato(s) atualizado(s).')
@@ -1,4 +1,5 @@
 import os
+import re
 from datetime import datetime
 from werkzeug.security import generate_password_hash
 from itsdangerous import URLSafeTimedSerializer
@@ -10,6 +11,10 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def somente_digitos(valor):
+    """Remove pontuação e espaços de CPF/telefone ("123.456.789-00" -> "12345678900")"""
+    return re.sub(r'\D', '', valor or '')
+
 def validar_cpf(cpf):
     """Validação simples de CPF (implementação básica)"""
     # Implemente a validação real do CPF aqui
@@ -31,17 +36,7 @@ def enviar_email_confirmacao(email, confirm_url):
     # mail.send(msg)
 
 def verificar_conflitos_horario(professor_id, aluno_id, data_inicio, data_fim):
-    """Verifica conflitos de horário para agendamento"""
-    from app.models import Aula, db
-    
-    query = Aula.query.filter(
-        Aula.data_hora < data_fim,
-        Aula.data_hora + db.cast(Aula.duracao * 60, db.Interval) > data_inicio
-    )
-    
-    if professor_id:
-        query = query.filter(Aula.professor_id == professor_id)
-    if aluno_id:
-        query = query.filter(Aula.aluno_id == aluno_id)
-    
-    return query.all()
\ No newline at end of file
+    """Verifica conflitos de horário para agendamento (professor ou aluno ocupado)"""
+    from app.conflitos import consultar_aulas_no_periodo
+
+    return consultar_aulas_no_periodo(professor_id, aluno_id, data_inicio, data_fim)
@@ -19,6 +19,45 @@ class Config:
     SESSION_COOKIE_HTTPONLY = True  # Previne acesso via JavaScript
     SESSION_COOKIE_SAMESITE = 'Lax'  # Proteção contra CSRF
     
+    # Fila de geração de PDFs de contratos (0 desativa os workers em segundo plano)
+    PDF_FILA_WORKERS = int(os.environ.get('PDF_FILA_WORKERS', 2))
+    
+    # Cache de PDFs de contratos (arquivos <hash>.pdf, removidos por LRU acima do limite)
+    PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR') or os.path.join(BASE_DIR, 'static', 'contratos', 'cache')
+    PDF_CACHE_MAX_MB = int(os.environ.get('PDF_CACHE_MAX_MB', 200))
+    # Contratos emitidos (Contrato.arquivo): guardados fora do cache, nunca removidos por LRU
+    PDF_CONTRATOS_DIR = os.environ.get('PDF_CONTRATOS_DIR') or os.path.join(BASE_DIR, 'static', 'contratos')
+    
+    # Cache de dados dos dashboards: 'memoria' (LRU por processo) ou 'arquivos' (compartilhado entre workers)
+    CACHE_TIPO = os.environ.get('CACHE_TIPO', 'memoria')
+    CACHE_DIR = os.environ.get('CACHE_DIR') or os.path.join(BASE_DIR, 'instance', 'cache')
+    CACHE_MAX_ITENS = int(os.environ.get('CACHE_MAX_ITENS', 1024))
+    CACHE_TTL_PADRAO = int(os.environ.get('CACHE_TTL_PADRAO', 60))  # segundos
+
+    # Autocompletar: índice refeito após o TTL; com cache em memória, total/maior id conferidos a cada N segundos
+    AUTOCOMPLETAR_TTL = int(os.environ.get('AUTOCOMPLETAR_TTL', 300))
+    AUTOCOMPLETAR_VERIFICACAO = int(os.environ.get('AUTOCOMPLETAR_VERIFICACAO', 5))
+    
+    # Instrumentação das requisições (Server-Timing, log de lentidão e /admin/perf)
+    DESEMPENHO_ATIVO = os.environ.get('DESEMPENHO_ATIVO', '1') == '1'
+    DESEMPENHO_LOG = os.environ.get('DESEMPENHO_LOG') or os.path.join(BASE_DIR, 'logs', 'desempenho.log')
+    DESEMPENHO_CONSULTA_LENTA_MS = int(os.environ.get('DESEMPENHO_CONSULTA_LENTA_MS', 100))
+    DESEMPENHO_REQUISICAO_LENTA_MS = int(os.environ.get('DESEMPENHO_REQUISICAO_LENTA_MS', 1000))
+    DESEMPENHO_AMOSTRAS = 500  # requisições recentes mantidas por endpoint
+
+    # Agendador de tarefas de manutenção (app/agendador.py); a trava garante um único worker executando
+    AGENDADOR_ATIVO = os.environ.get('AGENDADOR_ATIVO', '0') == '1'
+    AGENDADOR_TRAVA = os.environ.get('AGENDADOR_TRAVA') or os.path.join(BASE_DIR, 'instance', 'agendador.lock')
+    AGENDADOR_INTERVALO = int(os.environ.get('AGENDADOR_INTERVALO', 30))  # segundos entre verificações
+
+    # Eventos em tempo real (/eventos/stream, app/eventos.py). Desligados por padrão: cada aba aberta
+    # ocupa um worker por até EVENTOS_DURACAO_MAXIMA; ligar só com workers com threads (gthread/gevent)
+    EVENTOS_ATIVO = os.environ.get('EVENTOS_ATIVO', '0') == '1'
+    EVENTOS_INTERVALO = float(os.environ.get('EVENTOS_INTERVALO', 1.0))  # leitura dos eventos de outros workers
+    EVENTOS_DURACAO_MAXIMA = int(os.environ.get('EVENTOS_DURACAO_MAXIMA', 300))  # segundos por conexão
+    EVENTOS_RETENCAO_MINUTOS = int(os.environ.get('EVENTOS_RETENCAO_MINUTOS', 60))
+    EVENTOS_LIMPEZA_SEGUNDOS = int(os.environ.get('EVENTOS_LIMPEZA_SEGUNDOS', 300))  # expirados apagados ao gravar
+    
     # Configurações Adicionais Recomendadas
     DEBUG = False  # Sempre False em produção
     TESTING = False
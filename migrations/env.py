@@ -25,6 +25,12 @@ fileConfig(config._config_file_path, disable_existing_loggers=False)
 # target_metadata = Base.metadata
 target_metadata = db.metadata
 
+# O índice FTS5 da busca (app.busca) e suas tabelas internas não são modelos
+def include_name(name, type_, parent_names):
+    if type_ == 'table':
+        return not name.startswith('busca_indice')
+    return True
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:s
 # my_important_option = config.get_main_option("my_important_option")
@@ -68,7 +74,8 @@ def run_migrations_online():
         with connectable.connect() as connection:
             context.configure(
                 connection=connection,
-                target_metadata=target_metadata
+                target_metadata=target_metadata,
+                include_name=include_name
             )
 
             with context.begin_transaction():
@@ -0,0 +1,55 @@
+"""Adiciona data_hora_fim e índices compostos em aula
+
+Revision ID: a1c3e5f7b9d1
+Revises: sqlite_fix_001, sqlite_fix_002
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from datetime import timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c3e5f7b9d1'
+down_revision = ('sqlite_fix_001', 'sqlite_fix_002')
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('aula', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('data_hora_fim', sa.DateTime(), nullable=True))
+
+    # Preencher data_hora_fim das aulas existentes (em Python para não depender
+    # da aritmética de datas de cada banco)
+    aula = sa.table(
+        'aula',
+        sa.column('id', sa.Integer),
+        sa.column('data_hora', sa.DateTime),
+        sa.column('duracao', sa.Integer),
+        sa.column('data_hora_fim', sa.DateTime)
+    )
+    conn = op.get_bind()
+    linhas = conn.execute(sa.select(aula.c.id, aula.c.data_hora, aula.c.duracao)).fetchall()
+    atualizacoes = [
+        {'aula_id': linha.id, 'fim': linha.data_hora + timedelta(minutes=linha.duracao or 0)}
+        for linha in linhas if linha.data_hora is not None
+    ]
+    if atualizacoes:
+        conn.execute(
+            aula.update().where(aula.c.id == sa.bindparam('aula_id')).values(data_hora_fim=sa.bindparam('fim')),
+            atualizacoes
+        )
+
+    with op.batch_alter_table('aula', schema=None) as batch_op:
+        batch_op.create_index('ix_aula_professor_data_hora', ['professor_id', 'data_hora'], unique=False)
+        batch_op.create_index('ix_aula_aluno_data_hora', ['aluno_id', 'data_hora'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('aula', schema=None) as batch_op:
+        batch_op.drop_index('ix_aula_aluno_data_hora')
+        batch_op.drop_index('ix_aula_professor_data_hora')
+        batch_op.drop_column('data_hora_fim')
@@ -0,0 +1,65 @@
+"""Colunas só com dígitos de CPF e telefone
+
+Revision ID: a7c9e1f3b5d7
+Revises: f6b8d0e2a4c6
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c9e1f3b5d7'
+down_revision = 'f6b8d0e2a4c6'
+branch_labels = None
+depends_on = None
+
+TABELAS = ('responsavel', 'aluno', 'professor')
+
+
+def _digitos(valor):
+    return re.sub(r'\D', '', valor or '')
+
+
+def upgrade():
+    for nome in TABELAS:
+        with op.batch_alter_table(nome, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('cpf_digitos', sa.String(length=14), nullable=True))
+            batch_op.add_column(sa.Column('telefone_digitos', sa.String(length=20), nullable=True))
+            batch_op.create_index(f'ix_{nome}_cpf_digitos', ['cpf_digitos'], unique=False)
+            batch_op.create_index(f'ix_{nome}_telefone_digitos', ['telefone_digitos'], unique=False)
+
+    # Preenche a partir dos valores gravados (o SQLite não tem substituição por expressão regular)
+    conexao = op.get_bind()
+    for nome in TABELAS:
+        tabela = sa.table(
+            nome,
+            sa.column('id', sa.Integer),
+            sa.column('cpf', sa.String),
+            sa.column('telefone', sa.String),
+            sa.column('cpf_digitos', sa.String),
+            sa.column('telefone_digitos', sa.String)
+        )
+        valores = [
+            {'b_id': id_, 'b_cpf': _digitos(cpf), 'b_telefone': _digitos(telefone)}
+            for id_, cpf, telefone in conexao.execute(sa.select(tabela.c.id, tabela.c.cpf, tabela.c.telefone))
+        ]
+        if valores:
+            conexao.execute(
+                tabela.update()
+                .where(tabela.c.id == sa.bindparam('b_id'))
+                .values(cpf_digitos=sa.bindparam('b_cpf'), telefone_digitos=sa.bindparam('b_telefone')),
+                valores
+            )
+
+
+def downgrade():
+    for nome in TABELAS:
+        with op.batch_alter_table(nome, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{nome}_telefone_digitos')
+            batch_op.drop_index(f'ix_{nome}_cpf_digitos')
+            batch_op.drop_column('telefone_digitos')
+            batch_op.drop_column('cpf_digitos')
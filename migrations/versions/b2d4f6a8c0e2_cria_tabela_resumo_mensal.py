@@ -0,0 +1,81 @@
+"""Cria tabela resumo_mensal
+
+Revision ID: b2d4f6a8c0e2
+Revises: a1c3e5f7b9d1
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d4f6a8c0e2'
+down_revision = 'a1c3e5f7b9d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    resumo = op.create_table('resumo_mensal',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ano', sa.Integer(), nullable=False),
+    sa.Column('mes', sa.Integer(), nullable=False),
+    sa.Column('professor_id', sa.Integer(), nullable=False),
+    sa.Column('aluno_id', sa.Integer(), nullable=False),
+    sa.Column('local', sa.String(length=50), nullable=False),
+    sa.Column('tipo_aula', sa.String(length=20), nullable=False),
+    sa.Column('total_aulas', sa.Integer(), nullable=False),
+    sa.Column('aulas_realizadas', sa.Integer(), nullable=False),
+    sa.Column('total_minutos', sa.Integer(), nullable=False),
+    sa.Column('faturamento', sa.Float(), nullable=False),
+    sa.Column('custo_professores', sa.Float(), nullable=False),
+    sa.Column('deslocamento', sa.Float(), nullable=False),
+    sa.Column('atualizado_em', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['aluno_id'], ['aluno.id'], ),
+    sa.ForeignKeyConstraint(['professor_id'], ['professor.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('ano', 'mes', 'professor_id', 'aluno_id', 'local', 'tipo_aula', name='uq_resumo_mensal_celula')
+    )
+    with op.batch_alter_table('resumo_mensal', schema=None) as batch_op:
+        batch_op.create_index('ix_resumo_mensal_ano_mes', ['ano', 'mes'], unique=False)
+
+    # Popular o consolidado com as aulas já existentes
+    aula = sa.table(
+        'aula',
+        sa.column('id', sa.Integer),
+        sa.column('data_hora', sa.DateTime),
+        sa.column('professor_id', sa.Integer),
+        sa.column('aluno_id', sa.Integer),
+        sa.column('local', sa.String),
+        sa.column('tipo_aula', sa.String),
+        sa.column('realizada', sa.Boolean),
+        sa.column('duracao', sa.Integer),
+        sa.column('valor_aula', sa.Float),
+        sa.column('custo_aula', sa.Float),
+        sa.column('deslocamento', sa.Float)
+    )
+    ano = sa.cast(sa.extract('year', aula.c.data_hora), sa.Integer)
+    mes = sa.cast(sa.extract('month', aula.c.data_hora), sa.Integer)
+    agregado = sa.select(
+        ano, mes, aula.c.professor_id, aula.c.aluno_id, aula.c.local, aula.c.tipo_aula,
+        sa.func.count(aula.c.id),
+        sa.func.coalesce(sa.func.sum(sa.case((aula.c.realizada.is_(True), 1), else_=0)), 0),
+        sa.func.coalesce(sa.func.sum(aula.c.duracao), 0),
+        sa.func.coalesce(sa.func.sum(aula.c.valor_aula), 0),
+        sa.func.coalesce(sa.func.sum(aula.c.custo_aula), 0),
+        sa.func.coalesce(sa.func.sum(sa.func.coalesce(aula.c.deslocamento, 0)), 0)
+    ).group_by(ano, mes, aula.c.professor_id, aula.c.aluno_id, aula.c.local, aula.c.tipo_aula)
+
+    op.execute(resumo.insert().from_select(
+        ['ano', 'mes', 'professor_id', 'aluno_id', 'local', 'tipo_aula', 'total_aulas',
+         'aulas_realizadas', 'total_minutos', 'faturamento', 'custo_professores', 'deslocamento'],
+        agregado
+    ))
+
+
+def downgrade():
+    with op.batch_alter_table('resumo_mensal', schema=None) as batch_op:
+        batch_op.drop_index('ix_resumo_mensal_ano_mes')
+
+    op.drop_table('resumo_mensal')
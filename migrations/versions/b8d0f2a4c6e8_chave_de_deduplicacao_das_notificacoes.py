@@ -0,0 +1,60 @@
+"""Chave de deduplicação das notificações
+
+Revision ID: b8d0f2a4c6e8
+Revises: a7c9e1f3b5d7
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d0f2a4c6e8'
+down_revision = 'a7c9e1f3b5d7'
+branch_labels = None
+depends_on = None
+
+PREFIXO_TITULO = 'Contrato próximo ao vencimento - '
+
+
+def upgrade():
+    with op.batch_alter_table('notificacao', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('chave_dedup', sa.String(length=100), nullable=True))
+        batch_op.create_unique_constraint('uq_notificacao_usuario_chave', ['usuario_id', 'chave_dedup'])
+
+    # Avisos de vencimento antigos eram reconhecidos pelo título (usuário + plano): cada um
+    # recebe a chave do contrato do responsável com esse plano e validade mais próxima
+    # depois da data do aviso, para não ser repetido pela nova rotina
+    conexao = op.get_bind()
+    avisos = conexao.execute(sa.text("""
+        SELECT n.id, n.usuario_id, n.titulo, n.data_criacao, u.responsavel_id
+        FROM notificacao n JOIN users u ON u.id = n.usuario_id
+        WHERE n.titulo LIKE :prefixo AND u.responsavel_id IS NOT NULL
+        ORDER BY n.data_criacao
+    """), {'prefixo': PREFIXO_TITULO + '%'}).all()
+
+    usadas = set()
+    for aviso_id, usuario_id, titulo, data_criacao, responsavel_id in avisos:
+        contratos = conexao.execute(sa.text("""
+            SELECT id, validade FROM contrato
+            WHERE responsavel_id = :responsavel_id AND tipo_plano = :tipo_plano AND validade >= date(:data_criacao)
+            ORDER BY validade
+        """), {
+            'responsavel_id': responsavel_id,
+            'tipo_plano': titulo[len(PREFIXO_TITULO):],
+            'data_criacao': str(data_criacao)[:10]
+        }).all()
+        for contrato_id, validade in contratos:
+            chave = f'vencimento:{contrato_id}:{str(validade)[:10]}'
+            if (usuario_id, chave) not in usadas:
+                usadas.add((usuario_id, chave))
+                conexao.execute(sa.text('UPDATE notificacao SET chave_dedup = :chave WHERE id = :id'),
+                                {'chave': chave, 'id': aviso_id})
+                break
+
+
+def downgrade():
+    with op.batch_alter_table('notificacao', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_notificacao_usuario_chave', type_='unique')
+        batch_op.drop_column('chave_dedup')
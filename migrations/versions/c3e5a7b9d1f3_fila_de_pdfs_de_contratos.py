@@ -0,0 +1,50 @@
+"""Fila de PDFs de contratos
+
+Revision ID: c3e5a7b9d1f3
+Revises: b2d4f6a8c0e2
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e5a7b9d1f3'
+down_revision = 'b2d4f6a8c0e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('contrato', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('pdf_status', sa.String(length=20), nullable=True))
+
+    # Contratos que já têm arquivo gerado
+    op.execute("UPDATE contrato SET pdf_status = 'pronto' WHERE arquivo IS NOT NULL")
+
+    op.create_table('tarefa_pdf',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('contrato_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('prioridade', sa.Integer(), nullable=False),
+    sa.Column('tentativas', sa.Integer(), nullable=False),
+    sa.Column('erro', sa.String(length=500), nullable=True),
+    sa.Column('criado_em', sa.DateTime(), nullable=True),
+    sa.Column('iniciado_em', sa.DateTime(), nullable=True),
+    sa.Column('concluido_em', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['contrato_id'], ['contrato.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('tarefa_pdf', schema=None) as batch_op:
+        batch_op.create_index('ix_tarefa_pdf_status_prioridade', ['status', 'prioridade', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tarefa_pdf', schema=None) as batch_op:
+        batch_op.drop_index('ix_tarefa_pdf_status_prioridade')
+
+    op.drop_table('tarefa_pdf')
+
+    with op.batch_alter_table('contrato', schema=None) as batch_op:
+        batch_op.drop_column('pdf_status')
@@ -0,0 +1,33 @@
+"""Contador de notificações não lidas por usuário
+
+Revision ID: c9e1a3b5d7f9
+Revises: b8d0f2a4c6e8
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9e1a3b5d7f9'
+down_revision = 'b8d0f2a4c6e8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('notificacoes_nao_lidas', sa.Integer(), nullable=False, server_default='0'))
+
+    op.execute("""
+        UPDATE users SET notificacoes_nao_lidas = (
+            SELECT count(*) FROM notificacao
+            WHERE notificacao.usuario_id = users.id AND notificacao.lida = 0
+        )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('notificacoes_nao_lidas')
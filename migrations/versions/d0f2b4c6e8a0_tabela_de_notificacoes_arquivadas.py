@@ -0,0 +1,39 @@
+"""Tabela de notificações arquivadas
+
+Revision ID: d0f2b4c6e8a0
+Revises: c9e1a3b5d7f9
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd0f2b4c6e8a0'
+down_revision = 'c9e1a3b5d7f9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notificacao_arquivada',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('usuario_id', sa.Integer(), nullable=False),
+    sa.Column('titulo', sa.String(length=100), nullable=False),
+    sa.Column('mensagem', sa.Text(), nullable=False),
+    sa.Column('tipo', sa.String(length=20), nullable=True),
+    sa.Column('data_criacao', sa.DateTime(), nullable=False),
+    sa.Column('data_arquivamento', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['usuario_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('notificacao_arquivada', schema=None) as batch_op:
+        batch_op.create_index('ix_notificacao_arquivada_usuario_data', ['usuario_id', 'data_criacao'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notificacao_arquivada', schema=None) as batch_op:
+        batch_op.drop_index('ix_notificacao_arquivada_usuario_data')
+
+    op.drop_table('notificacao_arquivada')
@@ -0,0 +1,71 @@
+"""Índices compostos das consultas frequentes
+
+Revision ID: d4f6b8c0e2a4
+Revises: c3e5a7b9d1f3
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f6b8c0e2a4'
+down_revision = 'c3e5a7b9d1f3'
+branch_labels = None
+depends_on = None
+
+
+# tabela -> [(nome do índice, colunas)]
+INDICES = {
+    'users': [
+        ('ix_users_aluno_id', ['aluno_id']),
+        ('ix_users_professor_id', ['professor_id']),
+        ('ix_users_responsavel_id', ['responsavel_id']),
+    ],
+    'responsavel': [
+        ('ix_responsavel_nome', ['nome']),
+    ],
+    'aluno': [
+        ('ix_aluno_responsavel_id', ['responsavel_id']),
+        ('ix_aluno_nome', ['nome']),
+        ('ix_aluno_data_cadastro', ['data_cadastro']),
+    ],
+    'professor': [
+        ('ix_professor_nome', ['nome']),
+    ],
+    'aula': [
+        ('ix_aula_data_hora', ['data_hora']),
+    ],
+    'contrato_aluno': [
+        ('ix_contrato_aluno_aluno_contrato', ['aluno_id', 'contrato_id']),
+    ],
+    'contrato': [
+        ('ix_contrato_validade', ['validade']),
+        ('ix_contrato_status_validade', ['status', 'validade']),
+        ('ix_contrato_responsavel_validade', ['responsavel_id', 'validade']),
+        ('ix_contrato_professor_id', ['professor_id']),
+        ('ix_contrato_data_inicio', ['data_inicio']),
+        ('ix_contrato_data_upload', ['data_upload']),
+    ],
+    'notificacao': [
+        ('ix_notificacao_usuario_lida_data', ['usuario_id', 'lida', 'data_criacao']),
+        ('ix_notificacao_usuario_data', ['usuario_id', 'data_criacao']),
+    ],
+    'documento': [
+        ('ix_documento_aluno_id', ['aluno_id']),
+    ],
+}
+
+
+def upgrade():
+    for tabela, indices in INDICES.items():
+        with op.batch_alter_table(tabela, schema=None) as batch_op:
+            for nome, colunas in indices:
+                batch_op.create_index(nome, colunas, unique=False)
+
+
+def downgrade():
+    for tabela, indices in reversed(list(INDICES.items())):
+        with op.batch_alter_table(tabela, schema=None) as batch_op:
+            for nome, _ in reversed(indices):
+                batch_op.drop_index(nome)
@@ -0,0 +1,38 @@
+"""Fila de eventos em tempo real
+
+Revision ID: e1a3c5d7f9b1
+Revises: d0f2b4c6e8a0
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1a3c5d7f9b1'
+down_revision = 'd0f2b4c6e8a0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('evento_fila',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('usuario_id', sa.Integer(), nullable=False),
+    sa.Column('tipo', sa.String(length=30), nullable=False),
+    sa.Column('dados', sa.Text(), nullable=False),
+    sa.Column('criado_em', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['usuario_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
+    )
+    with op.batch_alter_table('evento_fila', schema=None) as batch_op:
+        batch_op.create_index('ix_evento_fila_usuario_id', ['usuario_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('evento_fila', schema=None) as batch_op:
+        batch_op.drop_index('ix_evento_fila_usuario_id')
+
+    op.drop_table('evento_fila')
@@ -0,0 +1,51 @@
+"""Faixa de vencimento dos contratos
+
+Revision ID: e5a7c9d1f3b5
+Revises: d4f6b8c0e2a4
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from datetime import date, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a7c9d1f3b5'
+down_revision = 'd4f6b8c0e2a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('contrato', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('faixa_vencimento', sa.String(length=20), nullable=True))
+        batch_op.create_index('ix_contrato_faixa_validade', ['faixa_vencimento', 'validade'], unique=False)
+
+    # Situação inicial: mesmas regras de app.status_contratos na data da migração
+    contrato = sa.table(
+        'contrato',
+        sa.column('status', sa.String),
+        sa.column('validade', sa.Date),
+        sa.column('faixa_vencimento', sa.String)
+    )
+    hoje = date.today()
+    op.execute(contrato.update().values(
+        faixa_vencimento=sa.case(
+            (contrato.c.validade < hoje, 'vencido'),
+            (contrato.c.validade <= hoje + timedelta(days=30), 'ate_30_dias'),
+            (contrato.c.validade <= hoje + timedelta(days=90), 'ate_90_dias'),
+            else_='regular'
+        ),
+        status=sa.case(
+            ((contrato.c.status == 'ativo') & (contrato.c.validade < hoje), 'vencido'),
+            else_=contrato.c.status
+        )
+    ))
+
+
+def downgrade():
+    with op.batch_alter_table('contrato', schema=None) as batch_op:
+        batch_op.drop_index('ix_contrato_faixa_validade')
+        batch_op.drop_column('faixa_vencimento')
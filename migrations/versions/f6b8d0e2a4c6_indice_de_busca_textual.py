@@ -0,0 +1,52 @@
+"""Índice de busca textual (FTS5)
+
+Revision ID: f6b8d0e2a4c6
+Revises: e5a7c9d1f3b5
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6b8d0e2a4c6'
+down_revision = 'e5a7c9d1f3b5'
+branch_labels = None
+depends_on = None
+
+
+def _digitos(coluna):
+    for caractere in '.-()/ +':
+        coluna = f"replace({coluna}, '{caractere}', '')"
+    return coluna
+
+
+def _juntar(*colunas):
+    return " || ' ' || ".join(f"coalesce({c}, '')" for c in colunas)
+
+
+# Documentos iniciais: mesmas regras de app.busca na data da migração
+# (rowid = id * 8 + código da entidade)
+DOCUMENTOS = [
+    f"SELECT a.id * 8 + 1, a.nome, {_juntar('a.cpf', _digitos('a.cpf'), 'a.telefone', _digitos('a.telefone'), 'a.serie')} FROM aluno a",
+    f"SELECT r.id * 8 + 2, r.nome, {_juntar('r.cpf', _digitos('r.cpf'), 'r.telefone', _digitos('r.telefone'), 'r.email')} FROM responsavel r",
+    f"SELECT p.id * 8 + 3, p.nome, {_juntar('p.disciplina', 'p.cpf', _digitos('p.cpf'), 'p.telefone', _digitos('p.telefone'))} FROM professor p",
+    f"SELECT c.id * 8 + 4, r.nome, {_juntar('c.tipo_plano')} FROM contrato c JOIN responsavel r ON r.id = c.responsavel_id",
+]
+
+
+def upgrade():
+    op.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS busca_indice USING fts5(
+            titulo,
+            conteudo,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+    for consulta in DOCUMENTOS:
+        op.execute(f'INSERT INTO busca_indice (rowid, titulo, conteudo) {consulta}')
+
+
+def downgrade():
+    op.execute('DROP TABLE IF EXISTS busca_indice')